@@ -0,0 +1,146 @@
+import sys
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+# Add the parent directory to Python path so we can import from common/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.constants import CHUNK_MIN_TOKENS, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from common.models import FileProcessingConfig
+from common.file_utils import iter_documents, iter_document_chunks, chunk_index_text
+from common.bm25_engine import BM25Index, tokenize
+
+
+def load_chunk_texts(source: Path) -> List[str]:
+    """
+    Chunk the documents from source like rag_pipeline.py.
+
+    Args:
+        source: Path to a zip file or a directory containing documents
+
+    Returns:
+        Index texts of the chunks (headers and text)
+    """
+    config = FileProcessingConfig(
+        input_dir=source,
+        output_dir=source,
+        chunk_size=CHUNK_MAX_TOKENS,
+        min_chunk_size=CHUNK_MIN_TOKENS,
+        overlap=CHUNK_OVERLAP_TOKENS,
+    )
+    return [chunk_index_text(chunk) for chunk in iter_document_chunks(iter_documents(source), config)]
+
+
+def build_corpus(source: Path, num_docs: int) -> List[Tuple[int, str]]:
+    """
+    Build a benchmark corpus by chunking the documents from source like rag_pipeline.py.
+
+    Chunks are repeated until the corpus has num_docs documents. Every copy gets
+    a few unique tokens, so the vocabulary grows with the corpus as it would
+    with real documents.
+
+    Args:
+        source: Path to a zip file or a directory containing documents
+        num_docs: Number of documents in the corpus
+
+    Returns:
+        List of (chunk id, text) tuples
+    """
+    texts = load_chunk_texts(source)
+    return [(i, f"{texts[i % len(texts)]} dokument{i} seria{i // len(texts)}") for i in range(num_docs)]
+
+
+def directory_size_mb(path: str) -> float:
+    """Total size of the files in a directory in MB."""
+    return sum(os.path.getsize(file) for file in glob.glob(os.path.join(path, "**"), recursive=True) if os.path.isfile(file)) / (1024 * 1024)
+
+
+def latency_ms(search: Callable[[str], None], queries: List[str], repeats: int) -> Tuple[float, float]:
+    """Measure the p50 and p95 latency of a search function in milliseconds."""
+    for query in queries:
+        search(query)
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def bench_native(corpus: List[Tuple[int, str]], queries: List[str], k: int, repeats: int, work_dir: str) -> None:
+    """Benchmark the native engine (common/bm25_engine.py)."""
+    path = os.path.join(work_dir, "native")
+    start = time.perf_counter()
+    BM25Index.build((chunk_id, tokenize(text)) for chunk_id, text in corpus).save(path)
+    build_s = time.perf_counter() - start
+
+    index = BM25Index.load(path, mmap=True)
+    p50, p95 = latency_ms(lambda query: index.search(query, k), queries, repeats)
+    print(f"{'native':<8} build {build_s:7.2f} s  size {directory_size_mb(path):8.2f} MB  postings {len(index.indices):>10}  query p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+def bench_bm25s(corpus: List[Tuple[int, str]], queries: List[str], k: int, repeats: int, work_dir: str) -> None:
+    """Benchmark the bm25s path used before the native engine."""
+    import bm25s
+
+    path = os.path.join(work_dir, "bm25s")
+    start = time.perf_counter()
+    corpus_tokens = bm25s.tokenize([text for _, text in corpus], stopwords="en", show_progress=False)
+    retriever = bm25s.BM25()
+    retriever.index(corpus_tokens, show_progress=False)
+    retriever.save(path, corpus=[{"id": chunk_id} for chunk_id, _ in corpus])
+    build_s = time.perf_counter() - start
+
+    retriever = bm25s.BM25.load(path, load_corpus=True, mmap=True, show_progress=False)
+
+    def search(query: str) -> None:
+        query_tokens = bm25s.tokenize(query.lower(), return_ids=False, show_progress=False)
+        retriever.retrieve(query_tokens, k=min(k, len(corpus)), show_progress=False)
+
+    p50, p95 = latency_ms(search, queries, repeats)
+    postings = len(np.load(os.path.join(path, "data.csc.index.npy"), mmap_mode="r"))
+    print(f"{'bm25s':<8} build {build_s:7.2f} s  size {directory_size_mb(path):8.2f} MB  postings {postings:>10}  query p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+def main() -> None:
+    """
+    Benchmark the native BM25 engine against the bm25s path.
+
+    Builds both indexes over corpora of growing size and reports build time,
+    index size on disk, number of postings and query latency for the
+    questions of the test cases.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--source", type=Path, default=Path("docs_zip/Pliki_do_zadania_rekrutacyjnego.zip"))
+    parser.add_argument("--num-docs", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = []
+    for test_case_path in sorted(glob.glob("tests/test_cases/*.json")):
+        with open(test_case_path, "r", encoding="utf-8") as f:
+            queries.append(json.load(f)["question"])
+
+    work_dir = tempfile.mkdtemp(prefix="bench_bm25_")
+    try:
+        for num_docs in args.num_docs:
+            corpus = build_corpus(args.source, num_docs)
+            print(f"\n{num_docs} documents, {len(queries)} queries, k={args.k}")
+            bench_bm25s(corpus, queries, args.k, args.repeats, work_dir)
+            bench_native(corpus, queries, args.k, args.repeats, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
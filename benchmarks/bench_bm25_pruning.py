@@ -0,0 +1,119 @@
+import sys
+import os
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+# Add the parent directory to Python path so we can import from common/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.bm25_engine import BM25Index, bm25_idf, tokenize, top_k
+from bench_bm25 import load_chunk_texts
+
+
+def build_sampled_corpus(source: Path, num_docs: int, seed: int = 0) -> List[Tuple[int, List[str]]]:
+    """
+    Build a tokenized benchmark corpus of num_docs distinct documents.
+    
+    Every document mixes the tokens of two random chunks of the source
+    documents and samples 20-200 of them, so term frequencies, document
+    lengths and scores vary between documents like in a real corpus
+    (repeating the same chunks would make most top scores exact ties).
+    
+    Args:
+        source: Path to a zip file or a directory containing documents
+        num_docs: Number of documents in the corpus
+        seed: Random seed
+    
+    Returns:
+        List of (chunk id, tokens) tuples
+    """
+    chunks = [tokenize(text) for text in load_chunk_texts(source)]
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for doc in range(num_docs):
+        first, second = rng.integers(len(chunks), size=2)
+        tokens = chunks[first] + chunks[second]
+        corpus.append((doc, [tokens[i] for i in rng.integers(len(tokens), size=int(rng.integers(20, 201)))]))
+    return corpus
+
+
+def latency_ms(func: Callable[[], object], repeats: int) -> float:
+    """Measure the median latency of a function in milliseconds."""
+    func()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+
+def bench_corpus(corpus: List[Tuple[int, List[str]]], queries: List[str], k: int, repeats: int) -> None:
+    """Compare exhaustive and pruned top-k scoring on one corpus and check the results are identical."""
+    start = time.perf_counter()
+    index = BM25Index.build(corpus)
+    build_s = time.perf_counter() - start
+
+    exhaustive_ms = []
+    pruned_ms = []
+    for query in queries:
+        term_ids = index.term_ids(tokenize(query, index.stemming))
+        idf = bm25_idf(index.document_frequencies(term_ids), index.num_docs)
+
+        def exhaustive() -> Tuple[np.ndarray, np.ndarray]:
+            scores = index.score(term_ids, idf, index.avgdl)
+            top = top_k(scores, k)
+            return top, scores[top]
+
+        def pruned() -> Tuple[np.ndarray, np.ndarray]:
+            return index.top_k_documents(term_ids, idf, index.avgdl, k)
+
+        expected, actual = exhaustive(), pruned()
+        if not (np.array_equal(expected[0], actual[0]) and np.array_equal(expected[1], actual[1])):
+            raise AssertionError(f"Pruned results differ from exhaustive scoring for query: {query}")
+
+        exhaustive_ms.append(latency_ms(exhaustive, repeats))
+        pruned_ms.append(latency_ms(pruned, repeats))
+
+    exhaustive_total, pruned_total = sum(exhaustive_ms), sum(pruned_ms)
+    print(
+        f"{len(corpus):>9} docs  {len(index.indices):>10} postings  build {build_s:6.1f} s  "
+        f"exhaustive {exhaustive_total:8.2f} ms  pruned {pruned_total:8.2f} ms  "
+        f"speedup {exhaustive_total / pruned_total:5.1f}x  (results identical)"
+    )
+    for query, exhaustive, pruned in zip(queries, exhaustive_ms, pruned_ms):
+        print(f"    {exhaustive:8.2f} ms  {pruned:8.2f} ms  {query[:60]}")
+
+def main() -> None:
+    """
+    Benchmark dynamic pruning of BM25 top-k queries against exhaustive scoring.
+
+    For sampled corpora of growing size, runs the questions of the test cases with
+    both BM25Index.score() + top_k() and BM25Index.top_k_documents(), checks
+    that they return the same documents and scores, and reports the median
+    latency of every query and their sum.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--source", type=Path, default=Path("docs_zip/Pliki_do_zadania_rekrutacyjnego.zip"))
+    parser.add_argument("--num-docs", type=int, nargs="+", default=[1_000, 10_000, 100_000, 300_000])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = []
+    for test_case_path in sorted(glob.glob("tests/test_cases/*.json")):
+        with open(test_case_path, "r", encoding="utf-8") as f:
+            queries.append(json.load(f)["question"])
+
+    print(f"{len(queries)} queries, k={args.k}")
+    for num_docs in args.num_docs:
+        bench_corpus(build_sampled_corpus(args.source, num_docs), queries, args.k, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
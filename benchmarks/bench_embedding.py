@@ -0,0 +1,94 @@
+import sys
+import os
+import time
+import argparse
+from pathlib import Path
+from typing import Callable, List
+
+# Add the parent directory to Python path so we can import from common/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.constants import (
+    CHUNK_MIN_TOKENS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    EMBEDDING_TOKEN_BUDGET,
+    EMBEDDING_MAX_BATCH_SIZE,
+)
+from common.models import FileProcessingConfig
+from common.file_utils import iter_documents, iter_document_chunks, chunk_index_text
+from common.embeddings import DocumentEncoder, get_document_model
+
+
+def build_texts(source: Path, num_chunks: int) -> List[str]:
+    """
+    Build benchmark texts by chunking the documents from source like rag_pipeline.py.
+
+    Args:
+        source: Path to a zip file or a directory containing documents
+        num_chunks: Number of texts to return (chunks are repeated if needed)
+
+    Returns:
+        Chunk texts prefixed with their section headers, in document order
+    """
+    config = FileProcessingConfig(
+        input_dir=source,
+        output_dir=source,
+        chunk_size=CHUNK_MAX_TOKENS,
+        min_chunk_size=CHUNK_MIN_TOKENS,
+        overlap=CHUNK_OVERLAP_TOKENS,
+    )
+    texts = [chunk_index_text(chunk) for chunk in iter_document_chunks(iter_documents(source), config)]
+    return [texts[i % len(texts)] for i in range(num_chunks)]
+
+
+def encode_in_fixed_batches(texts: List[str], batch_size: int) -> None:
+    """Previous behaviour: encode the texts in document order, batch_size chunks per encode call."""
+    model = get_document_model()
+    for start in range(0, len(texts), batch_size):
+        model.encode(texts[start:start + batch_size], convert_to_numpy=True, show_progress_bar=False)
+
+
+def measure(name: str, run: Callable[[], None], num_chunks: int) -> None:
+    """Run a benchmark once and print its throughput."""
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {elapsed:8.2f} s  {num_chunks / elapsed:8.1f} chunks/s")
+
+
+def main() -> None:
+    """
+    Benchmark indexing-time embedding throughput on CPU.
+
+    Compares encoding chunks in document order in fixed-size batches (previous
+    behaviour) with the DocumentEncoder (length-bucketed batches under a token
+    budget) in one process and in several worker processes.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--source", type=Path, default=Path("docs_zip/Pliki_do_zadania_rekrutacyjnego.zip"))
+    parser.add_argument("--num-chunks", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--token-budget", type=int, default=EMBEDDING_TOKEN_BUDGET)
+    parser.add_argument("--max-batch-size", type=int, default=EMBEDDING_MAX_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    texts = build_texts(args.source, args.num_chunks)
+    print(f"{len(texts)} chunks, {os.cpu_count()} CPU cores\n")
+
+    # Load the model before timing
+    get_document_model().encode(texts[:1], show_progress_bar=False)
+
+    measure(f"fixed batches of {args.batch_size} (before)", lambda: encode_in_fixed_batches(texts, args.batch_size), len(texts))
+
+    for workers in args.workers:
+        encoder = DocumentEncoder(workers=workers, token_budget=args.token_budget, max_batch_size=args.max_batch_size)
+        # Start the worker processes and load their models before timing
+        encoder.encode(texts[:workers])
+        measure(f"length-sorted, {workers} process(es) (after)", lambda: encoder.encode(texts), len(texts))
+        encoder.close()
+
+
+if __name__ == "__main__":
+    main()
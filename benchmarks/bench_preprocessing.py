@@ -0,0 +1,113 @@
+import re
+import sys
+import os
+import time
+import argparse
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+# Add the parent directory to Python path so we can import from common/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.file_utils import iter_documents, clean_and_unify_text, _map_in_processes
+
+
+def reference_clean_and_unify_text(text: str) -> str:
+    """
+    Original multi-pass implementation of clean_and_unify_text.
+
+    Kept to check that the precompiled, combined rules produce identical output
+    and to measure the speedup.
+    """
+    url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+|ftp://[^\s<>"{}|\\^`\[\]]+|www\.[^\s<>"{}|\\^`\[\]]+|file:///.[^\s<>"{}|\\^`\[\]]+'
+    text = re.sub(url_pattern, "", text)
+    text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)
+    text = re.sub(r"\*", "", text)
+    text = re.sub(r"\|", "", text)
+    text = re.sub(r"\.{2,}", ".", text)
+    text = re.sub(r"!{2,}", "!", text)
+    text = re.sub(r"\?{2,}", "?", text)
+    text = re.sub(r"\n+", "\n\n", text)
+    text = text.lower()
+    text = text.strip()
+    return text
+
+
+def build_corpus(source: Path, target_mb: float) -> List[Tuple[str, str]]:
+    """
+    Build a benchmark corpus by repeating the documents from source.
+
+    Args:
+        source: Path to a zip file or a directory containing documents
+        target_mb: Approximate corpus size in MB (UTF-8)
+
+    Returns:
+        List of (file name, document text) tuples
+    """
+    documents = list(iter_documents(source))
+    corpus = []
+    size = 0
+    while size < target_mb * 1024 * 1024:
+        for file, text in documents:
+            corpus.append((f"{len(corpus)}_{file}", text))
+            size += len(text.encode("utf-8"))
+    return corpus
+
+
+def _clean_document(document: Tuple[str, str]) -> int:
+    """Clean a single document and return the length of the result."""
+    return len(clean_and_unify_text(document[1]))
+
+
+def measure(name: str, run: Callable[[], None], corpus_mb: float, cores: int, repeats: int) -> None:
+    """Run a benchmark several times and print the best throughput."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    throughput = corpus_mb / best
+    print(f"{name:<32} {best:8.3f} s  {throughput:8.2f} MB/s  {throughput / cores:8.2f} MB/s per core")
+
+
+def main() -> None:
+    """
+    Benchmark the cleaning stage of the preprocessing pipeline.
+
+    Compares the original multi-pass cleaning with the precompiled, combined
+    rules in a single process, and the process pool used by preprocess_files
+    and iter_document_chunks for increasing numbers of workers.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--source", type=Path, default=Path("docs_zip/Pliki_do_zadania_rekrutacyjnego.zip"))
+    parser.add_argument("--size-mb", type=float, default=50.0)
+    parser.add_argument("--chunksize", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.source, args.size_mb)
+    corpus_mb = sum(len(text.encode("utf-8")) for _, text in corpus) / (1024 * 1024)
+    print(f"Corpus: {len(corpus)} documents, {corpus_mb:.1f} MB, {os.cpu_count()} CPU cores\n")
+
+    mismatches = sum(
+        clean_and_unify_text(text) != reference_clean_and_unify_text(text) for _, text in corpus[:100]
+    )
+    print(f"Output identical to the original cleaning: {mismatches == 0}\n")
+
+    measure("original (1 process)", lambda: [reference_clean_and_unify_text(text) for _, text in corpus], corpus_mb, 1, args.repeats)
+    measure("precompiled (1 process)", lambda: [clean_and_unify_text(text) for _, text in corpus], corpus_mb, 1, args.repeats)
+
+    workers = 2
+    while workers <= args.max_workers:
+        measure(
+            f"precompiled ({workers} processes)",
+            lambda: list(_map_in_processes(_clean_document, corpus, workers, args.chunksize)),
+            corpus_mb, workers, args.repeats,
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
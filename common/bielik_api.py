@@ -1,96 +1,523 @@
 import requests
+import aiohttp
+import asyncio
 import json
-from typing import Optional, Generator
-from common.models import ModelResponse
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from typing import Optional, Generator, AsyncGenerator, Callable
+from common.constants import (
+    OLLAMA_URL,
+    OLLAMA_MODEL_NAME,
+    OLLAMA_CONNECT_TIMEOUT_S,
+    OLLAMA_READ_TIMEOUT_S,
+    OLLAMA_POOL_SIZE,
+    GENERATOR_CONTEXT_TOKENS,
+)
+from common.models import ModelResponse, GenerationStats
 
 
-def call_model_non_stream(system_prompt: str, user_prompt: str, format: Optional[dict] = None) -> str:
+StatsCallback = Callable[[GenerationStats], None]
+
+
+def build_generation_stats(
+    start_time: float,
+    first_token_time: Optional[float],
+    end_time: float,
+    final_response: Optional[ModelResponse],
+) -> GenerationStats:
+    """
+    Build latency and throughput statistics of a model call.
+    
+    Token counts and generation speed come from the final Ollama response.
+    If the first token was not observed on the client (non-streaming calls),
+    time to first token is estimated from the server-side load and prompt
+    processing durations.
+    
+    Args:
+        start_time: time.perf_counter() value when the request was sent
+        first_token_time: time.perf_counter() value when the first token arrived, if observed
+        end_time: time.perf_counter() value when the call finished
+        final_response: Last response object returned by Ollama (with done=True), if any
+    
+    Returns:
+        GenerationStats object for the call
+    """
+    time_to_first_token_s = first_token_time - start_time if first_token_time is not None else None
+    prompt_tokens = None
+    output_tokens = None
+    tokens_per_second = None
+
+    if final_response is not None:
+        prompt_tokens = final_response.prompt_eval_count
+        output_tokens = final_response.eval_count
+        if final_response.eval_count and final_response.eval_duration:
+            tokens_per_second = final_response.eval_count / (final_response.eval_duration / 1e9)
+        if time_to_first_token_s is None and final_response.prompt_eval_duration is not None:
+            time_to_first_token_s = ((final_response.load_duration or 0) + final_response.prompt_eval_duration) / 1e9
+
+    return GenerationStats(
+        time_to_first_token_s=time_to_first_token_s,
+        total_time_s=end_time - start_time,
+        prompt_tokens=prompt_tokens,
+        output_tokens=output_tokens,
+        tokens_per_second=tokens_per_second,
+    )
+
+
+class OllamaClient:
+    """
+    Reusable client for the Ollama generate API.
+    
+    Keeps a pool of keep-alive connections for the synchronous methods
+    (requests.Session) and for the asynchronous ones (aiohttp.ClientSession, one
+    per event loop, closed when the loop finishes or another loop takes over),
+    applies connect and read timeouts to every request, and measures time to
+    first token and tokens per second of every call. Statistics of the most
+    recent call are kept in `last_stats` and can also be received per call
+    through `stats_callback`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        model: str = OLLAMA_MODEL_NAME,
+        connect_timeout_s: float = OLLAMA_CONNECT_TIMEOUT_S,
+        read_timeout_s: float = OLLAMA_READ_TIMEOUT_S,
+        pool_size: int = OLLAMA_POOL_SIZE,
+    ):
+        """
+        Args:
+            base_url: Ollama server URL
+            model: Name of the model served by Ollama
+            connect_timeout_s: Timeout for establishing a connection in seconds
+            read_timeout_s: Maximum time between received bytes in seconds
+            pool_size: Maximum number of pooled connections
+        """
+        self.url = f"{base_url}/api/generate"
+        self.model = model
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self.pool_size = pool_size
+        self.last_stats: Optional[GenerationStats] = None
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._async_session: Optional[aiohttp.ClientSession] = None
+        self._async_session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_session_closer: Optional[asyncio.Task] = None
+
+    def _build_request(self, system_prompt: str, user_prompt: str, stream: bool, format: Optional[dict] = None) -> dict:
+        """Build the request body for the generate API."""
+        data = {
+            "model": self.model,
+            "system": system_prompt,
+            "prompt": user_prompt,
+            "stream": stream,
+            # The default context token budget is derived from this context window
+            "options": {"num_ctx": GENERATOR_CONTEXT_TOKENS},
+        }
+        if not stream:
+            data["format"] = format
+        return data
+
+    def _record_stats(self, stats: GenerationStats, stats_callback: Optional[StatsCallback]) -> None:
+        """Store statistics of a finished call and pass them to the callback."""
+        self.last_stats = stats
+        if stats_callback is not None:
+            stats_callback(stats)
+
+    async def _close_async_session(self) -> None:
+        """
+        Close the aiohttp session, also when it belongs to another event loop.
+        
+        A session of a loop still running in another thread is closed on that
+        loop. Sessions of loops that have finished are already closed by their
+        closer task, see _close_session_on_shutdown().
+        """
+        session, session_loop = self._async_session, self._async_session_loop
+        closer = self._async_session_closer
+        self._async_session = None
+        self._async_session_loop = None
+        self._async_session_closer = None
+        if session is None or session.closed:
+            return
+
+        if session_loop is not asyncio.get_running_loop() and session_loop.is_running():
+            # Cancelling the closer task closes the session on its own loop
+            session_loop.call_soon_threadsafe(closer.cancel)
+            return
+        closer.cancel()
+        await session.close()
+
+    @staticmethod
+    async def _close_session_on_shutdown(session: aiohttp.ClientSession) -> None:
+        """
+        Keep a session open until this task is cancelled, then close it.
+        
+        asyncio.run() cancels the remaining tasks of its loop before closing
+        it, so the session of a loop that finishes is closed on that loop,
+        while its connections can still be shut down.
+        """
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await session.close()
+
+    async def _get_async_session(self) -> aiohttp.ClientSession:
+        """Get the aiohttp session of the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        if self._async_session is not None and self._async_session_loop is not loop:
+            await self._close_async_session()
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.connect_timeout_s, sock_read=self.read_timeout_s
+                ),
+            )
+            self._async_session_loop = loop
+            # The loop keeps only weak references to tasks
+            self._async_session_closer = loop.create_task(self._close_session_on_shutdown(self._async_session))
+        return self._async_session
+
+    def call_model_non_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        format: Optional[dict] = None,
+        stats_callback: Optional[StatsCallback] = None,
+    ) -> str:
+        """
+        Call the model in non-streaming mode.
+        
+        Args:
+            system_prompt: System prompt defining the model's behavior
+            user_prompt: User's input/question
+            format: Optional structured output format specification
+            stats_callback: Optional function receiving statistics of the call
+        
+        Returns:
+            Model's response as a string, or error message if the request fails
+        """
+        data = self._build_request(system_prompt, user_prompt, stream=False, format=format)
+
+        try:
+            start_time = time.perf_counter()
+            response = self._session.post(
+                self.url, json=data, timeout=(self.connect_timeout_s, self.read_timeout_s)
+            )
+            response.raise_for_status()
+
+            json_response = response.json()
+            # Validate response using Pydantic model
+            model_response = ModelResponse(**json_response)
+            self._record_stats(
+                build_generation_stats(start_time, None, time.perf_counter(), model_response),
+                stats_callback,
+            )
+            return model_response.response
+
+        except requests.exceptions.RequestException as e:
+            return f"Error connecting to Ollama API: {e}"
+        except Exception as e:
+            return f"Unexpected error: {e}"
+
+    def call_model_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        stats_callback: Optional[StatsCallback] = None,
+    ) -> Generator[str, None, None]:
+        """
+        Call the model in streaming mode.
+        
+        Args:
+            system_prompt: System prompt defining the model's behavior
+            user_prompt: User's input/question
+            stats_callback: Optional function receiving statistics of the call once it finishes with a final response
+        
+        Yields:
+            Response chunks as strings as they are generated by the model
+        """
+        data = self._build_request(system_prompt, user_prompt, stream=True)
+
+        try:
+            start_time = time.perf_counter()
+            first_token_time = None
+            final_response = None
+
+            with self._session.post(
+                self.url, json=data, stream=True, timeout=(self.connect_timeout_s, self.read_timeout_s)
+            ) as response:
+                response.raise_for_status()
+
+                for line in response.iter_lines():
+                    if line:
+                        try:
+                            json_response = json.loads(line.decode('utf-8'))
+                            # Validate response using Pydantic model
+                            model_response = ModelResponse(**json_response)
+
+                            if model_response.response:
+                                if first_token_time is None:
+                                    first_token_time = time.perf_counter()
+                                yield model_response.response
+
+                            # Check if the response is done
+                            if model_response.done:
+                                final_response = model_response
+                                break
+
+                        except json.JSONDecodeError:
+                            continue
+
+            # A stream cut off before the final response has no token counts
+            if final_response is not None:
+                self._record_stats(
+                    build_generation_stats(start_time, first_token_time, time.perf_counter(), final_response),
+                    stats_callback,
+                )
+            else:
+                print("Ollama stream ended without a final response, statistics not recorded")
+
+        except requests.exceptions.RequestException as e:
+            yield f"Error connecting to Ollama API: {e}"
+        except Exception as e:
+            yield f"Unexpected error: {e}"
+
+    async def acall_model_non_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        format: Optional[dict] = None,
+        stats_callback: Optional[StatsCallback] = None,
+    ) -> str:
+        """
+        Asynchronous version of call_model_non_stream.
+        
+        Args:
+            system_prompt: System prompt defining the model's behavior
+            user_prompt: User's input/question
+            format: Optional structured output format specification
+            stats_callback: Optional function receiving statistics of the call
+        
+        Returns:
+            Model's response as a string, or error message if the request fails
+        """
+        data = self._build_request(system_prompt, user_prompt, stream=False, format=format)
+
+        try:
+            session = await self._get_async_session()
+            start_time = time.perf_counter()
+            async with session.post(self.url, json=data) as response:
+                response.raise_for_status()
+                json_response = await response.json(content_type=None)
+
+            # Validate response using Pydantic model
+            model_response = ModelResponse(**json_response)
+            self._record_stats(
+                build_generation_stats(start_time, None, time.perf_counter(), model_response),
+                stats_callback,
+            )
+            return model_response.response
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return f"Error connecting to Ollama API: {e}"
+        except Exception as e:
+            return f"Unexpected error: {e}"
+
+    async def acall_model_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        stats_callback: Optional[StatsCallback] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronous version of call_model_stream.
+        
+        Args:
+            system_prompt: System prompt defining the model's behavior
+            user_prompt: User's input/question
+            stats_callback: Optional function receiving statistics of the call once it finishes with a final response
+        
+        Yields:
+            Response chunks as strings as they are generated by the model
+        """
+        data = self._build_request(system_prompt, user_prompt, stream=True)
+
+        try:
+            session = await self._get_async_session()
+            start_time = time.perf_counter()
+            first_token_time = None
+            final_response = None
+
+            async with session.post(self.url, json=data) as response:
+                response.raise_for_status()
+
+                # Ollama sends one JSON object per line
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        try:
+                            json_response = json.loads(line.decode('utf-8'))
+                            # Validate response using Pydantic model
+                            model_response = ModelResponse(**json_response)
+
+                            if model_response.response:
+                                if first_token_time is None:
+                                    first_token_time = time.perf_counter()
+                                yield model_response.response
+
+                            # Check if the response is done
+                            if model_response.done:
+                                final_response = model_response
+                                break
+
+                        except json.JSONDecodeError:
+                            continue
+
+            # A stream cut off before the final response has no token counts
+            if final_response is not None:
+                self._record_stats(
+                    build_generation_stats(start_time, first_token_time, time.perf_counter(), final_response),
+                    stats_callback,
+                )
+            else:
+                print("Ollama stream ended without a final response, statistics not recorded")
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            yield f"Error connecting to Ollama API: {e}"
+        except Exception as e:
+            yield f"Unexpected error: {e}"
+
+    def close(self) -> None:
+        """
+        Close the pooled synchronous connections.
+        
+        The asynchronous session is closed too if its event loop is running in
+        another thread, otherwise use aclose() from that loop.
+        """
+        self._session.close()
+        session_loop, closer = self._async_session_loop, self._async_session_closer
+        if closer is not None and session_loop.is_running():
+            self._async_session = None
+            self._async_session_loop = None
+            self._async_session_closer = None
+            session_loop.call_soon_threadsafe(closer.cancel)
+
+    async def aclose(self) -> None:
+        """Close the pooled synchronous and asynchronous connections."""
+        self._session.close()
+        await self._close_async_session()
+
+
+_ollama_client: Optional[OllamaClient] = None
+_ollama_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    """
+    Get the process-wide Ollama client.
+    
+    Returns:
+        Shared OllamaClient instance configured with the default settings
+    """
+    global _ollama_client
+
+    with _ollama_client_lock:
+        if _ollama_client is None:
+            _ollama_client = OllamaClient()
+        return _ollama_client
+
+
+def call_model_non_stream(
+    system_prompt: str,
+    user_prompt: str,
+    format: Optional[dict] = None,
+    stats_callback: Optional[StatsCallback] = None,
+) -> str:
     """
     Call the Bielik model via Ollama API in non-streaming mode.
     
     Sends a request to the local Ollama server with system and user prompts,
     optionally specifying a response format. Returns the complete response
-    as a single string.
+    as a single string. Uses the pooled process-wide client.
     
     Args:
         system_prompt: System prompt defining the model's behavior
         user_prompt: User's input/question
         format: Optional structured output format specification
-        
+        stats_callback: Optional function receiving time to first token and tokens/sec of the call
+    
     Returns:
         Model's response as a string, or error message if the request fails
     """
-    url = "http://localhost:11434/api/generate"
-    
-    data = {
-        "model": "Bielik-11B-v2_6-Instruct_Q4_K_M",
-        "system": system_prompt,
-        "prompt": user_prompt,
-        "stream": False,
-        "format": format
-    }   
-    
-    try:
-        response = requests.post(url, json=data)
-        response.raise_for_status()
-        
-        json_response = response.json()
-        # Validate response using Pydantic model
-        model_response = ModelResponse(**json_response)
-        return model_response.response
-        
-    except requests.exceptions.RequestException as e:
-        return f"Error connecting to Ollama API: {e}"
-    except Exception as e:
-        return f"Unexpected error: {e}"
+    return get_ollama_client().call_model_non_stream(system_prompt, user_prompt, format, stats_callback)
 
 
-def call_model_stream(system_prompt: str, user_prompt: str) -> Generator[str, None, None]:
+def call_model_stream(
+    system_prompt: str,
+    user_prompt: str,
+    stats_callback: Optional[StatsCallback] = None,
+) -> Generator[str, None, None]:
     """
     Call the Bielik model via Ollama API in streaming mode.
     
     Sends a request to the local Ollama server and yields response chunks
     as they become available. This allows for real-time streaming of the
-    model's response.
+    model's response. Uses the pooled process-wide client.
     
     Args:
         system_prompt: System prompt defining the model's behavior
         user_prompt: User's input/question
-        
+        stats_callback: Optional function receiving time to first token and tokens/sec of the call
+    
     Yields:
         Response chunks as strings as they are generated by the model
     """
-    url = "http://localhost:11434/api/generate"
+    yield from get_ollama_client().call_model_stream(system_prompt, user_prompt, stats_callback)
+
+
+async def acall_model_non_stream(
+    system_prompt: str,
+    user_prompt: str,
+    format: Optional[dict] = None,
+    stats_callback: Optional[StatsCallback] = None,
+) -> str:
+    """
+    Call the Bielik model via Ollama API in non-streaming mode without blocking the event loop.
     
-    data = {
-        "model": "Bielik-11B-v2_6-Instruct_Q4_K_M",
-        "system": system_prompt,
-        "prompt": user_prompt,
-        "stream": True
-    }
+    Args:
+        system_prompt: System prompt defining the model's behavior
+        user_prompt: User's input/question
+        format: Optional structured output format specification
+        stats_callback: Optional function receiving time to first token and tokens/sec of the call
     
-    try:
-        response = requests.post(url, json=data, stream=True)
-        response.raise_for_status()
-        
-        for line in response.iter_lines():
-            if line:
-                try:
-                    json_response = json.loads(line.decode('utf-8'))
-                    # Validate response using Pydantic model
-                    model_response = ModelResponse(**json_response)
-                    
-                    if model_response.response:
-                        yield model_response.response
-                    
-                    # Check if the response is done
-                    if model_response.done:
-                        break
-                        
-                except json.JSONDecodeError:
-                    continue
-                    
-    except requests.exceptions.RequestException as e:
-        yield f"Error connecting to Ollama API: {e}"
-    except Exception as e:
-        yield f"Unexpected error: {e}"
+    Returns:
+        Model's response as a string, or error message if the request fails
+    """
+    return await get_ollama_client().acall_model_non_stream(system_prompt, user_prompt, format, stats_callback)
+
+
+async def acall_model_stream(
+    system_prompt: str,
+    user_prompt: str,
+    stats_callback: Optional[StatsCallback] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Call the Bielik model via Ollama API in streaming mode without blocking the event loop.
+    
+    Args:
+        system_prompt: System prompt defining the model's behavior
+        user_prompt: User's input/question
+        stats_callback: Optional function receiving time to first token and tokens/sec of the call
+    
+    Yields:
+        Response chunks as strings as they are generated by the model
+    """
+    async for chunk in get_ollama_client().acall_model_stream(system_prompt, user_prompt, stats_callback):
+        yield chunk
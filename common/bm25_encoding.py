@@ -1,50 +1,246 @@
 import os
+import asyncio
+import shutil
+import threading
 from pathlib import Path
-from typing import List
+from typing import List, Dict, Optional, Tuple
 from tqdm import tqdm
+from common.file_utils import chunk_index_text
+from common.chunk_store import get_chunk_store, hydrate_search_results
+from common.constants import CHUNK_STORE_PATH, BM25_BACKEND, BM25_K1, BM25_B, BM25_STEMMING, BM25_SHARDS
+from common.bm25_engine import BM25Index, is_native_bm25_index
+from common.bm25_segments import SegmentedBM25Index, load_bm25_segments_manifest
+from common.bm25_shards import (
+    ShardedBM25Index,
+    bm25_index_num_shards,
+    bm25_index_signature,
+    bm25_shard_paths,
+    load_bm25_shards_manifest,
+    update_bm25_shards,
+)
 from common.models import SearchResult, BM25Config
 
 
-def generate_bm25_encodings(input_dir: Path, encodings_db_path: str) -> None:
+def _swap_index_dir(tmp_path: str, encodings_db_path: str) -> None:
+    """Swap a freshly written index directory in place of the live one."""
+    old_path = f"{encodings_db_path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(encodings_db_path):
+        os.rename(encodings_db_path, old_path)
+    os.rename(tmp_path, encodings_db_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def generate_bm25_encodings(chunk_store_path: str, encodings_db_path: str, backend: str = BM25_BACKEND, num_shards: int = BM25_SHARDS) -> None:
     """
     Generate BM25 encodings for text documents and save them to disk.
     
-    Creates a BM25 model from text files in the input directory, tokenizes the corpus,
-    and saves the model along with the corpus for later retrieval.
+    The "native" backend keeps a segmented index (common/bm25_segments.py) with
+    the Polish tokenizer: chunks added to the chunk store since the last run
+    are tokenized into a new segment and removed chunks are marked as deleted,
+    so only the change is encoded. With more than one shard, chunks are split
+    by id into num_shards such indexes (common/bm25_shards.py) scored in
+    parallel at query time. The index is rebuilt from scratch if there is none
+    yet or it was built with other BM25 parameters or number of shards.
+    
+    The "bm25s" backend uses the bm25s library with its English stopwords and
+    always rebuilds the index, tokenizing the chunk texts prefixed with their
+    section headers and saving the model along with the chunk ids.
+    
+    Chunk texts are not duplicated in the index, they are read from the chunk
+    store at query time. Full rebuilds are written to a temporary directory
+    first and then swapped in place, so running searchers never see a
+    half-written index.
     
     Args:
-        input_dir: Directory containing text files to encode
+        chunk_store_path: Directory of the chunk store to encode
         encodings_db_path: Path where to save the BM25 model and corpus
+        backend: BM25 engine, "native" or "bm25s"
+        num_shards: Number of shards of the native index
     """
+    tmp_path = f"{encodings_db_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    if backend == "native":
+        manifest = load_bm25_segments_manifest(bm25_shard_paths(encodings_db_path)[0])
+        if (
+            manifest is not None
+            and (manifest.k1, manifest.b, manifest.stemming) == (BM25_K1, BM25_B, BM25_STEMMING)
+            and bm25_index_num_shards(encodings_db_path) == max(num_shards, 1)
+        ):
+            update_bm25_shards(chunk_store_path, encodings_db_path, num_shards)
+            return
+        update_bm25_shards(chunk_store_path, tmp_path, num_shards)
+        _swap_index_dir(tmp_path, encodings_db_path)
+        return
+
+    if backend != "bm25s":
+        raise ValueError(f"Unknown BM25 backend: {backend}")
+
     import bm25s
 
+    store = get_chunk_store(chunk_store_path)
+
     # Create your corpus here
     corpus = []
-    for file in tqdm(os.listdir(input_dir), desc="Generating BM25 encodings"):
-        with open(input_dir / file, 'r', encoding='utf-8') as f:
-            text = f.read()
-            corpus.append(text)
+    index_texts = []
+    for chunk_id, chunk in tqdm(store.iter_chunks(), total=len(store), desc="Generating BM25 encodings"):
+        corpus.append({"id": chunk_id})
+        index_texts.append(chunk_index_text(chunk))
 
     # Tokenize the corpus and only keep the ids (faster and saves memory)
-    corpus_tokens = bm25s.tokenize(corpus, stopwords="en")
+    corpus_tokens = bm25s.tokenize(index_texts, stopwords="en")
 
     # Create the BM25 model and index the corpus
     retriever = bm25s.BM25()
     retriever.index(corpus_tokens)
 
-    # You can save the arrays to a directory...
-    retriever.save(encodings_db_path)
+    # Save the model along with the corpus next to the live index
+    retriever.save(tmp_path, corpus=corpus)
+
+    # Swap the new index in place of the old one
+    _swap_index_dir(tmp_path, encodings_db_path)
+
+
+class BM25Searcher:
+    """
+    Long-lived BM25 index kept in memory for serving many queries.
+    
+    Serves sharded, segmented and single native indexes (common/bm25_shards.py,
+    common/bm25_segments.py, common/bm25_engine.py) as well as bm25s ones,
+    depending on what the index directory holds. The index arrays are memory-mapped, so
+    loading is cheap and the pages are shared with the OS cache. Before each query the searcher checks
+    whether the index directory was replaced (e.g. by rag_pipeline.py) and, if
+    so, loads the new version and swaps it in atomically. Queries already
+    running keep using the version they started with.
+    """
+
+    def __init__(self, encodings_db_path: str, chunk_store_path: str = CHUNK_STORE_PATH):
+        """
+        Load the BM25 index.
+        
+        Args:
+            encodings_db_path: Path to the saved BM25 model and corpus
+            chunk_store_path: Directory of the chunk store with the chunk texts
+        """
+        self.encodings_db_path = encodings_db_path
+        self.chunk_store_path = chunk_store_path
+        self._retriever = None
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self.reload_if_changed()
+
+    def _get_signature(self) -> Optional[Tuple[int, ...]]:
+        """Identify the index version on disk by the inode and mtime of its segments manifests or directory."""
+        return bm25_index_signature(self.encodings_db_path)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Load the index from disk if it changed since the last load.
+        
+        Only one thread reloads at a time. Other threads do not wait for the
+        reload and keep querying the currently loaded index.
+        
+        Returns:
+            True if a new index version was loaded, False otherwise
+        """
+        signature = self._get_signature()
+        if signature is None or signature == self._signature:
+            return False
+
+        if not self._reload_lock.acquire(blocking=self._retriever is None):
+            return False
+        try:
+            if signature == self._signature:
+                return False
+            if load_bm25_shards_manifest(self.encodings_db_path) is not None:
+                retriever = ShardedBM25Index.load(self.encodings_db_path, mmap=True)
+            elif load_bm25_segments_manifest(self.encodings_db_path) is not None:
+                retriever = SegmentedBM25Index.load(self.encodings_db_path, mmap=True)
+            elif is_native_bm25_index(self.encodings_db_path):
+                retriever = BM25Index.load(self.encodings_db_path, mmap=True)
+            else:
+                import bm25s
+
+                retriever = bm25s.BM25.load(
+                    self.encodings_db_path, load_corpus=True, mmap=True, show_progress=False
+                )
+            # Swap the reference - a single assignment is atomic for other threads
+            self._retriever = retriever
+            self._signature = signature
+            print(f"Loaded BM25 index from {self.encodings_db_path}")
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def search(self, query: str, db_chunks_number: int) -> List[SearchResult]:
+        """
+        Retrieve top-k results for a given query.
+        
+        Args:
+            query: Search query string
+            db_chunks_number: Number of top results to return
+            
+        Returns:
+            List of SearchResult objects containing document id, score, and text for each result
+        """
+        self.reload_if_changed()
+        retriever = self._retriever
+        if retriever is None:
+            raise FileNotFoundError(f"BM25 index not found: {self.encodings_db_path}")
+
+        if isinstance(retriever, (BM25Index, SegmentedBM25Index, ShardedBM25Index)):
+            chunk_ids, scores = retriever.search(query, db_chunks_number)
+            return hydrate_search_results(chunk_ids.tolist(), scores.tolist(), self.chunk_store_path)
+
+        import bm25s
+
+        query = query.lower()
+        query_tokens = bm25s.tokenize(query, return_ids=False, show_progress=False)
+
+        k = min(db_chunks_number, len(retriever.corpus))
+        results, scores = retriever.retrieve(query_tokens, k=k, show_progress=False)
 
-    # You can save the corpus along with the model
-    retriever.save(encodings_db_path, corpus=corpus)
+        chunk_ids = [int(doc["id"]) for doc in results[0]]
+
+        return hydrate_search_results(chunk_ids, scores[0].tolist(), self.chunk_store_path)
+
+
+# Process-wide registry of loaded BM25 searchers
+_bm25_searchers: Dict[str, BM25Searcher] = {}
+_bm25_searchers_lock = threading.Lock()
+
+
+def get_bm25_searcher(encodings_db_path: str) -> BM25Searcher:
+    """
+    Get the process-wide BM25 searcher for an index, loading it on first use.
+    
+    Args:
+        encodings_db_path: Path to the saved BM25 model and corpus
+        
+    Returns:
+        BM25Searcher instance serving the index
+    """
+    searcher = _bm25_searchers.get(encodings_db_path)
+    if searcher is not None:
+        return searcher
+
+    with _bm25_searchers_lock:
+        searcher = _bm25_searchers.get(encodings_db_path)
+        if searcher is None:
+            searcher = BM25Searcher(encodings_db_path)
+            _bm25_searchers[encodings_db_path] = searcher
+
+    return searcher
 
 
 def get_top_k_bm25_encoding_results(query: str, encodings_db_path: str, db_chunks_number: int) -> List[SearchResult]:
     """
     Retrieve top-k results from BM25 model for a given query.
     
-    Loads a pre-trained BM25 model, tokenizes the query, and returns the most
-    relevant documents ranked by BM25 scores.
+    Uses the process-wide BM25 searcher for the index (loaded once and reloaded
+    only when the index changes on disk), tokenizes the query, and returns the
+    most relevant documents ranked by BM25 scores.
     
     Args:
         query: Search query string
@@ -54,22 +250,23 @@ def get_top_k_bm25_encoding_results(query: str, encodings_db_path: str, db_chunk
     Returns:
         List of SearchResult objects containing document id, score, and text for each result
     """
-    import bm25s
-
-    retriever = bm25s.BM25.load(encodings_db_path, load_corpus=True)
+    searcher = get_bm25_searcher(encodings_db_path)
 
-    query = query.lower()
-    query_tokens = bm25s.tokenize(query, return_ids=False)
+    return searcher.search(query, db_chunks_number)
 
-    results, scores = retriever.retrieve(query_tokens, k=db_chunks_number)
 
-    search_results = []
-    for i in range(results.shape[1]):
-        doc, score = results[0, i], scores[0, i]
-        search_results.append(SearchResult(
-            id=doc["id"],
-            score=float(score),
-            text=doc["text"]
-        ))
-
-    return search_results
+async def aget_top_k_bm25_encoding_results(query: str, encodings_db_path: str, db_chunks_number: int) -> List[SearchResult]:
+    """
+    Retrieve top-k results from BM25 model without blocking the event loop.
+    
+    The CPU-bound scoring runs in a worker thread.
+    
+    Args:
+        query: Search query string
+        encodings_db_path: Path to the saved BM25 model and corpus
+        db_chunks_number: Number of top results to return
+        
+    Returns:
+        List of SearchResult objects containing document id, score, and text for each result
+    """
+    return await asyncio.to_thread(get_top_k_bm25_encoding_results, query, encodings_db_path, db_chunks_number)
@@ -0,0 +1,742 @@
+import json
+import os
+import re
+import numpy as np
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from common.constants import BM25_K1, BM25_B, BM25_STEMMING, BM25_BLOCK_SIZE
+
+
+# Files of a native BM25 index directory
+BM25_PARAMS_FILE = "params.json"
+BM25_VOCAB_FILE = "vocab.json"
+
+# Arrays of a native BM25 index directory (the pruning arrays are rebuilt on load if missing)
+BM25_POSTINGS_ARRAYS = ("indptr", "indices", "tfs", "doc_lengths", "chunk_ids")
+BM25_PRUNING_ARRAYS = ("block_ptr", "block_max_tf", "block_min_dl", "doc_indptr", "doc_terms", "doc_tfs")
+
+# Relative slack of the score upper bounds, covering float32 rounding of the exact scores
+_BOUND_MARGIN = 1e-5
+
+# Approximate cost of looking up one (document, term) pair, and of reading one posting with
+# pruning, relative to scoring one posting exhaustively
+_LOOKUP_COST = 20
+_PRUNED_POSTING_COST = 16
+
+# Number of postings of the query terms below which they are all scored without pruning
+_MIN_PRUNING_POSTINGS = 100_000
+
+# Polish function words (plus a few English ones, as the documents mix in English terms)
+POLISH_STOPWORDS = frozenset("""
+a aby ach acz aczkolwiek aj albo ale ależ ani aż bardziej bardzo bez bo bowiem by byli bym bynajmniej być był
+była było były będzie będą cali cała cały ci cię ciebie co cokolwiek coś czasami czasem czemu czy czyli
+daleko dla dlaczego dlatego do dobrze dokąd dość dużo dwa dwaj dwie dwoje dziś dzisiaj gdy gdyby gdyż gdzie
+gdziekolwiek gdzieś i ich ile im inna inne inny innych iż ja ją jak jakaś jakby jaki jakichś jakie jakiś
+jakiż jakkolwiek jako jakoś je jeden jedna jedno jednak jednakże jego jej jemu jest jestem jeszcze jeśli
+jeżeli już każdy kiedy kilka kimś kto ktokolwiek ktoś która które którego której który których którym
+którzy ku lecz lub ma mają mało mam mi mimo między mną mnie mogą moi moim moja moje może możliwe można mój
+mu musi my na nad nam nami nas nasi nasz nasza nasze naszego naszych natomiast natychmiast nawet nią nic
+nich nie niech niego niej niemu nigdy nim nimi niż no o obok od około on ona one oni ono oraz oto owszem
+pan pana pani po pod podczas pomimo ponad ponieważ powinien powinna powinni powinno poza prawie przecież
+przed przede przedtem przez przy również sam sama są się skąd sobie sobą swoje ta tak taka taki takie
+także tam te tego tej temu ten teraz też to tobą tobie toteż trzeba tu tutaj twoi twoim twoja twoje twym
+twój ty tych tylko tym u w wam wami was wasz wasza wasze we według wiele wielu więc więcej wszyscy
+wszystkich wszystkie wszystkim wszystko wtedy wy właśnie z za zapewne zawsze ze znowu znów został żaden
+żadna żadne żadnych że żeby
+the of and or for with to in on at by is are be as an from that this
+""".split())
+
+# Inflectional suffixes removed by light_stem(), longest first
+_POLISH_SUFFIXES = tuple(sorted("""
+ościami ościach owania owanie owaniu ności ością ości ość owych owymi owego owej owym owie owa owe
+aniem eniem ania enia aniu eniu anie enie ach ami ego emu ich imi ych ymi ej ów om owi em ie ia iu ią
+ię a ą e ę i o u y
+""".split(), key=len, reverse=True))
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1 << 18)
+def light_stem(token: str) -> str:
+    """
+    Remove the longest known inflectional suffix from a Polish word.
+    
+    This is a light, rule-based stemmer: it only strips the suffix if at
+    least three letters remain, and leaves short words and tokens with digits
+    untouched, so model names like "gpt" or "3b" are not affected.
+    Stems are cached, as the same words repeat across documents.
+    
+    Args:
+        token: Lowercase word
+    
+    Returns:
+        Stem of the word
+    """
+    if len(token) < 5 or not token.isalpha():
+        return token
+    for suffix in _POLISH_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str, stemming: bool = BM25_STEMMING) -> List[str]:
+    """
+    Tokenize text for the native BM25 engine.
+    
+    The same function is used for documents and queries: text is lowercased,
+    split into words, Polish (and common English) stopwords are removed and,
+    optionally, words are stemmed with light_stem().
+    
+    Args:
+        text: Text to tokenize
+        stemming: Whether to apply light stemming
+    
+    Returns:
+        List of tokens in text order
+    """
+    tokens = [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in POLISH_STOPWORDS]
+    if stemming:
+        tokens = [light_stem(token) for token in tokens]
+    return tokens
+
+
+def bm25_idf(document_frequencies: np.ndarray, num_docs: int) -> np.ndarray:
+    """
+    Compute BM25 IDF weights (Lucene variant, always positive).
+    
+    Args:
+        document_frequencies: Number of documents containing each term
+        num_docs: Number of documents in the corpus
+    
+    Returns:
+        float32 array of IDF weights
+    """
+    df = np.asarray(document_frequencies, dtype=np.float64)
+    return np.log1p((num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Select the indices of the k highest positive scores.
+    
+    Uses np.argpartition, so only the selected scores are sorted. Ties are
+    broken by index, which keeps results deterministic.
+    
+    Args:
+        scores: Score of every document
+        k: Number of results
+    
+    Returns:
+        Indices of the top documents, best first
+    """
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidate_scores = scores[candidates]
+        # Keep everything tied with the k-th score, so ties are broken by index below
+        kth_score = np.partition(candidate_scores, len(candidates) - k)[len(candidates) - k]
+        candidates = candidates[candidate_scores >= kth_score]
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate np.arange(start, start + length) for every start and length."""
+    total = int(np.sum(lengths))
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(np.asarray(starts, dtype=np.int64) - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total, dtype=np.int64)
+
+
+def _sum_in_term_order(contributions: np.ndarray) -> np.ndarray:
+    """
+    Sum the contributions of every document (row) in query term (column) order.
+    
+    Matches the float64 accumulation of np.bincount in BM25Index.score(), so
+    the float32 scores are bit-identical.
+    """
+    scores = np.zeros(len(contributions), dtype=np.float64)
+    for term in range(contributions.shape[1]):
+        scores += contributions[:, term]
+    return scores.astype(np.float32)
+
+
+def _impact_order(indptr: np.ndarray, indices: np.ndarray, tfs: np.ndarray, doc_lengths: np.ndarray, k1: float, b: float) -> np.ndarray:
+    """
+    Order the postings of every term by their BM25 impact, highest first.
+    
+    The impact is the term frequency part of the BM25 score under the
+    average document length of the index. Ties are ordered by document.
+    
+    Returns:
+        Permutation of the postings
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    avgdl = float(np.mean(doc_lengths)) if len(doc_lengths) else 1.0
+    lengths = doc_lengths[indices]
+    impacts = tfs / (tfs + k1 * (1 - b + b * lengths / (avgdl or 1.0)))
+    return np.lexsort((indices, -impacts, rows))
+
+
+def _posting_blocks(indptr: np.ndarray, indices: np.ndarray, tfs: np.ndarray, doc_lengths: np.ndarray, block_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split the postings of every term into blocks and summarize each block.
+    
+    The largest term frequency and the smallest document length of a block
+    give an upper bound of the BM25 score of its postings for any IDF and
+    average document length.
+    
+    Returns:
+        Tuple of (block_ptr, block_max_tf, block_min_dl), where block_ptr[t]
+        is the first block of term t
+    """
+    num_blocks = (np.diff(indptr) + block_size - 1) // block_size
+    block_ptr = np.concatenate(([0], np.cumsum(num_blocks))).astype(np.int64)
+    block_starts = np.repeat(np.asarray(indptr[:-1], dtype=np.int64), num_blocks) + block_size * (
+        np.arange(block_ptr[-1], dtype=np.int64) - np.repeat(block_ptr[:-1], num_blocks)
+    )
+    if len(block_starts) == 0:
+        return block_ptr, np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+    block_max_tf = np.maximum.reduceat(np.asarray(tfs), block_starts)
+    block_min_dl = np.minimum.reduceat(np.asarray(doc_lengths)[indices], block_starts)
+    return block_ptr, block_max_tf.astype(np.float32), block_min_dl.astype(np.float32)
+
+
+def _forward_index(indptr: np.ndarray, indices: np.ndarray, tfs: np.ndarray, num_docs: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the document-major (CSC) view of the postings.
+    
+    Returns:
+        Tuple of (doc_indptr, doc_terms, doc_tfs), where the terms of every
+        document are sorted
+    """
+    from scipy.sparse import csr_matrix
+
+    postings = csr_matrix((np.asarray(tfs), np.asarray(indices), np.asarray(indptr)), shape=(len(indptr) - 1, num_docs)).tocsc()
+    postings.sort_indices()
+    return postings.indptr.astype(np.int64), postings.indices.astype(np.int32), postings.data.astype(np.float32)
+
+
+class BM25Index:
+    """
+    Native BM25 index with term-major CSR postings.
+    
+    Row t of the postings matrix holds the documents containing term t
+    (indices) and the term frequencies in them (tfs). Raw term frequencies
+    and document lengths are stored instead of precomputed weights, so the
+    same index can be scored with corpus statistics other than its own (see
+    score()). A query only touches the postings of its own terms.
+    
+    For top-k queries the postings of every term are ordered by impact and
+    split into blocks with score upper bounds, so top_k_documents() can stop
+    before reading the blocks that cannot reach the top-k. A document-major
+    copy of the postings (doc_indptr, doc_terms, doc_tfs) is used to score
+    the remaining candidates exactly.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, tfs: np.ndarray, doc_lengths: np.ndarray, chunk_ids: np.ndarray, vocab: Dict[str, int], k1: float = BM25_K1, b: float = BM25_B, stemming: bool = BM25_STEMMING, block_size: int = BM25_BLOCK_SIZE, block_ptr: Optional[np.ndarray] = None, block_max_tf: Optional[np.ndarray] = None, block_min_dl: Optional[np.ndarray] = None, doc_indptr: Optional[np.ndarray] = None, doc_terms: Optional[np.ndarray] = None, doc_tfs: Optional[np.ndarray] = None):
+        """
+        Args:
+            indptr: CSR row pointers, one row per term (length num_terms + 1)
+            indices: Document index of every posting
+            tfs: Term frequency of every posting
+            doc_lengths: Number of tokens of every document
+            chunk_ids: Chunk id of every document
+            vocab: Term -> row of the postings matrix
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            stemming: Whether documents were tokenized with light stemming
+            block_size: Number of postings per block
+            block_ptr: First block of every term (length num_terms + 1)
+            block_max_tf: Largest term frequency of every block
+            block_min_dl: Smallest document length of every block
+            doc_indptr: CSC column pointers, one column per document (length num_docs + 1)
+            doc_terms: Term of every posting, sorted within each document
+            doc_tfs: Term frequency of every posting in doc_terms order
+        
+        If the pruning arrays are not given, the postings are reordered by
+        impact and the arrays are computed.
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.chunk_ids = chunk_ids
+        self.vocab = vocab
+        self.k1 = k1
+        self.b = b
+        self.stemming = stemming
+        self.block_size = block_size
+
+        if block_ptr is None:
+            order = _impact_order(indptr, indices, tfs, doc_lengths, k1, b)
+            self.indices = np.asarray(indices)[order]
+            self.tfs = np.asarray(tfs)[order]
+            block_ptr, block_max_tf, block_min_dl = _posting_blocks(indptr, self.indices, self.tfs, doc_lengths, block_size)
+        if doc_indptr is None:
+            doc_indptr, doc_terms, doc_tfs = _forward_index(indptr, self.indices, self.tfs, len(doc_lengths))
+        self.block_ptr = block_ptr
+        self.block_max_tf = block_max_tf
+        self.block_min_dl = block_min_dl
+        self.doc_indptr = doc_indptr
+        self.doc_terms = doc_terms
+        self.doc_tfs = doc_tfs
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, List[str]]], k1: float = BM25_K1, b: float = BM25_B, stemming: bool = BM25_STEMMING) -> "BM25Index":
+        """
+        Build an index from tokenized documents.
+        
+        Args:
+            documents: Tuples of (chunk id, tokens from tokenize())
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            stemming: Whether documents were tokenized with light stemming
+        
+        Returns:
+            Built BM25Index
+        """
+        from scipy.sparse import csr_matrix
+
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        data: List[int] = []
+        doc_lengths: List[int] = []
+        chunk_ids: List[int] = []
+
+        for doc, (chunk_id, tokens) in enumerate(documents):
+            for term, tf in Counter(tokens).items():
+                rows.append(vocab.setdefault(term, len(vocab)))
+                cols.append(doc)
+                data.append(tf)
+            doc_lengths.append(len(tokens))
+            chunk_ids.append(chunk_id)
+
+        postings = csr_matrix(
+            (np.asarray(data, dtype=np.float32), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=(len(vocab), len(chunk_ids)),
+        )
+        postings.sort_indices()
+
+        return cls(
+            indptr=postings.indptr.astype(np.int64),
+            indices=postings.indices.astype(np.int32),
+            tfs=postings.data.astype(np.float32),
+            doc_lengths=np.asarray(doc_lengths, dtype=np.float32),
+            chunk_ids=np.asarray(chunk_ids, dtype=np.int64),
+            vocab=vocab,
+            k1=k1,
+            b=b,
+            stemming=stemming,
+        )
+
+    @classmethod
+    def merge(cls, indexes: List["BM25Index"], keep: List[Optional[np.ndarray]]) -> "BM25Index":
+        """
+        Merge indexes into one without re-tokenizing their documents.
+        
+        The postings of every index are remapped to a common vocabulary and
+        document numbering. Documents not kept (e.g. deleted ones) are dropped.
+        
+        Args:
+            indexes: Indexes to merge, built with the same parameters
+            keep: Boolean mask of the documents to keep for each index (None keeps all)
+        
+        Returns:
+            Merged BM25Index
+        """
+        from scipy.sparse import csr_matrix
+
+        vocab: Dict[str, int] = {}
+        rows: List[np.ndarray] = []
+        cols: List[np.ndarray] = []
+        data: List[np.ndarray] = []
+        doc_lengths: List[np.ndarray] = []
+        chunk_ids: List[np.ndarray] = []
+        num_docs = 0
+
+        for index, keep_docs in zip(indexes, keep):
+            if keep_docs is None:
+                keep_docs = np.ones(index.num_docs, dtype=bool)
+            new_docs = np.cumsum(keep_docs) - 1 + num_docs
+
+            term_rows = np.empty(len(index.vocab), dtype=np.int64)
+            for term, row in index.vocab.items():
+                term_rows[row] = vocab.setdefault(term, len(vocab))
+
+            posting_terms = np.repeat(term_rows, np.diff(index.indptr))
+            kept_postings = keep_docs[index.indices]
+            rows.append(posting_terms[kept_postings])
+            cols.append(new_docs[index.indices[kept_postings]])
+            data.append(np.asarray(index.tfs[kept_postings]))
+            doc_lengths.append(np.asarray(index.doc_lengths[keep_docs]))
+            chunk_ids.append(np.asarray(index.chunk_ids[keep_docs]))
+            num_docs += int(np.count_nonzero(keep_docs))
+
+        postings = csr_matrix(
+            (np.concatenate(data).astype(np.float32), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(vocab), num_docs),
+        )
+        postings.sort_indices()
+
+        return cls(
+            indptr=postings.indptr.astype(np.int64),
+            indices=postings.indices.astype(np.int32),
+            tfs=postings.data.astype(np.float32),
+            doc_lengths=np.concatenate(doc_lengths).astype(np.float32),
+            chunk_ids=np.concatenate(chunk_ids).astype(np.int64),
+            vocab=vocab,
+            k1=indexes[0].k1,
+            b=indexes[0].b,
+            stemming=indexes[0].stemming,
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Save the index to a directory.
+        
+        Args:
+            path: Directory to save the index to (created if needed)
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in BM25_POSTINGS_ARRAYS + BM25_PRUNING_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, BM25_VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        with open(os.path.join(path, BM25_PARAMS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"engine": "native", "k1": self.k1, "b": self.b, "stemming": self.stemming, "block_size": self.block_size}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "BM25Index":
+        """
+        Load an index saved with save().
+        
+        Args:
+            path: Directory of the index
+            mmap: Whether to memory-map the postings instead of reading them into memory
+        
+        Returns:
+            Loaded BM25Index
+        """
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in BM25_POSTINGS_ARRAYS
+        }
+        if all(os.path.exists(os.path.join(path, f"{name}.npy")) for name in BM25_PRUNING_ARRAYS):
+            arrays.update({
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                for name in BM25_PRUNING_ARRAYS
+            })
+        with open(os.path.join(path, BM25_VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(path, BM25_PARAMS_FILE), "r", encoding="utf-8") as f:
+            params = json.load(f)
+
+        return cls(
+            **arrays,
+            vocab=vocab,
+            k1=params["k1"],
+            b=params["b"],
+            stemming=params["stemming"],
+            block_size=params.get("block_size", BM25_BLOCK_SIZE),
+        )
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def avgdl(self) -> float:
+        return float(np.mean(self.doc_lengths)) if self.num_docs else 0.0
+
+    def term_ids(self, tokens: List[str]) -> np.ndarray:
+        """
+        Map query tokens to postings rows, dropping unknown and repeated terms.
+        
+        Args:
+            tokens: Query tokens from tokenize()
+        
+        Returns:
+            Array of postings rows
+        """
+        return np.asarray(sorted({self.vocab[token] for token in tokens if token in self.vocab}), dtype=np.int64)
+
+    def document_frequencies(self, term_ids: np.ndarray) -> np.ndarray:
+        """
+        Get the number of documents containing each term.
+        
+        Args:
+            term_ids: Postings rows
+        
+        Returns:
+            Array of document frequencies
+        """
+        return (self.indptr[term_ids + 1] - self.indptr[term_ids]).astype(np.int64)
+
+    def score(self, term_ids: np.ndarray, idf: np.ndarray, avgdl: float) -> np.ndarray:
+        """
+        Compute BM25 scores of all documents for a query.
+        
+        The postings of all query terms are scored at once and summed per
+        document with np.bincount.
+        
+        Args:
+            term_ids: Postings rows of the query terms
+            idf: IDF weight of each query term
+            avgdl: Average document length of the corpus
+        
+        Returns:
+            float32 array of scores, one per document
+        """
+        if len(term_ids) == 0 or self.num_docs == 0:
+            return np.zeros(self.num_docs, dtype=np.float32)
+
+        starts = self.indptr[term_ids]
+        ends = self.indptr[term_ids + 1]
+        docs = np.concatenate([self.indices[start:end] for start, end in zip(starts, ends)])
+        tfs = np.concatenate([self.tfs[start:end] for start, end in zip(starts, ends)])
+        weights = np.repeat(idf, ends - starts)
+
+        norms = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / (avgdl or 1.0))
+        contributions = weights * tfs * (self.k1 + 1) / (tfs + norms)
+
+        return np.bincount(docs, weights=contributions, minlength=self.num_docs).astype(np.float32)
+
+    def _lookup_tfs(self, docs: np.ndarray, term_ids: np.ndarray) -> np.ndarray:
+        """
+        Look up term frequencies of (document, term) pairs in the document-major postings.
+        
+        All pairs are binary-searched at once, each within the sorted terms
+        of its document.
+        
+        Args:
+            docs: Document index of every pair
+            term_ids: Postings row of every pair
+        
+        Returns:
+            float32 array of term frequencies, 0 for terms missing from the document
+        """
+        lo = np.asarray(self.doc_indptr[docs], dtype=np.int64)
+        ends = np.asarray(self.doc_indptr[docs + 1], dtype=np.int64)
+        hi = ends.copy()
+        for _ in range(int(np.max(ends - lo, initial=0)).bit_length()):
+            mid = (lo + hi) >> 1
+            searching = lo < hi
+            less = self.doc_terms[np.minimum(mid, len(self.doc_terms) - 1)] < term_ids
+            lo = np.where(searching & less, mid + 1, lo)
+            hi = np.where(searching & ~less, mid, hi)
+
+        positions = np.minimum(lo, len(self.doc_terms) - 1)
+        found = (lo < ends) & (self.doc_terms[positions] == term_ids)
+        return np.where(found, self.doc_tfs[positions], np.float32(0))
+
+    def _contributions(self, docs: np.ndarray, tfs: np.ndarray, idf: np.ndarray, avgdl: float) -> np.ndarray:
+        """
+        Compute BM25 contributions of postings with the same float32 arithmetic as score().
+        
+        Args:
+            docs: Document index of every posting
+            tfs: float32 term frequency of every posting
+            idf: float32 IDF weight of the term of every posting
+            avgdl: Average document length of the corpus
+        
+        Returns:
+            float32 array of contributions
+        """
+        norms = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / avgdl)
+        return idf * tfs * (self.k1 + 1) / (tfs + norms)
+
+    def _exhaustive_top_k(self, term_ids: np.ndarray, idf: np.ndarray, avgdl: float, k: int, live: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Score every posting of the query terms and select the top-k documents."""
+        scores = self.score(term_ids, idf, avgdl)
+        if live is not None:
+            scores[~live] = 0
+        top = top_k(scores, k)
+        return top, scores[top]
+
+    def top_k_documents(self, term_ids: np.ndarray, idf: np.ndarray, avgdl: float, k: int, live: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top-k documents for a query without scoring every posting.
+        
+        Dynamic pruning with block score upper bounds (MaxScore with block-max
+        filtering):
+        
+        1. The postings of the first (highest impact) block of every query
+           term are read, the k-th best partial score of their documents is a
+           threshold that the top-k documents must reach.
+        2. Terms whose upper bounds add up to less than the threshold are
+           non-essential: a document containing only them cannot reach it, so
+           their postings are not read (these are the frequent, low IDF terms
+           with the longest postings).
+        3. Blocks of the essential terms whose upper bound, plus the upper
+           bounds of all other terms, is below the threshold are skipped. If
+           too few postings can be skipped, all postings are scored instead.
+        4. Documents of the remaining blocks whose partial score, plus bounds
+           of their unread terms at their own length, can reach the threshold
+           are candidates. The k-th best partial score may raise the threshold.
+        5. The unread contributions of the candidates are looked up in the
+           document-major postings, or read from the skipped blocks of a term
+           when that is cheaper, and the candidates are scored exactly.
+        
+        Contributions are computed and summed like in score(), so the result
+        is exactly top_k(score(...), k), including scores and order of ties.
+        
+        Args:
+            term_ids: Postings rows of the query terms
+            idf: IDF weight of each query term
+            avgdl: Average document length of the corpus
+            k: Number of results
+            live: Boolean mask of the documents that may be returned (None allows all)
+        
+        Returns:
+            Tuple of (document indices, scores), best first
+        """
+        if len(term_ids) == 0 or self.num_docs == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        term_lengths = self.indptr[term_ids + 1] - self.indptr[term_ids]
+        if np.sum(term_lengths) < _MIN_PRUNING_POSTINGS or len(term_ids) > 52:
+            # Short postings are scored faster than pruned; terms read per document are tracked as bits of a float64
+            return self._exhaustive_top_k(term_ids, idf, avgdl, k, live)
+        avgdl = avgdl or 1.0
+        num_terms = len(term_ids)
+
+        # Upper bound of every block of the query terms and of every term
+        term_blocks = self.block_ptr[term_ids + 1] - self.block_ptr[term_ids]
+        blocks = _ranges(self.block_ptr[term_ids], term_blocks)
+        block_terms = np.repeat(np.arange(num_terms), term_blocks)
+        rows = term_ids[block_terms]
+        block_starts = self.indptr[rows] + (blocks - self.block_ptr[rows]) * self.block_size
+        block_lengths = np.minimum(block_starts + self.block_size, self.indptr[rows + 1]) - block_starts
+        max_tfs = np.asarray(self.block_max_tf[blocks], dtype=np.float64)
+        min_dls = np.asarray(self.block_min_dl[blocks], dtype=np.float64)
+        bounds = idf[block_terms] * max_tfs * (self.k1 + 1) / (max_tfs + self.k1 * (1 - self.b + self.b * min_dls / avgdl))
+        bounds *= 1 + _BOUND_MARGIN
+        term_bounds = np.zeros(num_terms)
+        np.maximum.at(term_bounds, block_terms, bounds)
+
+        # 1. Threshold from the partial scores (lower bounds of the exact ones) over the first block of every term
+        first_lengths = np.minimum(term_lengths, self.block_size)
+        first_terms = np.repeat(np.arange(num_terms), first_lengths)
+        first_positions = _ranges(self.indptr[term_ids], first_lengths)
+        first_docs = np.asarray(self.indices[first_positions], dtype=np.int64)
+        first_contributions = self._contributions(first_docs, self.tfs[first_positions], idf[first_terms], avgdl)
+        sample, sample_inverse = np.unique(first_docs, return_inverse=True)
+        sample_scores = np.bincount(sample_inverse, weights=first_contributions, minlength=len(sample))
+        if live is not None:
+            sample_scores = sample_scores[live[sample]]
+        threshold = 0.0
+        if len(sample_scores) >= k:
+            threshold = np.partition(sample_scores, len(sample_scores) - k)[len(sample_scores) - k] * (1 - _BOUND_MARGIN)
+
+        # 2. Non-essential terms: the lowest bounds adding up to less than the threshold
+        by_bound = np.argsort(term_bounds, kind="stable")
+        essential = np.ones(num_terms, dtype=bool)
+        essential[by_bound[np.cumsum(term_bounds[by_bound]) < threshold]] = False
+
+        # 3. Blocks of essential terms that can reach the threshold together with the other terms
+        keep = essential[block_terms] & (bounds + (np.sum(term_bounds) - term_bounds[block_terms]) >= threshold)
+        unread_bounds = np.zeros(num_terms)
+        np.maximum.at(unread_bounds, block_terms[~keep], bounds[~keep])
+        unread_max_tfs = np.zeros(num_terms)
+        np.maximum.at(unread_max_tfs, block_terms[~keep], max_tfs[~keep])
+
+        if np.sum(block_lengths[keep]) * _PRUNED_POSTING_COST > np.sum(term_lengths):
+            # Too little can be skipped for pruning to pay off
+            return self._exhaustive_top_k(term_ids, idf, avgdl, k, live)
+
+        posting_terms = np.repeat(block_terms[keep], block_lengths[keep])
+        positions = _ranges(block_starts[keep], block_lengths[keep])
+        docs = np.asarray(self.indices[positions], dtype=np.int64)
+        contributions = self._contributions(docs, self.tfs[positions], idf[posting_terms], avgdl)
+
+        # 4. Candidates whose partial score plus the bounds of their unread terms reach the threshold
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        partial_scores = np.bincount(inverse, weights=contributions, minlength=len(candidates))
+        # A (document, term) pair is read at most once, so summing the term bits sets them
+        read_terms = np.bincount(inverse, weights=np.ldexp(1.0, posting_terms), minlength=len(candidates)).astype(np.uint64)
+        term_bits = np.left_shift(np.uint64(1), np.arange(num_terms, dtype=np.uint64))
+        unread = ((read_terms[:, None] & term_bits) == 0) & (unread_bounds > 0)
+        # Bound of an unread term of a document: its largest unread term frequency at the document's own length
+        candidate_norms = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lengths[candidates], dtype=np.float64)[:, None] / avgdl)
+        unread_term_bounds = np.minimum(
+            unread_bounds,
+            idf * unread_max_tfs * (self.k1 + 1) / (unread_max_tfs + candidate_norms) * (1 + _BOUND_MARGIN),
+        )
+        upper_bounds = partial_scores + np.sum(unread * unread_term_bounds, axis=1)
+        reachable = upper_bounds >= threshold
+        if live is not None:
+            reachable &= live[candidates]
+        # Partial scores are lower bounds of the exact ones, so the k-th best of them may raise the threshold
+        if np.count_nonzero(reachable) > k:
+            reachable_scores = partial_scores[reachable]
+            kth_partial = np.partition(reachable_scores, len(reachable_scores) - k)[len(reachable_scores) - k] * (1 - _BOUND_MARGIN)
+            if kth_partial > threshold:
+                threshold = kth_partial
+                reachable &= upper_bounds >= threshold
+
+        candidate_rows = np.full(len(candidates), -1, dtype=np.int64)
+        candidate_rows[reachable] = np.arange(np.count_nonzero(reachable))
+        posting_rows = candidate_rows[inverse]
+        read = posting_rows >= 0
+        candidates, unread = candidates[reachable], unread[reachable]
+        candidate_contributions = np.zeros((len(candidates), num_terms), dtype=np.float32)
+        candidate_contributions[posting_rows[read], posting_terms[read]] = contributions[read]
+
+        # 5. Complete the unread contributions term by term, by lookups or by reading the skipped blocks
+        doc_rows = None
+        for term in np.flatnonzero(unread.any(axis=0)):
+            pairs = np.flatnonzero(unread[:, term])
+            skipped = ~keep & (block_terms == term)
+            if len(pairs) * _LOOKUP_COST < np.sum(block_lengths[skipped]):
+                pair_docs = candidates[pairs]
+                tfs = self._lookup_tfs(pair_docs, np.full(len(pairs), term_ids[term]))
+                candidate_contributions[pairs, term] = self._contributions(pair_docs, tfs, idf[term], avgdl)
+                continue
+            if doc_rows is None:
+                doc_rows = np.full(self.num_docs, -1, dtype=np.int64)
+                doc_rows[candidates] = np.arange(len(candidates))
+            positions = _ranges(block_starts[skipped], block_lengths[skipped])
+            term_docs = np.asarray(self.indices[positions], dtype=np.int64)
+            term_rows = doc_rows[term_docs]
+            found = term_rows >= 0
+            candidate_contributions[term_rows[found], term] = self._contributions(term_docs[found], self.tfs[positions][found], idf[term], avgdl)
+
+        scores = _sum_in_term_order(candidate_contributions)
+        top = top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieve the top-k documents for a query using the statistics of this index.
+        
+        Args:
+            query: Search query string
+            k: Number of results
+        
+        Returns:
+            Tuple of (chunk ids, scores), best first
+        """
+        term_ids = self.term_ids(tokenize(query, self.stemming))
+        idf = bm25_idf(self.document_frequencies(term_ids), self.num_docs)
+        top, scores = self.top_k_documents(term_ids, idf, self.avgdl, k)
+        return np.asarray(self.chunk_ids[top]), scores
+
+
+def is_native_bm25_index(path: str) -> bool:
+    """
+    Check whether a directory holds a native BM25 index (as opposed to a bm25s one).
+    
+    Args:
+        path: Directory of the index
+    
+    Returns:
+        True if the directory was written by BM25Index.save()
+    """
+    try:
+        with open(os.path.join(path, BM25_PARAMS_FILE), "r", encoding="utf-8") as f:
+            return json.load(f).get("engine") == "native"
+    except (FileNotFoundError, ValueError):
+        return False
@@ -0,0 +1,410 @@
+import os
+import shutil
+import threading
+import uuid
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from common.file_utils import chunk_index_text
+from common.chunk_store import get_chunk_store
+from common.constants import (
+    BM25_K1,
+    BM25_B,
+    BM25_STEMMING,
+    BM25_MAX_SEGMENTS,
+    BM25_MERGE_FACTOR,
+    BM25_MERGE_DELETED_RATIO,
+)
+from common.bm25_engine import BM25Index, bm25_idf, tokenize, top_k
+from common.models import BM25Segment, BM25SegmentsManifest
+
+
+# Manifest file of a segmented BM25 index directory
+BM25_SEGMENTS_FILE = "segments.json"
+
+# Per-index locks serializing manifest updates of the writers in this process
+_writer_locks: Dict[str, threading.Lock] = {}
+_merge_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _get_locks(encodings_db_path: str) -> Tuple[threading.Lock, threading.Lock]:
+    """Get the manifest lock and the merge lock of an index."""
+    key = os.path.abspath(encodings_db_path)
+    with _locks_lock:
+        if key not in _writer_locks:
+            _writer_locks[key] = threading.Lock()
+            _merge_locks[key] = threading.Lock()
+        return _writer_locks[key], _merge_locks[key]
+
+
+def load_bm25_segments_manifest(encodings_db_path: str) -> Optional[BM25SegmentsManifest]:
+    """
+    Load the manifest of a segmented BM25 index.
+    
+    Args:
+        encodings_db_path: Directory of the index
+    
+    Returns:
+        Loaded BM25SegmentsManifest, or None if the directory holds no segmented index
+    """
+    manifest_path = os.path.join(encodings_db_path, BM25_SEGMENTS_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return BM25SegmentsManifest.model_validate_json(f.read())
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring invalid BM25 segments manifest {manifest_path}: {e}")
+        return None
+
+
+def _save_manifest(encodings_db_path: str, manifest: BM25SegmentsManifest) -> None:
+    """Replace the manifest atomically, publishing the new set of segments to readers."""
+    manifest_path = os.path.join(encodings_db_path, BM25_SEGMENTS_FILE)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(manifest.model_dump_json())
+    os.replace(tmp_path, manifest_path)
+
+
+def is_segmented_bm25_index(encodings_db_path: str) -> bool:
+    """
+    Check whether a directory holds a segmented BM25 index.
+    
+    Args:
+        encodings_db_path: Directory of the index
+    
+    Returns:
+        True if the directory has a segments manifest
+    """
+    return os.path.exists(os.path.join(encodings_db_path, BM25_SEGMENTS_FILE))
+
+
+def _new_segment_name() -> str:
+    """Generate a unique segment directory name."""
+    return f"segment_{uuid.uuid4().hex[:12]}"
+
+
+def _segment_chunk_ids(encodings_db_path: str, segment: BM25Segment) -> np.ndarray:
+    """Memory-map the chunk ids of a segment without loading its postings and vocabulary."""
+    return np.load(os.path.join(encodings_db_path, segment.name, "chunk_ids.npy"), mmap_mode="r")
+
+
+def _live_mask(chunk_ids: np.ndarray, segment: BM25Segment) -> Optional[np.ndarray]:
+    """Boolean mask of the documents of a segment that are not deleted (None if none are)."""
+    if not segment.deleted_chunk_ids:
+        return None
+    return ~np.isin(chunk_ids, np.asarray(segment.deleted_chunk_ids, dtype=np.int64))
+
+
+def update_bm25_segments(chunk_store_path: str, encodings_db_path: str, chunk_ids: Optional[np.ndarray] = None) -> BM25SegmentsManifest:
+    """
+    Bring a segmented BM25 index up to date with the chunk store.
+    
+    Chunk ids are derived from content hashes, so new or changed chunks are the
+    store ids missing from the index and removed chunks are the indexed ids
+    missing from the store. New chunks are tokenized into a new segment and
+    removed chunks are marked as deleted in the segments holding them, so the
+    cost is proportional to the change. If the directory holds no segmented
+    index yet, it is created with all chunks in one segment.
+    
+    Args:
+        chunk_store_path: Directory of the chunk store
+        encodings_db_path: Directory of the segmented index
+        chunk_ids: Ids of the store chunks the index holds (None for all), e.g. those of one shard
+    
+    Returns:
+        The new manifest
+    """
+    store = get_chunk_store(chunk_store_path)
+    store_ids = store.ids() if chunk_ids is None else chunk_ids
+    writer_lock, _ = _get_locks(encodings_db_path)
+
+    with writer_lock:
+        manifest = load_bm25_segments_manifest(encodings_db_path)
+        if manifest is None:
+            os.makedirs(encodings_db_path, exist_ok=True)
+            manifest = BM25SegmentsManifest(k1=BM25_K1, b=BM25_B, stemming=BM25_STEMMING)
+
+        # Mark documents of removed chunks as deleted
+        indexed_ids = []
+        num_deleted = 0
+        for segment in manifest.segments:
+            segment_ids = _segment_chunk_ids(encodings_db_path, segment)
+            live = _live_mask(segment_ids, segment)
+            live_ids = np.asarray(segment_ids if live is None else segment_ids[live])
+            removed_ids = live_ids[~np.isin(live_ids, store_ids)]
+            if len(removed_ids):
+                segment.deleted_chunk_ids.extend(removed_ids.tolist())
+                num_deleted += len(removed_ids)
+            indexed_ids.append(live_ids)
+
+        # Tokenize new chunks into a new segment
+        indexed_ids = np.concatenate(indexed_ids) if indexed_ids else np.empty(0, dtype=np.int64)
+        new_ids = store_ids[~np.isin(store_ids, indexed_ids)].tolist()
+        if new_ids:
+            documents = (
+                (chunk_id, tokenize(chunk_index_text(chunk), manifest.stemming))
+                for chunk_id, chunk in zip(new_ids, store.get_many(new_ids))
+            )
+            index = BM25Index.build(documents, k1=manifest.k1, b=manifest.b, stemming=manifest.stemming)
+            segment = BM25Segment(name=_new_segment_name(), num_docs=index.num_docs)
+            index.save(os.path.join(encodings_db_path, segment.name))
+            manifest.segments.append(segment)
+
+        if new_ids or num_deleted or not is_segmented_bm25_index(encodings_db_path):
+            _save_manifest(encodings_db_path, manifest)
+
+    print(f"BM25 index: {len(new_ids)} documents added, {num_deleted} deleted, {len(manifest.segments)} segments")
+    return manifest
+
+
+def plan_bm25_merge(manifest: BM25SegmentsManifest, max_segments: int = BM25_MAX_SEGMENTS, merge_factor: int = BM25_MERGE_FACTOR, deleted_ratio: float = BM25_MERGE_DELETED_RATIO) -> List[str]:
+    """
+    Choose the segments to merge into one.
+    
+    When there are more than max_segments segments, the smallest ones are
+    merged (at least merge_factor of them, and enough to get back under the
+    limit). Segments with more than deleted_ratio of their documents deleted
+    are merged too, which purges the deleted documents.
+    
+    Args:
+        manifest: Manifest of the index
+        max_segments: Number of segments above which small segments are merged
+        merge_factor: Minimum number of small segments merged at once
+        deleted_ratio: Fraction of deleted documents above which a segment is rewritten
+    
+    Returns:
+        Names of the segments to merge (empty if no merge is needed)
+    """
+    candidates = {
+        segment.name
+        for segment in manifest.segments
+        if segment.num_docs and len(segment.deleted_chunk_ids) > deleted_ratio * segment.num_docs
+    }
+    if len(manifest.segments) > max_segments:
+        by_size = sorted(manifest.segments, key=lambda segment: segment.num_docs - len(segment.deleted_chunk_ids))
+        num_merged = max(merge_factor, len(manifest.segments) - max_segments + 1)
+        candidates.update(segment.name for segment in by_size[:num_merged])
+    return [segment.name for segment in manifest.segments if segment.name in candidates]
+
+
+def merge_bm25_segments(encodings_db_path: str) -> bool:
+    """
+    Merge the segments chosen by plan_bm25_merge() into one.
+    
+    The merged segment is written without holding the manifest lock, so
+    updates can append segments and delete documents meanwhile; documents
+    deleted from the merged segments during the merge are carried over to
+    the new segment. Readers switch to the merged segment when the manifest
+    is replaced. Only one merge of an index runs at a time.
+    
+    Args:
+        encodings_db_path: Directory of the segmented index
+    
+    Returns:
+        True if segments were merged, False if no merge was needed
+    """
+    writer_lock, merge_lock = _get_locks(encodings_db_path)
+    if not merge_lock.acquire(blocking=False):
+        return False
+    try:
+        with writer_lock:
+            manifest = load_bm25_segments_manifest(encodings_db_path)
+            merged_names = plan_bm25_merge(manifest) if manifest is not None else []
+            segments = [segment.model_copy(deep=True) for segment in manifest.segments if segment.name in merged_names] if merged_names else []
+        if not segments:
+            return False
+
+        indexes = [BM25Index.load(os.path.join(encodings_db_path, segment.name), mmap=True) for segment in segments]
+        merged_index = BM25Index.merge(indexes, [_live_mask(index.chunk_ids, segment) for index, segment in zip(indexes, segments)])
+        merged_segment = BM25Segment(name=_new_segment_name(), num_docs=merged_index.num_docs)
+        merged_path = os.path.join(encodings_db_path, merged_segment.name)
+        merged_index.save(merged_path)
+
+        with writer_lock:
+            manifest = load_bm25_segments_manifest(encodings_db_path)
+            current = {segment.name: segment for segment in manifest.segments} if manifest is not None else {}
+            if any(name not in current for name in merged_names):
+                # The index was rebuilt during the merge
+                shutil.rmtree(merged_path, ignore_errors=True)
+                return False
+
+            already_deleted = {chunk_id for segment in segments for chunk_id in segment.deleted_chunk_ids}
+            merged_segment.deleted_chunk_ids = [
+                chunk_id
+                for name in merged_names
+                for chunk_id in current[name].deleted_chunk_ids
+                if chunk_id not in already_deleted
+            ]
+
+            position = next(i for i, segment in enumerate(manifest.segments) if segment.name in merged_names)
+            manifest.segments = [segment for segment in manifest.segments if segment.name not in merged_names]
+            manifest.segments.insert(position, merged_segment)
+            _save_manifest(encodings_db_path, manifest)
+
+        for name in merged_names:
+            shutil.rmtree(os.path.join(encodings_db_path, name), ignore_errors=True)
+        print(f"Merged {len(merged_names)} BM25 segments into {merged_segment.name} ({merged_segment.num_docs} documents)")
+        return True
+    finally:
+        merge_lock.release()
+
+
+def start_bm25_merge(*encodings_db_paths: str) -> threading.Thread:
+    """
+    Merge BM25 segments in a background thread until no merge is needed.
+    
+    Args:
+        encodings_db_paths: Directories of the segmented indexes, merged one after another
+    
+    Returns:
+        The started thread, join it before exiting to let the merge finish
+    """
+    def merge_until_done() -> None:
+        for encodings_db_path in encodings_db_paths:
+            try:
+                while merge_bm25_segments(encodings_db_path):
+                    pass
+            except Exception as e:
+                print(f"BM25 segment merge of {encodings_db_path} failed: {e}")
+
+    thread = threading.Thread(target=merge_until_done, name="bm25-merge")
+    thread.start()
+    return thread
+
+
+class SegmentedBM25Index:
+    """
+    Read-only view of a segmented BM25 index.
+    
+    Scores are computed with corpus statistics of the whole index, not of
+    single segments: the number of live documents, their average length and
+    the document frequency of every query term (counting only live postings)
+    are summed over the segments. Scores are therefore the same as those of
+    one index built over the live documents, however the documents are split
+    into segments.
+    """
+
+    def __init__(self, segments: List[BM25Index], live: List[Optional[np.ndarray]], k1: float, b: float, stemming: bool):
+        """
+        Args:
+            segments: Indexes of the segments
+            live: Boolean mask of the live documents of each segment (None if all are live)
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            stemming: Whether documents were tokenized with light stemming
+        """
+        self.segments = segments
+        self.live = live
+        self.k1 = k1
+        self.b = b
+        self.stemming = stemming
+
+        self.num_docs = 0
+        self.total_length = 0.0
+        for index, live_docs in zip(segments, live):
+            lengths = index.doc_lengths if live_docs is None else index.doc_lengths[live_docs]
+            self.num_docs += len(lengths)
+            self.total_length += float(np.sum(lengths, dtype=np.float64))
+        self.avgdl = self.total_length / self.num_docs if self.num_docs else 0.0
+
+    @classmethod
+    def load(cls, encodings_db_path: str, mmap: bool = True, attempts: int = 3) -> "SegmentedBM25Index":
+        """
+        Load the segments listed in the manifest.
+        
+        A merge may remove segments between reading the manifest and loading
+        them, in which case the manifest is read again.
+        
+        Args:
+            encodings_db_path: Directory of the segmented index
+            mmap: Whether to memory-map the postings
+            attempts: Number of times to retry when a segment disappears
+        
+        Returns:
+            Loaded SegmentedBM25Index
+        """
+        for attempt in range(attempts):
+            manifest = load_bm25_segments_manifest(encodings_db_path)
+            if manifest is None:
+                raise FileNotFoundError(f"BM25 segments manifest not found: {encodings_db_path}")
+            try:
+                segments = [BM25Index.load(os.path.join(encodings_db_path, segment.name), mmap=mmap) for segment in manifest.segments]
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+                continue
+            live = [_live_mask(index.chunk_ids, segment) for index, segment in zip(segments, manifest.segments)]
+            return cls(segments, live, k1=manifest.k1, b=manifest.b, stemming=manifest.stemming)
+
+    def document_frequencies(self, terms: List[str]) -> np.ndarray:
+        """
+        Count the live documents containing each term, over all segments.
+        
+        Args:
+            terms: Query terms
+        
+        Returns:
+            int64 array of document frequencies
+        """
+        document_frequencies = np.zeros(len(terms), dtype=np.int64)
+        for index, live_docs in zip(self.segments, self.live):
+            rows = np.asarray([index.vocab.get(term, -1) for term in terms], dtype=np.int64)
+            present = rows >= 0
+            term_ids = rows[present]
+            if live_docs is None:
+                document_frequencies[present] += index.document_frequencies(term_ids)
+            else:
+                document_frequencies[present] += np.asarray([
+                    np.count_nonzero(live_docs[index.indices[index.indptr[row]:index.indptr[row + 1]]])
+                    for row in term_ids
+                ], dtype=np.int64)
+        return document_frequencies
+
+    def top_k_documents(self, terms: List[str], idf: np.ndarray, avgdl: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top-k live documents for query terms weighted with the given corpus statistics.
+        
+        Args:
+            terms: Query terms
+            idf: IDF weight of each term
+            avgdl: Average document length of the corpus
+            k: Number of results
+        
+        Returns:
+            Tuple of (chunk ids, scores), best first
+        """
+        chunk_ids = []
+        scores = []
+        for index, live_docs in zip(self.segments, self.live):
+            rows = np.asarray([index.vocab.get(term, -1) for term in terms], dtype=np.int64)
+            present = rows >= 0
+            top, segment_scores = index.top_k_documents(rows[present], idf[present], avgdl, k, live_docs)
+            chunk_ids.append(np.asarray(index.chunk_ids[top]))
+            scores.append(segment_scores)
+
+        if not chunk_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        chunk_ids = np.concatenate(chunk_ids)
+        scores = np.concatenate(scores)
+        top = top_k(scores, k)
+        return chunk_ids[top], scores[top]
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieve the top-k documents for a query.
+        
+        Args:
+            query: Search query string
+            k: Number of results
+        
+        Returns:
+            Tuple of (chunk ids, scores), best first
+        """
+        terms = sorted(set(tokenize(query, self.stemming)))
+        if not terms or self.num_docs == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        idf = bm25_idf(self.document_frequencies(terms), self.num_docs)
+        return self.top_k_documents(terms, idf, self.avgdl, k)
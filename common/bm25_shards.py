@@ -0,0 +1,249 @@
+import multiprocessing
+import os
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from common.chunk_store import get_chunk_store
+from common.constants import BM25_QUERY_WORKERS
+from common.bm25_engine import bm25_idf, tokenize, top_k
+from common.bm25_segments import (
+    BM25_SEGMENTS_FILE,
+    SegmentedBM25Index,
+    update_bm25_segments,
+)
+from common.models import BM25ShardsManifest
+
+
+# Manifest file of a sharded BM25 index directory
+BM25_SHARDS_FILE = "shards.json"
+
+
+def load_bm25_shards_manifest(encodings_db_path: str) -> Optional[BM25ShardsManifest]:
+    """
+    Load the manifest of a sharded BM25 index.
+    
+    Args:
+        encodings_db_path: Directory of the index
+    
+    Returns:
+        Loaded BM25ShardsManifest, or None if the directory holds no sharded index
+    """
+    manifest_path = os.path.join(encodings_db_path, BM25_SHARDS_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return BM25ShardsManifest.model_validate_json(f.read())
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring invalid BM25 shards manifest {manifest_path}: {e}")
+        return None
+
+
+def bm25_shard_paths(encodings_db_path: str) -> List[str]:
+    """
+    List the segmented indexes of a BM25 index.
+    
+    Args:
+        encodings_db_path: Directory of the index
+    
+    Returns:
+        Directories of the shards, or the index directory itself if it is not sharded
+    """
+    manifest = load_bm25_shards_manifest(encodings_db_path)
+    if manifest is None:
+        return [encodings_db_path]
+    return [os.path.join(encodings_db_path, shard) for shard in manifest.shards]
+
+
+def bm25_index_signature(encodings_db_path: str) -> Optional[Tuple[int, ...]]:
+    """
+    Identify the version of a BM25 index on disk.
+    
+    Every shard (or the whole index if it is not sharded) contributes the inode
+    and mtime of its segments manifest, or of its directory if it has none.
+    
+    Args:
+        encodings_db_path: Directory of the index
+    
+    Returns:
+        Tuple identifying the version, or None if the index does not exist
+    """
+    signature = ()
+    for shard_path in bm25_shard_paths(encodings_db_path):
+        for path in (os.path.join(shard_path, BM25_SEGMENTS_FILE), shard_path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature += (stat.st_ino, stat.st_mtime_ns)
+            break
+        else:
+            return None
+    return signature
+
+
+def bm25_index_num_shards(encodings_db_path: str) -> int:
+    """
+    Get the number of shards of a BM25 index.
+    
+    Args:
+        encodings_db_path: Directory of the index
+    
+    Returns:
+        Number of shards, 1 if the index is not sharded
+    """
+    manifest = load_bm25_shards_manifest(encodings_db_path)
+    return manifest.num_shards if manifest is not None else 1
+
+
+def update_bm25_shards(chunk_store_path: str, encodings_db_path: str, num_shards: int) -> None:
+    """
+    Bring a (possibly sharded) BM25 index up to date with the chunk store.
+    
+    Chunks are assigned to shards by their id modulo num_shards, so a chunk
+    always lands in the same shard and every shard is updated incrementally
+    like a single segmented index (see update_bm25_segments()). With one shard
+    the directory holds a single segmented index.
+    
+    Args:
+        chunk_store_path: Directory of the chunk store
+        encodings_db_path: Directory of the index
+        num_shards: Number of shards, must match the index if it already exists
+    """
+    if num_shards <= 1:
+        update_bm25_segments(chunk_store_path, encodings_db_path)
+        return
+
+    manifest = load_bm25_shards_manifest(encodings_db_path)
+    if manifest is not None and manifest.num_shards != num_shards:
+        raise ValueError(f"BM25 index {encodings_db_path} has {manifest.num_shards} shards, not {num_shards}")
+    if manifest is None:
+        manifest = BM25ShardsManifest(num_shards=num_shards, shards=[f"shard_{shard:03d}" for shard in range(num_shards)])
+
+    store_ids = get_chunk_store(chunk_store_path).ids()
+    for shard, name in enumerate(manifest.shards):
+        update_bm25_segments(chunk_store_path, os.path.join(encodings_db_path, name), store_ids[store_ids % num_shards == shard])
+
+    manifest_path = os.path.join(encodings_db_path, BM25_SHARDS_FILE)
+    if not os.path.exists(manifest_path):
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            f.write(manifest.model_dump_json())
+
+
+# Shards loaded by a query worker process: shard directory -> (signature, index)
+_worker_shards: Dict[str, Tuple[Tuple[int, ...], SegmentedBM25Index]] = {}
+
+
+def _top_k_shard_documents(shard_path: str, signature: Tuple[int, ...], terms: List[str], idf: np.ndarray, avgdl: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Score a shard in a query worker, loading it if the worker has not loaded this version yet."""
+    loaded = _worker_shards.get(shard_path)
+    if loaded is None or loaded[0] != signature:
+        loaded = (signature, SegmentedBM25Index.load(shard_path, mmap=True))
+        _worker_shards[shard_path] = loaded
+    return loaded[1].top_k_documents(terms, idf, avgdl, k)
+
+
+# Process-wide pool of the BM25 query workers
+_query_executor: Optional[ProcessPoolExecutor] = None
+_query_executor_lock = threading.Lock()
+
+
+def _get_query_executor(workers: int) -> ProcessPoolExecutor:
+    """Get the process pool scoring BM25 shards, starting it on first use."""
+    global _query_executor
+
+    with _query_executor_lock:
+        if _query_executor is None:
+            _query_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _query_executor
+
+
+class ShardedBM25Index:
+    """
+    Read-only view of a sharded BM25 index, scoring the shards in parallel.
+    
+    Like the segments of a SegmentedBM25Index, the shards are scored with the
+    statistics of the whole index: the number of live documents, their
+    average length and the document frequencies of the query terms are summed
+    over the shards in this process and sent to the workers, which return
+    the top-k documents of their shard. The scores are therefore the same as
+    those of one index holding all the documents.
+    
+    Shards are memory-mapped by every worker process, so the postings are
+    loaded once into the OS page cache and shared by all processes. Shards
+    are updated one after another, so a query running during an update may
+    see some shards before and some after it.
+    """
+
+    def __init__(self, shard_paths: List[str], shards: List[SegmentedBM25Index], signatures: List[Tuple[int, ...]], workers: Optional[int] = BM25_QUERY_WORKERS):
+        """
+        Args:
+            shard_paths: Directories of the shards
+            shards: Indexes of the shards, loaded in this process
+            signatures: Version of each shard on disk, see bm25_index_signature()
+            workers: Number of worker processes (None for one per shard, up to the number of CPU cores, 1 to score in this process)
+        """
+        self.shard_paths = shard_paths
+        self.shards = shards
+        self.signatures = signatures
+        self.workers = workers or min(len(shards), os.cpu_count() or 1)
+        self.stemming = shards[0].stemming if shards else True
+        self.num_docs = sum(shard.num_docs for shard in shards)
+        total_length = sum(shard.total_length for shard in shards)
+        self.avgdl = total_length / self.num_docs if self.num_docs else 0.0
+
+    @classmethod
+    def load(cls, encodings_db_path: str, mmap: bool = True, workers: Optional[int] = BM25_QUERY_WORKERS) -> "ShardedBM25Index":
+        """
+        Load the shards listed in the manifest.
+        
+        Args:
+            encodings_db_path: Directory of the sharded index
+            mmap: Whether to memory-map the postings
+            workers: Number of worker processes, see __init__()
+        
+        Returns:
+            Loaded ShardedBM25Index
+        """
+        if load_bm25_shards_manifest(encodings_db_path) is None:
+            raise FileNotFoundError(f"BM25 shards manifest not found: {encodings_db_path}")
+        shard_paths = bm25_shard_paths(encodings_db_path)
+        signatures = [bm25_index_signature(shard_path) for shard_path in shard_paths]
+        shards = [SegmentedBM25Index.load(shard_path, mmap=mmap) for shard_path in shard_paths]
+        return cls(shard_paths, shards, signatures, workers)
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retrieve the top-k documents for a query.
+        
+        Args:
+            query: Search query string
+            k: Number of results
+        
+        Returns:
+            Tuple of (chunk ids, scores), best first
+        """
+        terms = sorted(set(tokenize(query, self.stemming)))
+        if not terms or self.num_docs == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        document_frequencies = np.zeros(len(terms), dtype=np.int64)
+        for shard in self.shards:
+            document_frequencies += shard.document_frequencies(terms)
+        idf = bm25_idf(document_frequencies, self.num_docs)
+
+        if self.workers > 1:
+            executor = _get_query_executor(self.workers)
+            futures = [
+                executor.submit(_top_k_shard_documents, shard_path, signature, terms, idf, self.avgdl, k)
+                for shard_path, signature in zip(self.shard_paths, self.signatures)
+            ]
+            results = [future.result() for future in futures]
+        else:
+            results = [shard.top_k_documents(terms, idf, self.avgdl, k) for shard in self.shards]
+
+        chunk_ids = np.concatenate([shard_chunk_ids for shard_chunk_ids, _ in results])
+        scores = np.concatenate([shard_scores for _, shard_scores in results])
+        top = top_k(scores, k)
+        return chunk_ids[top], scores[top]
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import threading
+import weakref
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+from common.constants import CHUNK_STORE_PATH
+from common.models import TextChunk, SearchResult
+
+
+# File names inside a chunk store directory
+CHUNKS_DATA_FILE = "chunks.jsonl"
+CHUNKS_INDEX_FILE = "chunks.index.npy"
+
+
+def chunk_content_hash(chunk: TextChunk) -> str:
+    """
+    Compute the content hash of a chunk.
+    
+    The hash covers both the header path and the text, as both are indexed.
+    
+    Args:
+        chunk: Chunk to hash
+        
+    Returns:
+        Hex-encoded SHA-256 hash of the chunk
+    """
+    content = json.dumps([chunk.headers, chunk.text], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def chunk_id_from_hash(content_hash: str) -> int:
+    """
+    Derive a stable chunk id from a chunk content hash.
+    
+    The id is the first 60 bits of the hash, so it fits a signed 64-bit
+    integer (chunk store index) and an unsigned one (Qdrant point id).
+    
+    Args:
+        content_hash: Hex-encoded content hash from chunk_content_hash()
+        
+    Returns:
+        Chunk id shared by the chunk store and all indexes
+    """
+    return int(content_hash[:15], 16)
+
+
+class ChunkStoreWriter:
+    """
+    Writer of a single-file chunk store.
+    
+    Chunks are appended as JSON lines to one data file, while their
+    (id, offset, length) entries are collected for the offset index. The store
+    is written to a temporary directory and swapped into place on close(), so
+    readers never see a half-written store.
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        Args:
+            store_dir: Directory of the chunk store to (re)create
+        """
+        self.store_dir = store_dir
+        self._tmp_dir = f"{store_dir}.tmp"
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        os.makedirs(self._tmp_dir)
+
+        self._data_file = open(os.path.join(self._tmp_dir, CHUNKS_DATA_FILE), "wb")
+        self._index_entries: List[Tuple[int, int, int]] = []
+        self._offset = 0
+
+    def append(self, chunk_id: int, chunk: TextChunk) -> None:
+        """
+        Append a chunk to the store.
+        
+        Args:
+            chunk_id: Unique identifier of the chunk
+            chunk: Chunk to store
+        """
+        record = json.dumps(
+            {"id": chunk_id, "headers": chunk.headers, "text": chunk.text}, ensure_ascii=False
+        ).encode("utf-8") + b"\n"
+        self._data_file.write(record)
+        self._index_entries.append((chunk_id, self._offset, len(record)))
+        self._offset += len(record)
+
+    def close(self) -> None:
+        """Write the offset index (sorted by chunk id) and publish the store."""
+        self._data_file.close()
+
+        index = np.array(self._index_entries, dtype=np.int64).reshape(-1, 3)
+        index = index[np.argsort(index[:, 0], kind="stable")]
+        if len(index) and np.any(np.diff(index[:, 0]) == 0):
+            raise ValueError("Chunk ids in a chunk store must be unique")
+        np.save(os.path.join(self._tmp_dir, CHUNKS_INDEX_FILE), index)
+
+        # Swap the new store in place of the old one
+        old_dir = f"{self.store_dir}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.store_dir):
+            os.rename(self.store_dir, old_dir)
+        os.rename(self._tmp_dir, self.store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def __enter__(self) -> "ChunkStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._data_file.close()
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class ChunkStore:
+    """
+    Read-only view of a chunk store.
+    
+    The data file is memory-mapped and the offset index (sorted by chunk id)
+    is loaded with mmap, so random access by id is a binary search plus a
+    slice of the mapped file. iter_chunks() streams the data file in write
+    order without loading it into memory. The mapping and file handle are
+    released by close() or, at the latest, when the store is garbage
+    collected, so a store superseded in get_chunk_store() is released once
+    its last reader drops it.
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        Args:
+            store_dir: Directory of the chunk store
+        """
+        self.store_dir = store_dir
+        self._data_path = os.path.join(store_dir, CHUNKS_DATA_FILE)
+        self._index = np.load(os.path.join(store_dir, CHUNKS_INDEX_FILE), mmap_mode="r")
+
+        self._data_file = open(self._data_path, "rb")
+        # An empty file cannot be memory-mapped
+        self._data = (
+            mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._index) else None
+        )
+        self._finalizer = weakref.finalize(self, _release_data_file, self._data, self._data_file)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return self._find(chunk_id) is not None
+
+    def _find(self, chunk_id: int) -> Optional[int]:
+        """Find the index row of a chunk id."""
+        row = int(np.searchsorted(self._index[:, 0], chunk_id))
+        if row < len(self._index) and self._index[row, 0] == chunk_id:
+            return row
+        return None
+
+    def get(self, chunk_id: int) -> Optional[TextChunk]:
+        """
+        Get a chunk by id.
+        
+        Args:
+            chunk_id: Identifier of the chunk
+        
+        Returns:
+            Stored TextChunk, or None if there is no such chunk
+        """
+        row = self._find(chunk_id)
+        if row is None:
+            return None
+
+        _, offset, length = self._index[row]
+        record = json.loads(self._data[offset:offset + length])
+        return TextChunk(headers=record["headers"], text=record["text"])
+
+    def get_many(self, chunk_ids: List[int]) -> List[Optional[TextChunk]]:
+        """
+        Get many chunks by id.
+        
+        Args:
+            chunk_ids: Identifiers of the chunks
+        
+        Returns:
+            List of stored TextChunks (None for unknown ids), in the order of chunk_ids
+        """
+        return [self.get(chunk_id) for chunk_id in chunk_ids]
+
+    def ids(self) -> np.ndarray:
+        """
+        Get the ids of all stored chunks.
+        
+        Returns:
+            Sorted array of chunk ids
+        """
+        return np.asarray(self._index[:, 0])
+
+    def iter_chunks(self) -> Iterator[Tuple[int, TextChunk]]:
+        """
+        Stream all chunks in the order they were written.
+        
+        Yields:
+            Tuples of (chunk_id, TextChunk)
+        """
+        with open(self._data_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                yield record["id"], TextChunk(headers=record["headers"], text=record["text"])
+
+    def close(self) -> None:
+        """Release the memory-mapped data file."""
+        self._finalizer()
+
+
+def _release_data_file(data: Optional[mmap.mmap], data_file) -> None:
+    """Close the mapping and file handle of a chunk store's data file."""
+    if data is not None:
+        data.close()
+    data_file.close()
+
+
+# Process-wide chunk stores: path -> (directory signature, store)
+_chunk_stores: Dict[str, Tuple[Tuple[int, int], ChunkStore]] = {}
+_chunk_stores_lock = threading.Lock()
+
+
+def get_chunk_store(store_dir: str = CHUNK_STORE_PATH) -> ChunkStore:
+    """
+    Get the process-wide reader of a chunk store.
+    
+    The store is opened once and reopened only when its directory is replaced
+    (e.g. by rag_pipeline.py). Readers of the previous version keep working on
+    their own memory maps, which are released when the last of them drops the
+    previous store.
+    
+    Args:
+        store_dir: Directory of the chunk store
+    
+    Returns:
+        ChunkStore reading the current version of the store
+    
+    Raises:
+        FileNotFoundError: If the chunk store does not exist
+    """
+    stat = os.stat(store_dir)
+    signature = (stat.st_ino, stat.st_mtime_ns)
+
+    cached = _chunk_stores.get(store_dir)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _chunk_stores_lock:
+        cached = _chunk_stores.get(store_dir)
+        if cached is None or cached[0] != signature:
+            cached = (signature, ChunkStore(store_dir))
+            _chunk_stores[store_dir] = cached
+
+    return cached[1]
+
+
+def hydrate_search_results(chunk_ids: List[int], scores: List[float], store_dir: str = CHUNK_STORE_PATH) -> List[SearchResult]:
+    """
+    Build search results from chunk ids and scores using texts from the chunk store.
+    
+    Indexes return only chunk ids, the texts and header paths are read from
+    the chunk store. Ids missing from the store (e.g. an index newer than the
+    store during a rebuild) are skipped.
+    
+    Args:
+        chunk_ids: Identifiers of the found chunks, best first
+        scores: Scores of the found chunks
+        store_dir: Directory of the chunk store
+    
+    Returns:
+        List of SearchResult objects containing document id, score, text and headers for each result
+    """
+    store = get_chunk_store(store_dir)
+
+    search_results = []
+    for chunk_id, score in zip(chunk_ids, scores):
+        chunk = store.get(chunk_id)
+        if chunk is None:
+            print(f"Chunk {chunk_id} not found in the chunk store, skipping")
+            continue
+        search_results.append(SearchResult(
+            id=chunk_id,
+            score=float(score),
+            text=chunk.text,
+            headers=chunk.headers
+        ))
+
+    return search_results
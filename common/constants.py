@@ -10,5 +10,139 @@ VECTOR_SIZE = 1024
 QDRANT_URL = "http://localhost:6333"
 QDRANT_PORT = 6333
 
+# Vector store ("qdrant" = Qdrant server, "local" = in-process NumPy store of memory-mapped vectors)
+# and the number of vectors the local store scores at once
+VECTOR_STORE_BACKEND = "qdrant"
+LOCAL_VECTOR_STORE_PATH = "vector_store"
+LOCAL_VECTOR_SEARCH_BLOCK_SIZE = 65536
+
 # BM25 encoding settings
 BM25_ENCODINGS_DB_PATH = "bm25_encodings_db"
+
+# Embedding model settings
+EMBEDDING_MODEL_NAME = "sdadas/mmlw-roberta-large"
+QUERY_PREFIX = "zapytanie: "
+
+# Query encoder runtime settings (device, torch dtype, number of CPU threads; None keeps torch default)
+QUERY_ENCODER_DEVICE = "cpu"
+QUERY_ENCODER_DTYPE = "float32"
+QUERY_ENCODER_NUM_THREADS = None
+
+# Hybrid retrieval settings (per-branch timeouts in seconds, thread pool size)
+VECTOR_SEARCH_TIMEOUT_S = 15.0
+BM25_SEARCH_TIMEOUT_S = 10.0
+RETRIEVAL_MAX_WORKERS = 8
+
+# Qdrant client settings (connection pool size, timeouts and health check cache in seconds)
+QDRANT_POOL_SIZE = 10
+QDRANT_TIMEOUT_S = 10
+QDRANT_HEALTH_TTL_S = 30.0
+QDRANT_STARTUP_TIMEOUT_S = 30.0
+
+# Ollama API settings (timeouts in seconds)
+OLLAMA_URL = "http://localhost:11434"
+OLLAMA_MODEL_NAME = "Bielik-11B-v2_6-Instruct_Q4_K_M"
+OLLAMA_CONNECT_TIMEOUT_S = 5.0
+OLLAMA_READ_TIMEOUT_S = 300.0
+OLLAMA_POOL_SIZE = 10
+
+# Query embedding micro-batching (collect concurrent queries for up to max wait or max batch size)
+QUERY_BATCHING_ENABLED = True
+QUERY_BATCH_MAX_SIZE = 16
+QUERY_BATCH_MAX_WAIT_MS = 5.0
+QUERY_BATCH_WAIT_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100]
+
+# Recently computed query embeddings kept in memory (0 disables), so a query embedded
+# for retrieval is not encoded again by the semantic answer cache
+QUERY_EMBEDDING_CACHE_SIZE = 256
+
+# Index version stamp written by rag_pipeline.py after every re-index
+INDEX_VERSION_PATH = "index_version.txt"
+
+# Retrieval result cache (LRU with TTL in seconds, None path disables persistence)
+RETRIEVAL_CACHE_ENABLED = True
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024
+RETRIEVAL_CACHE_TTL_S = 3600.0
+RETRIEVAL_CACHE_PATH = "retrieval_cache.json"
+
+# Semantic answer cache (capacity in answers, cosine similarity threshold for a hit)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_CAPACITY = 512
+SEMANTIC_CACHE_SIMILARITY_THRESHOLD = 0.95
+SEMANTIC_CACHE_STREAM_CHUNK_WORDS = 4
+
+# Context token budget settings
+# ("approximate" counts tokens from text length, "tokenizer" uses the generator's tokenizer)
+CONTEXT_TOKEN_COUNTER = "approximate"
+GENERATOR_TOKENIZER_NAME = "speakleash/Bielik-11B-v2.6-Instruct"
+APPROX_CHARS_PER_TOKEN = 3.5
+# Context window of the generator (sent to Ollama as num_ctx) and the tokens reserved in it for the
+# system prompt, the question and the answer; the rest is the default context token budget
+GENERATOR_CONTEXT_TOKENS = 4096
+GENERATOR_RESERVED_TOKENS = 2048
+CONTEXT_TOKEN_BUDGET = GENERATOR_CONTEXT_TOKENS - GENERATOR_RESERVED_TOKENS
+MIN_TRUNCATED_CHUNK_TOKENS = 32
+
+# Chunk size bounds in tokens (smaller chunks are merged within a section, larger ones split with overlap)
+CHUNK_MIN_TOKENS = 40
+CHUNK_MAX_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 32
+
+# Single-file store of chunk texts shared by the indexers and query-time retrieval
+CHUNK_STORE_PATH = "chunk_store"
+
+# Ingestion mode of rag_pipeline.py (streaming passes documents from the zip straight to the chunk store)
+PIPELINE_STREAMING = True
+PIPELINE_KEEP_INTERMEDIATE = False
+
+# Preprocessing worker processes (None = number of CPU cores, 1 = no process pool) and documents sent to a worker at once
+PREPROCESS_WORKERS = None
+PREPROCESS_CHUNKSIZE = 4
+
+# Manifest of chunk content hashes indexed in Qdrant (used for incremental re-indexing)
+INDEX_MANIFEST_PATH = "index_manifest.json"
+
+# Persistent cache of document embeddings (keyed by model name and text hash, LRU eviction over the size cap)
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = "embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 500_000
+EMBEDDING_CACHE_COMPACT_RATIO = 0.25
+
+# Number of chunks embedded and uploaded to Qdrant at once by the indexing pipeline
+EMBEDDING_BATCH_SIZE = 64
+
+# Qdrant upload settings (points per upsert request, concurrent requests, retries with exponential backoff)
+QDRANT_UPLOAD_BATCH_SIZE = 256
+QDRANT_UPLOAD_PARALLELISM = 4
+QDRANT_UPLOAD_MAX_RETRIES = 5
+QDRANT_UPLOAD_BACKOFF_S = 0.5
+QDRANT_UPLOAD_MAX_BACKOFF_S = 10.0
+
+# Indexing-time document encoder: chunks bucketed by length per window, batches under a padded token budget,
+# worker processes (1 = encode in the pipeline process)
+EMBEDDING_SORT_WINDOW = 2048
+EMBEDDING_TOKEN_BUDGET = 16384
+EMBEDDING_MAX_BATCH_SIZE = 128
+EMBEDDING_MAX_SEQ_LENGTH = 512
+EMBEDDING_WORKERS = 1
+
+# BM25 engine ("native" = common/bm25_engine.py with the Polish tokenizer, "bm25s" = bm25s library)
+BM25_BACKEND = "native"
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_STEMMING = True
+
+# Segmented BM25 index (new chunks are appended as segments; small segments and segments
+# with many deleted documents are merged in the background)
+BM25_MAX_SEGMENTS = 8
+BM25_MERGE_FACTOR = 4
+BM25_MERGE_DELETED_RATIO = 0.3
+
+# Postings per block of the BM25 dynamic pruning (queries skip blocks whose score upper bound cannot reach the top-k)
+BM25_BLOCK_SIZE = 128
+
+# Number of BM25 index shards (each a segmented index of the chunks whose id modulo the
+# number of shards is its number) and of the worker processes scoring them in parallel
+# (None = one per shard, up to the number of CPU cores)
+BM25_SHARDS = 1
+BM25_QUERY_WORKERS = None
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from common.constants import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_COMPACT_RATIO,
+)
+from common.models import CacheStats
+
+
+# Index file of an embedding cache directory
+EMBEDDING_CACHE_INDEX_FILE = "index.json"
+
+
+def embedding_text_hash(text: str) -> str:
+    """
+    Compute the cache key of an embedded text.
+    
+    Args:
+        text: Exact text passed to the embedding model
+    
+    Returns:
+        Hex-encoded SHA-256 hash of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of document embeddings of one model.
+    
+    Vectors are stored as float32 rows of a memory-mapped file and looked up
+    through a text hash -> row index kept in LRU order. When the cache holds
+    more than max_entries vectors, the least recently used ones are evicted.
+    Rows freed by eviction are reused only after the index is saved, so a
+    crash never leaves the saved index pointing at overwritten vectors. When
+    too many rows are free, save() compacts the vectors into a new file.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES, compact_ratio: float = EMBEDDING_CACHE_COMPACT_RATIO):
+        """
+        Open (or create) the cache of a model.
+        
+        Args:
+            cache_dir: Root directory of the embedding caches
+            model_name: Name of the embedding model, each model has its own cache
+            dim: Dimension of the embedding vectors
+            max_entries: Maximum number of cached vectors
+            compact_ratio: Fraction of free rows above which save() compacts the vectors file
+        """
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.compact_ratio = compact_ratio
+        self.cache_dir = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # text hash -> row, least recently used first
+        self._rows: "OrderedDict[str, int]" = OrderedDict()
+        self._free_rows: List[int] = []
+        self._pending_free_rows: List[int] = []
+        self._generation = 0
+        self._num_rows = 0  # capacity of the vectors file
+        self._next_row = 0  # number of rows ever allocated in the vectors file
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        self.load()
+
+    def _vectors_path(self, generation: int) -> str:
+        """Path of the vectors file of a generation (a new one is created by each compaction)."""
+        return os.path.join(self.cache_dir, f"vectors.{generation}.f32")
+
+    def _open_vectors(self, num_rows: int) -> None:
+        """Memory-map the vectors file with room for num_rows rows, growing the file if needed."""
+        path = self._vectors_path(self._generation)
+        size = num_rows * self.dim * 4
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(num_rows, self.dim)) if num_rows else None
+        self._num_rows = num_rows
+
+    def load(self) -> None:
+        """Load the index from disk, starting empty if there is none or it belongs to another model."""
+        index_path = os.path.join(self.cache_dir, EMBEDDING_CACHE_INDEX_FILE)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = None
+        except ValueError as e:
+            print(f"Ignoring invalid embedding cache index {index_path}: {e}")
+            index = None
+
+        if index is None or index["model_name"] != self.model_name or index["dim"] != self.dim:
+            self._generation = index["generation"] + 1 if index is not None else 0
+            self._open_vectors(0)
+            return
+
+        self._generation = index["generation"]
+        self._rows = OrderedDict(index["rows"])
+        self._free_rows = index["free_rows"]
+        self._next_row = index["next_row"]
+        self._open_vectors(index["num_rows"])
+        print(f"Loaded {len(self._rows)} cached embeddings of {self.model_name}")
+
+    def get_many(self, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached vectors.
+        
+        Args:
+            text_hashes: Hashes of the texts, see embedding_text_hash()
+        
+        Returns:
+            Dictionary of text hash -> float32 vector for the cached texts
+        """
+        found = {}
+        with self._lock:
+            for text_hash in text_hashes:
+                row = self._rows.get(text_hash)
+                if row is None:
+                    self._misses += 1
+                    continue
+                self._rows.move_to_end(text_hash)
+                found[text_hash] = np.array(self._vectors[row])
+                self._hits += 1
+        return found
+
+    def put_many(self, text_hashes: List[str], vectors: np.ndarray) -> None:
+        """
+        Add vectors to the cache, evicting the least recently used ones over the size cap.
+        
+        Args:
+            text_hashes: Hashes of the texts, see embedding_text_hash()
+            vectors: float32 array of shape (len(text_hashes), dim)
+        """
+        with self._lock:
+            for text_hash, vector in zip(text_hashes, vectors):
+                if text_hash in self._rows:
+                    self._rows.move_to_end(text_hash)
+                    continue
+
+                if self._free_rows:
+                    row = self._free_rows.pop()
+                else:
+                    if self._next_row >= self._num_rows:
+                        self._open_vectors(max(1024, 2 * self._num_rows))
+                    row = self._next_row
+                    self._next_row += 1
+
+                self._vectors[row] = vector
+                self._rows[text_hash] = row
+
+                while len(self._rows) > self.max_entries:
+                    _, evicted_row = self._rows.popitem(last=False)
+                    self._pending_free_rows.append(evicted_row)
+
+    def save(self) -> None:
+        """Flush the vectors, compacting them if needed, and save the index atomically."""
+        with self._lock:
+            free_rows = len(self._free_rows) + len(self._pending_free_rows)
+            if self._next_row and free_rows > self.compact_ratio * self._next_row:
+                self._compact()
+            elif self._vectors is not None:
+                self._vectors.flush()
+
+            index = {
+                "model_name": self.model_name,
+                "dim": self.dim,
+                "generation": self._generation,
+                "num_rows": self._num_rows,
+                "next_row": self._next_row,
+                "free_rows": self._free_rows + self._pending_free_rows,
+                "rows": list(self._rows.items()),
+            }
+            index_path = os.path.join(self.cache_dir, EMBEDDING_CACHE_INDEX_FILE)
+            tmp_path = f"{index_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+
+            # Rows freed since the last save are not referenced by the saved index any more
+            self._free_rows = index["free_rows"]
+            self._pending_free_rows = []
+
+            # Remove vectors files of older generations
+            for file in os.listdir(self.cache_dir):
+                if file.startswith("vectors.") and file != os.path.basename(self._vectors_path(self._generation)):
+                    os.remove(os.path.join(self.cache_dir, file))
+
+    def _compact(self) -> None:
+        """Copy the live vectors, in LRU order, into the vectors file of a new generation."""
+        old_vectors = self._vectors
+        rows = list(self._rows.values())
+
+        self._generation += 1
+        self._vectors = None
+        self._open_vectors(len(rows))
+        if rows:
+            self._vectors[:] = old_vectors[rows]
+            self._vectors.flush()
+
+        self._rows = OrderedDict((text_hash, row) for row, text_hash in enumerate(self._rows))
+        self._next_row = len(rows)
+        self._free_rows = []
+        self._pending_free_rows = []
+        print(f"Compacted embedding cache of {self.model_name} to {len(rows)} vectors")
+
+    def get_stats(self) -> CacheStats:
+        """
+        Get cache hit/miss statistics.
+        
+        Returns:
+            CacheStats with lookups since the cache was opened
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                entries=len(self._rows),
+                hit_rate=self._hits / lookups if lookups else None,
+            )
+
+
+# Process-wide embedding caches: (cache_dir, model_name) -> cache
+_embedding_caches: Dict[tuple, EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, dim: int, cache_dir: str = EMBEDDING_CACHE_PATH) -> EmbeddingCache:
+    """
+    Get the process-wide embedding cache of a model, opening it on first use.
+    
+    Args:
+        model_name: Name of the embedding model
+        dim: Dimension of the embedding vectors
+        cache_dir: Root directory of the embedding caches
+        
+    Returns:
+        EmbeddingCache of the model
+    """
+    key = (cache_dir, model_name)
+    with _embedding_caches_lock:
+        cache = _embedding_caches.get(key)
+        if cache is None or cache.dim != dim:
+            cache = EmbeddingCache(cache_dir, model_name, dim)
+            _embedding_caches[key] = cache
+    return cache
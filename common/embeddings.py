@@ -1,62 +1,702 @@
 from sentence_transformers import SentenceTransformer
 from sentence_transformers.util import cos_sim
 import os
-import hashlib
-from pathlib import Path
-from typing import List
+import asyncio
+import bisect
+import multiprocessing
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+import torch
+import numpy as np
+from typing import List, Optional, Dict, Tuple, Iterable, Iterator
 from tqdm import tqdm
-from common.models import EmbeddingMetadata
+from common.constants import (
+    EMBEDDING_MODEL_NAME,
+    QUERY_PREFIX,
+    QUERY_ENCODER_DEVICE,
+    QUERY_ENCODER_DTYPE,
+    QUERY_ENCODER_NUM_THREADS,
+    QUERY_BATCHING_ENABLED,
+    QUERY_BATCH_MAX_SIZE,
+    QUERY_BATCH_MAX_WAIT_MS,
+    QUERY_BATCH_WAIT_BUCKETS_MS,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_SORT_WINDOW,
+    EMBEDDING_TOKEN_BUDGET,
+    EMBEDDING_MAX_BATCH_SIZE,
+    EMBEDDING_MAX_SEQ_LENGTH,
+    EMBEDDING_WORKERS,
+    VECTOR_SIZE,
+)
+from common.file_utils import chunk_index_text
+from common.chunk_store import get_chunk_store
+from common.embedding_cache import get_embedding_cache, embedding_text_hash
+from common.token_counting import count_tokens
+from common.models import EmbeddingMetadata, EncoderStats, BatchingStats, TextChunk
 
 
-def generate_embeddings_and_metadata(input_dir: Path) -> List[EmbeddingMetadata]:
+class QueryEncoder:
     """
-    Generate embeddings and metadata for text files in the input directory.
+    Warm SentenceTransformer model used to embed search queries.
     
-    Reads text files, generates embeddings using the SentenceTransformer model,
-    and returns a list of EmbeddingMetadata objects containing text, id, and vector for each file.
+    The model is loaded once in the constructor and reused for every query.
+    Encode calls are serialized with a lock, so a single instance can be
+    shared safely between threads (e.g. Streamlit sessions).
+    """
+
+    def __init__(self, model_name: str, device: str, dtype: str, num_threads: Optional[int] = None):
+        """
+        Load the embedding model.
+        
+        Args:
+            model_name: Name of the SentenceTransformer model
+            device: Device to run the model on, e.g. "cpu" or "cuda"
+            dtype: Torch dtype of the model weights, e.g. "float32" or "bfloat16"
+            num_threads: Number of CPU threads for torch (process-wide setting), None keeps the default
+        """
+        self.model_name = model_name
+        self.device = device
+        self.dtype = dtype
+        self.num_threads = num_threads
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        start_time = time.perf_counter()
+        self.model = SentenceTransformer(
+            model_name,
+            device=device,
+            model_kwargs={"torch_dtype": getattr(torch, dtype)},
+        )
+        self.load_time_s = time.perf_counter() - start_time
+        print(f"Loaded query encoder {model_name} on {device} ({dtype}) in {self.load_time_s:.2f} s")
+
+        self._lock = threading.Lock()
+        self._encode_calls = 0
+        self._encoded_queries = 0
+        self._total_encode_time_s = 0.0
+        self._last_encode_latency_s = None
+
+    def encode(self, queries: List[str], record_stats: bool = True) -> List[List[float]]:
+        """
+        Encode a list of already prefixed queries.
+        
+        Args:
+            queries: Query strings to embed
+            record_stats: Whether the call should be included in latency statistics
+            
+        Returns:
+            List of embedding vectors, one per query
+        """
+        with self._lock:
+            start_time = time.perf_counter()
+            embeddings = self.model.encode(queries, convert_to_numpy=True, show_progress_bar=False)
+            latency_s = time.perf_counter() - start_time
+
+            if record_stats:
+                self._encode_calls += 1
+                self._encoded_queries += len(queries)
+                self._total_encode_time_s += latency_s
+                self._last_encode_latency_s = latency_s
+
+        return embeddings.tolist()
+
+    def get_stats(self) -> EncoderStats:
+        """
+        Get load time and encode latency statistics of the encoder.
+        
+        Returns:
+            EncoderStats object describing the encoder
+        """
+        with self._lock:
+            return EncoderStats(
+                model_name=self.model_name,
+                device=self.device,
+                dtype=self.dtype,
+                num_threads=self.num_threads,
+                load_time_s=self.load_time_s,
+                encode_calls=self._encode_calls,
+                encoded_queries=self._encoded_queries,
+                last_encode_latency_ms=(
+                    self._last_encode_latency_s * 1000 if self._last_encode_latency_s is not None else None
+                ),
+                avg_encode_latency_ms=(
+                    self._total_encode_time_s / self._encode_calls * 1000 if self._encode_calls else None
+                ),
+            )
+
+
+# Process-wide registry of loaded query encoders
+_query_encoders: Dict[Tuple[str, str, str, Optional[int]], QueryEncoder] = {}
+_query_encoders_lock = threading.Lock()
+
+
+def get_query_encoder(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    device: str = QUERY_ENCODER_DEVICE,
+    dtype: str = QUERY_ENCODER_DTYPE,
+    num_threads: Optional[int] = QUERY_ENCODER_NUM_THREADS,
+) -> QueryEncoder:
+    """
+    Get the process-wide query encoder, loading it on first use.
+    
+    Encoders are cached per (model_name, device, dtype, num_threads), so the
+    model is loaded only once per process no matter how many threads ask for it.
+    
+    Args:
+        model_name: Name of the SentenceTransformer model
+        device: Device to run the model on
+        dtype: Torch dtype of the model weights
+        num_threads: Number of CPU threads for torch, None keeps the default
+        
+    Returns:
+        Loaded QueryEncoder instance
+    """
+    key = (model_name, device, dtype, num_threads)
+    encoder = _query_encoders.get(key)
+    if encoder is not None:
+        return encoder
+
+    with _query_encoders_lock:
+        # Another thread could have loaded the model while we were waiting
+        encoder = _query_encoders.get(key)
+        if encoder is None:
+            encoder = QueryEncoder(model_name, device, dtype, num_threads)
+            _query_encoders[key] = encoder
+
+    return encoder
+
+
+def warm_up_query_encoder(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    device: str = QUERY_ENCODER_DEVICE,
+    dtype: str = QUERY_ENCODER_DTYPE,
+    num_threads: Optional[int] = QUERY_ENCODER_NUM_THREADS,
+) -> EncoderStats:
+    """
+    Load the query encoder and run a first forward pass ahead of real queries.
+    
+    Safe to call many times - the model is loaded and warmed up only once.
+    The warm-up pass is not included in latency statistics.
     
     Args:
-        input_dir: Directory containing text files to embed
+        model_name: Name of the SentenceTransformer model
+        device: Device to run the model on
+        dtype: Torch dtype of the model weights
+        num_threads: Number of CPU threads for torch, None keeps the default
         
     Returns:
-        List of EmbeddingMetadata objects with text, id, and vector for each document
+        EncoderStats object with the model load time
+    """
+    key = (model_name, device, dtype, num_threads)
+    is_loaded = key in _query_encoders
+
+    encoder = get_query_encoder(model_name, device, dtype, num_threads)
+    if not is_loaded:
+        encoder.encode([QUERY_PREFIX + "rozgrzewka"], record_stats=False)
+
+    return encoder.get_stats()
+
+
+def get_query_encoder_stats() -> EncoderStats:
+    """
+    Get statistics of the default query encoder.
+    
+    Returns:
+        EncoderStats object with load time and encode latency of the default encoder
     """
-    # List embedding chunk files
-    embedding_chunk_files = os.listdir(input_dir)
+    return get_query_encoder().get_stats()
+
+
+class QueryEmbeddingBatcher:
+    """
+    Micro-batching layer in front of the query encoder.
+    
+    Queries submitted from many threads (or event loops) are put on a queue. A
+    background thread collects them for at most `max_wait_ms` after the first
+    query of a batch arrives, or until `max_batch_size` queries are collected,
+    and encodes them in a single forward pass. Each caller gets its embedding
+    through a Future. Batch sizes and queue wait times are kept as histograms.
+    """
+
+    def __init__(self, encoder: QueryEncoder, max_batch_size: int = QUERY_BATCH_MAX_SIZE, max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS):
+        """
+        Args:
+            encoder: Query encoder used to embed the batches
+            max_batch_size: Maximum number of queries in one batch
+            max_wait_ms: Maximum time a batch waits for more queries in milliseconds
+        """
+        self.encoder = encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._batch_size_histogram: Dict[int, int] = {}
+        self._wait_bucket_labels = [f"<={bound}" for bound in QUERY_BATCH_WAIT_BUCKETS_MS] + [f">{QUERY_BATCH_WAIT_BUCKETS_MS[-1]}"]
+        self._queue_wait_histogram = [0] * len(self._wait_bucket_labels)
+
+        self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, query: str) -> Future:
+        """
+        Queue an already prefixed query for encoding.
+        
+        Args:
+            query: Query string to embed
+            
+        Returns:
+            Future resolved with the embedding vector (list of floats)
+        """
+        future = Future()
+        self._queue.put((query, future, time.perf_counter()))
+        return future
+
+    def embed(self, query: str) -> List[float]:
+        """
+        Encode an already prefixed query and wait for the result.
+        
+        Args:
+            query: Query string to embed
+            
+        Returns:
+            List of floats representing the query embedding vector
+        """
+        return self.submit(query).result()
+
+    def _collect_batch(self) -> list:
+        """Block for the first query, then collect more until the batch is full or the wait time passes."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _record_batch(self, batch: list, encode_start_time: float) -> None:
+        """Update batch size and queue wait histograms."""
+        with self._stats_lock:
+            self._batches += 1
+            self._queries += len(batch)
+            self._batch_size_histogram[len(batch)] = self._batch_size_histogram.get(len(batch), 0) + 1
+            for _, _, enqueue_time in batch:
+                wait_ms = (encode_start_time - enqueue_time) * 1000
+                self._queue_wait_histogram[bisect.bisect_left(QUERY_BATCH_WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def _run(self) -> None:
+        """Worker loop encoding queued queries in batches."""
+        while True:
+            batch = self._collect_batch()
+            # Skip queries whose callers gave up waiting
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            encode_start_time = time.perf_counter()
+            self._record_batch(batch, encode_start_time)
+            try:
+                embeddings = self.encoder.encode([query for query, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def get_stats(self) -> BatchingStats:
+        """
+        Get batch size and queue wait statistics.
+        
+        Returns:
+            BatchingStats object with the histograms
+        """
+        with self._stats_lock:
+            return BatchingStats(
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.max_wait_ms,
+                batches=self._batches,
+                queries=self._queries,
+                batch_size_histogram=dict(sorted(self._batch_size_histogram.items())),
+                queue_wait_ms_histogram=dict(zip(self._wait_bucket_labels, self._queue_wait_histogram)),
+            )
+
+
+_query_batcher: Optional[QueryEmbeddingBatcher] = None
+_query_batcher_lock = threading.Lock()
+
+
+def get_query_batcher() -> QueryEmbeddingBatcher:
+    """
+    Get the process-wide micro-batcher of the default query encoder.
+    
+    Returns:
+        QueryEmbeddingBatcher instance, created (and the model loaded) on first use
+    """
+    global _query_batcher
+    if _query_batcher is not None:
+        return _query_batcher
+
+    with _query_batcher_lock:
+        if _query_batcher is None:
+            _query_batcher = QueryEmbeddingBatcher(get_query_encoder())
+
+    return _query_batcher
+
+
+def get_query_batching_stats() -> BatchingStats:
+    """
+    Get batch size and queue wait statistics of the default micro-batcher.
+    
+    Returns:
+        BatchingStats object with the histograms
+    """
+    return get_query_batcher().get_stats()
+
+
+# Recently computed query embeddings: query -> embedding, least recently used first
+_query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+
+
+def _get_cached_query_embedding(query: str) -> Optional[List[float]]:
+    """Get a recently computed embedding of a query, None if there is none."""
+    with _query_embeddings_lock:
+        embedding = _query_embeddings.get(query)
+        if embedding is not None:
+            _query_embeddings.move_to_end(query)
+        return embedding
+
+
+def _cache_query_embedding(query: str, embedding: List[float]) -> None:
+    """Remember the embedding of a query, evicting the least recently used ones over the cap."""
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return
+    with _query_embeddings_lock:
+        _query_embeddings[query] = embedding
+        _query_embeddings.move_to_end(query)
+        while len(_query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embeddings.popitem(last=False)
+
+
+# Document model used by the indexing pipeline, loaded on first use
+_document_model: Optional[SentenceTransformer] = None
+_document_model_lock = threading.Lock()
+
+
+def get_document_model() -> SentenceTransformer:
+    """
+    Get the process-wide SentenceTransformer model used to embed documents.
+    
+    Returns:
+        Loaded SentenceTransformer model
+    """
+    global _document_model
+
+    with _document_model_lock:
+        if _document_model is None:
+            _document_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return _document_model
+
+
+def plan_token_budget_batches(lengths: List[int], token_budget: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Group texts into batches of similar length under a padded token budget.
+    
+    Texts are sorted by length (longest first) and cut into batches whose
+    padded size (number of texts times the longest text) stays within the
+    budget, so short texts are encoded in large batches and long ones in small
+    batches, and no batch pays padding for a much longer member.
+    
+    Args:
+        lengths: Token length of every text
+        token_budget: Maximum number of padded tokens in one batch
+        max_batch_size: Maximum number of texts in one batch
+        
+    Returns:
+        Batches of text indices
+    """
+    batches = []
+    batch: List[int] = []
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        # Texts are sorted longest first, so the first text sets the padded length of the batch
+        batch_length = max(lengths[batch[0]] if batch else lengths[i], 1)
+        if batch and (len(batch) == max_batch_size or (len(batch) + 1) * batch_length > token_budget):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Model of a DocumentEncoder worker process
+_worker_model: Optional[SentenceTransformer] = None
+
+
+def _init_encoder_worker(model_name: str, num_threads: Optional[int]) -> None:
+    """Load the model once in a DocumentEncoder worker process."""
+    global _worker_model
+
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_batch_in_worker(texts: List[str]) -> np.ndarray:
+    """Encode one batch in a DocumentEncoder worker process."""
+    vectors = _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class DocumentEncoder:
+    """
+    Indexing-time encoder of document texts.
+    
+    Texts are bucketed by (approximate) token length and encoded in batches
+    under a padded token budget, see plan_token_budget_batches(). With more
+    than one worker, batches are spread across worker processes, each with its
+    own copy of the model and an equal share of the CPU threads. Vectors are
+    always returned in the original order of the texts.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        workers: int = EMBEDDING_WORKERS,
+        token_budget: int = EMBEDDING_TOKEN_BUDGET,
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH,
+    ):
+        """
+        Args:
+            model_name: Name of the SentenceTransformer model
+            workers: Number of worker processes, 1 to encode in the current process
+            token_budget: Maximum number of padded tokens in one batch
+            max_batch_size: Maximum number of texts in one batch
+            max_seq_length: Length at which the model truncates texts, in tokens
+        """
+        self.model_name = model_name
+        self.workers = workers
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.max_seq_length = max_seq_length
+        self._executor = None
+
+        if workers > 1:
+            num_threads = max(1, (os.cpu_count() or 1) // workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_encoder_worker,
+                initargs=(model_name, num_threads),
+            )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode document texts.
+        
+        Args:
+            texts: Texts to encode
+            
+        Returns:
+            float32 array of shape (len(texts), dim), in the order of texts
+        """
+        if not texts:
+            return np.empty((0, VECTOR_SIZE), dtype=np.float32)
+
+        lengths = [min(count_tokens(text, "approximate"), self.max_seq_length) for text in texts]
+        batches = plan_token_budget_batches(lengths, self.token_budget, self.max_batch_size)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+
+        if self._executor is not None:
+            results = self._executor.map(_encode_batch_in_worker, batch_texts)
+        else:
+            model = get_document_model()
+            results = (
+                model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False)
+                for batch in batch_texts
+            )
+
+        vectors = None
+        for batch, batch_vectors in zip(batches, results):
+            if vectors is None:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            # Restore the original order of the texts
+            vectors[batch] = batch_vectors
+
+        return vectors
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_document_encoder: Optional[DocumentEncoder] = None
+_document_encoder_lock = threading.Lock()
+
+
+def get_document_encoder() -> DocumentEncoder:
+    """
+    Get the process-wide document encoder, starting its worker processes on first use.
+    
+    Returns:
+        DocumentEncoder configured with the EMBEDDING_* constants
+    """
+    global _document_encoder
+
+    with _document_encoder_lock:
+        if _document_encoder is None:
+            _document_encoder = DocumentEncoder()
+        return _document_encoder
+
+
+def encode_documents(texts: List[str], save_cache: bool = True) -> np.ndarray:
+    """
+    Embed document texts, reusing vectors from the persistent embedding cache.
+    
+    Only texts the cache has never seen (for the current model) are encoded,
+    and the model is loaded only if there is at least one such text.
+    
+    Args:
+        texts: Document texts to embed
+        save_cache: Whether to save the embedding cache index after adding new vectors
+        
+    Returns:
+        float32 array of shape (len(texts), VECTOR_SIZE)
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return get_document_encoder().encode(texts)
+
+    cache = get_embedding_cache(EMBEDDING_MODEL_NAME, VECTOR_SIZE)
+    text_hashes = [embedding_text_hash(text) for text in texts]
+    cached_vectors = cache.get_many(text_hashes)
+
+    vectors = np.empty((len(texts), VECTOR_SIZE), dtype=np.float32)
+    missing = []
+    for i, text_hash in enumerate(text_hashes):
+        cached_vector = cached_vectors.get(text_hash)
+        if cached_vector is None:
+            missing.append(i)
+        else:
+            vectors[i] = cached_vector
+
+    if missing:
+        new_vectors = get_document_encoder().encode([texts[i] for i in missing])
+        vectors[missing] = new_vectors
+        cache.put_many([text_hashes[i] for i in missing], vectors[missing])
+        if save_cache:
+            cache.save()
+
+    return vectors
+
+
+def iter_embedding_batches(chunk_store_path: str, chunk_ids: Optional[Iterable[int]] = None, batch_size: int = EMBEDDING_BATCH_SIZE, window_size: int = EMBEDDING_SORT_WINDOW) -> Iterator[Tuple[List[int], np.ndarray, List[TextChunk]]]:
+    """
+    Stream embeddings of the chunks in the chunk store in batches.
+    
+    Chunks are read from the chunk store window_size at a time and embedded
+    (texts prefixed with their section headers, see encode_documents), so the
+    encoder can bucket a whole window by length while memory use depends on
+    the window size and not on the size of the corpus. The embedding cache is
+    saved once all batches were consumed.
+    
+    Args:
+        chunk_store_path: Directory of the chunk store to embed
+        chunk_ids: Optional ids of the chunks to embed (e.g. only new or changed ones), None to embed all chunks
+        batch_size: Number of chunks in a yielded batch
+        window_size: Number of chunks embedded at once
+        
+    Yields:
+        Tuples of (chunk ids, float32 array of shape (len(ids), VECTOR_SIZE), chunks with their texts)
+    """
+    store = get_chunk_store(chunk_store_path)
+    selected_ids = set(chunk_ids) if chunk_ids is not None else None
+    total = len(selected_ids) if selected_ids is not None else len(store)
+
+    def embed(ids: List[int], chunks: List[TextChunk]) -> Iterator[Tuple[List[int], np.ndarray, List[TextChunk]]]:
+        vectors = encode_documents([chunk_index_text(chunk) for chunk in chunks], save_cache=False)
+        progress.update(len(ids))
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            yield ids[start:end], vectors[start:end], chunks[start:end]
+
+    cache = get_embedding_cache(EMBEDDING_MODEL_NAME, VECTOR_SIZE) if EMBEDDING_CACHE_ENABLED else None
+    stats_before = cache.get_stats() if cache is not None else None
 
-    embeddings_and_metadata = []
-    texts = []
     ids = []
-    i = 0
-    for file in tqdm(embedding_chunk_files, desc="Generating embeddings and metadata"):
-        with open(input_dir / file, 'r', encoding='utf-8') as f:
-            text = f.read()
-            texts.append(text)
-            id = i
-            i += 1
+    chunks = []
+    with tqdm(total=total, desc="Generating embeddings") as progress:
+        for id, chunk in store.iter_chunks():
+            if selected_ids is not None and id not in selected_ids:
+                continue
             ids.append(id)
-                    
-    model = SentenceTransformer("sdadas/mmlw-roberta-large")
-    vectors = model.encode(texts, convert_to_tensor=True, show_progress_bar=False)
+            chunks.append(chunk)
+            if len(ids) == window_size:
+                yield from embed(ids, chunks)
+                ids, chunks = [], []
+        if ids:
+            yield from embed(ids, chunks)
+
+    if cache is not None:
+        cache.save()
+        stats = cache.get_stats()
+        print(f"Embedding cache: {stats.hits - stats_before.hits} cached, {stats.misses - stats_before.misses} encoded")
 
-    embeddings_and_metadata = [
+
+def generate_embeddings_and_metadata(chunk_store_path: str, chunk_ids: Optional[Iterable[int]] = None) -> List[EmbeddingMetadata]:
+    """
+    Generate embeddings and metadata for the chunks in the chunk store.
+    
+    Collects all batches of iter_embedding_batches() into EmbeddingMetadata
+    objects. This keeps every vector in memory as Python floats, so the
+    indexing pipeline consumes iter_embedding_batches() directly instead.
+    
+    Args:
+        chunk_store_path: Directory of the chunk store to embed
+        chunk_ids: Optional ids of the chunks to embed (e.g. only new or changed ones), None to embed all chunks
+        
+    Returns:
+        List of EmbeddingMetadata objects with text, headers, id, and vector for each document
+    """
+    return [
         EmbeddingMetadata(
-            text=text,
+            text=chunk.text,
+            headers=chunk.headers,
             id=id,
             vector=vector.tolist()
-        ) for text, id, vector in zip(texts, ids, vectors)
+        )
+        for ids, vectors, chunks in iter_embedding_batches(chunk_store_path, chunk_ids)
+        for id, vector, chunk in zip(ids, vectors, chunks)
     ]
 
-    return embeddings_and_metadata
-
 
 def generate_query_embedding(query: str) -> List[float]:
     """
     Generate embedding for a single query string.
     
     Adds a prefix to the query and generates an embedding vector using the
-    SentenceTransformer model. Converts the PyTorch tensor to a Python list
-    for compatibility with Qdrant.
+    process-wide query encoder, so the model is loaded only on the first call.
+    With QUERY_BATCHING_ENABLED the query goes through the micro-batcher and is
+    encoded together with other concurrent queries. The embeddings of recent
+    queries are kept in memory, so the semantic answer cache reuses the
+    embedding computed for retrieval instead of encoding the query again.
+    Returns a Python list for compatibility with Qdrant.
     
     Args:
         query: Query string to embed
@@ -64,14 +704,41 @@ def generate_query_embedding(query: str) -> List[float]:
     Returns:
         List of floats representing the query embedding vector
     """
-    query_prefix = "zapytanie: "
-    query = [query_prefix + query]
-
-    model = SentenceTransformer("sdadas/mmlw-roberta-large", device="cpu")
-    embeddings = model.encode(query, convert_to_tensor=True, show_progress_bar=False)
+    cached_embedding = _get_cached_query_embedding(query)
+    if cached_embedding is not None:
+        return cached_embedding
 
-    embedding = embeddings[0]
-    # Convert PyTorch tensor to Python list for Qdrant compatibility
-    embedding_list = embedding.tolist()
+    if QUERY_BATCHING_ENABLED:
+        embedding_list = get_query_batcher().embed(QUERY_PREFIX + query)
+    else:
+        encoder = get_query_encoder()
+        embeddings = encoder.encode([QUERY_PREFIX + query])
+        embedding_list = embeddings[0]
 
+    _cache_query_embedding(query, embedding_list)
     return embedding_list
+
+
+async def agenerate_query_embedding(query: str) -> List[float]:
+    """
+    Generate embedding for a single query string without blocking the event loop.
+    
+    With QUERY_BATCHING_ENABLED the coroutine awaits the micro-batcher's future
+    directly, otherwise the CPU-bound encoding runs in a worker thread.
+    
+    Args:
+        query: Query string to embed
+        
+    Returns:
+        List of floats representing the query embedding vector
+    """
+    cached_embedding = _get_cached_query_embedding(query)
+    if cached_embedding is not None:
+        return cached_embedding
+
+    if QUERY_BATCHING_ENABLED:
+        embedding_list = await asyncio.wrap_future(get_query_batcher().submit(QUERY_PREFIX + query))
+        _cache_query_embedding(query, embedding_list)
+        return embedding_list
+
+    return await asyncio.to_thread(generate_query_embedding, query)
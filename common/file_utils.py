@@ -1,8 +1,23 @@
 import zipfile
+import io
 import os
 import re
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Callable, Any
+from typing import Callable, Any, List, Optional, Iterable, Iterator, Tuple
+from common.models import TextChunk, FileProcessingConfig
+from common.token_counting import count_tokens
+from common.chunk_store import ChunkStoreWriter, chunk_content_hash, chunk_id_from_hash
+
+
+# Cleaning rules of clean_and_unify_text, compiled once per process
+_URL_PATTERN = re.compile(r'(?:https?://|ftp://|www\.|file:///.)[^\s<>"{}|\\^`\[\]]+')
+_MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+_REPEATED_PUNCTUATION_PATTERN = re.compile(r"([.!?])\1+")
+_NEWLINES_PATTERN = re.compile(r"\n+")
 
 
 def unzip_docs(docs_zip_path: Path, docs_dir: Path) -> None:
@@ -24,7 +39,7 @@ def unzip_docs(docs_zip_path: Path, docs_dir: Path) -> None:
                 target_path = os.path.join(docs_dir, filename)
                 os.makedirs(os.path.dirname(target_path), exist_ok=True)
                 with zf.open(member) as source, open(target_path, "wb") as target:
-                    target.write(source.read())
+                    shutil.copyfileobj(source, target)
 
 
 def clean_and_unify_text(text: str) -> str:
@@ -41,18 +56,15 @@ def clean_and_unify_text(text: str) -> str:
         Cleaned and normalized text suitable for embedding generation
     """
     # Remove URLs and file references (enhanced pattern)
-    url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+|ftp://[^\s<>"{}|\\^`\[\]]+|www\.[^\s<>"{}|\\^`\[\]]+|file:///.[^\s<>"{}|\\^`\[\]]+'
-    text = re.sub(url_pattern, "", text)
+    text = _URL_PATTERN.sub("", text)
 
-    text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)  # Remove markdown links
-    text = re.sub(r"\*", "", text)  # Remove markdown bold
-    text = re.sub(r"\|", "", text)  # Remove markdown tables
+    text = _MARKDOWN_LINK_PATTERN.sub(r"\1", text)  # Remove markdown links
+    text = text.replace("*", "")  # Remove markdown bold
+    text = text.replace("|", "")  # Remove markdown tables
 
     # Remove excessive punctuation
-    text = re.sub(r"\.{2,}", ".", text)  # Replace multiple dots with single
-    text = re.sub(r"!{2,}", "!", text)  # Replace multiple exclamation marks with single
-    text = re.sub(r"\?{2,}", "?", text)  # Replace multiple question marks with single
-    text = re.sub(r"\n+", "\n\n", text)  # Replace multiple newlines with two newlines
+    text = _REPEATED_PUNCTUATION_PATTERN.sub(r"\1", text)  # Replace repeated dots, exclamation and question marks with single ones
+    text = _NEWLINES_PATTERN.sub("\n\n", text)  # Replace multiple newlines with two newlines
 
     text = text.lower()  # Lowercase all text
 
@@ -61,19 +73,19 @@ def clean_and_unify_text(text: str) -> str:
     return text
 
 
-def split_into_chunks(text: str) -> str:
+def split_into_header_chunks(text: str) -> List[TextChunk]:
     """
     Split text into logical chunks based on header structure.
 
-    Analyzes markdown headers to create context-aware chunks. Each chunk
-    includes the relevant header context to maintain semantic meaning.
+    Every non-empty content line becomes a chunk. The headers of the section
+    the line belongs to are kept as structured metadata of the chunk instead
+    of being prepended to its text.
 
     Args:
         text: Text with markdown headers to be split
 
     Returns:
-        Text with chunks separated by double newlines, each chunk containing
-        relevant header context
+        List of TextChunk objects in document order
     """
     chunks = []
     headers_stack = []
@@ -95,97 +107,455 @@ def split_into_chunks(text: str) -> str:
             headers_stack.append(header_text)
         else:
             # This is content -> create chunk
-            context = " ".join(headers_stack)
-            chunk = f"{context} {line}"
-            chunks.append(chunk)
+            chunks.append(TextChunk(headers=list(headers_stack), text=line))
+
+    return chunks
+
+
+def chunk_index_text(chunk: TextChunk) -> str:
+    """
+    Get the text of a chunk used for embedding and BM25 indexing.
+
+    The header path is kept in the indexed text, so retrieval sees the same
+    section context as before, while prompts print each header only once.
+
+    Args:
+        chunk: Chunk to get the text of
+
+    Returns:
+        Header path followed by the chunk content
+    """
+    return " ".join([*chunk.headers, chunk.text])
+
+
+def split_oversized_chunk(chunk: TextChunk, max_tokens: int, overlap: int) -> List[TextChunk]:
+    """
+    Split a chunk into windows of at most max_tokens tokens.
+
+    Windows are cut at word boundaries and consecutive windows share about
+    `overlap` tokens, so a sentence cut at a window boundary is still seen
+    whole by one of them. Every window is measured as a whole with
+    count_tokens(), like the chunks in bound_chunk_sizes(), so windows fill
+    max_tokens.
+
+    Args:
+        chunk: Chunk to split
+        max_tokens: Maximum number of tokens in a window
+        overlap: Number of tokens shared by consecutive windows
+
+    Returns:
+        List of chunks with the header path of the original chunk
+    """
+    words = chunk.text.split(" ")
+    overlap = min(overlap, max_tokens // 2)
+
+    def span_tokens(first: int, last: int) -> int:
+        return count_tokens(" ".join(words[first:last]))
+
+    windows = []
+    start = 0
+    while start < len(words):
+        # Find the longest window that fits: grow it exponentially, then
+        # binary-search its end. Always take at least one word, even if it is
+        # longer than max_tokens
+        fitting, too_long = start + 1, len(words) + 1
+        step = 1
+        while fitting + step < too_long:
+            if span_tokens(start, fitting + step) > max_tokens:
+                too_long = fitting + step
+                break
+            fitting += step
+            step *= 2
+        while too_long - fitting > 1:
+            middle = (fitting + too_long) // 2
+            if span_tokens(start, middle) <= max_tokens:
+                fitting = middle
+            else:
+                too_long = middle
+        end = fitting
+        windows.append(TextChunk(headers=chunk.headers, text=" ".join(words[start:end])))
+        if end == len(words):
+            break
+
+        # Step back by `overlap` tokens for the next window, but always move forward
+        low, next_start = start + 1, end
+        while low < next_start:
+            middle = (low + next_start) // 2
+            if span_tokens(middle, end) <= overlap:
+                next_start = middle
+            else:
+                low = middle + 1
+        start = next_start
+
+    return windows
+
+
+def bound_chunk_sizes(chunks: List[TextChunk], min_tokens: Optional[int], max_tokens: Optional[int], overlap: int = 0) -> List[TextChunk]:
+    """
+    Merge too small chunks and split too large ones.
+
+    Consecutive chunks of the same section are merged until they reach
+    min_tokens (without exceeding max_tokens). A small chunk left at the end
+    of a section is merged into the previous chunk of that section if it fits.
+    Chunks are never merged across sections, so every chunk keeps a single
+    header path. Chunks above max_tokens are split with overlap.
+
+    Args:
+        chunks: Chunks in document order
+        min_tokens: Minimum chunk size in tokens, None to keep small chunks
+        max_tokens: Maximum chunk size in tokens, None for no limit
+        overlap: Number of tokens shared by windows split from one chunk
+
+    Returns:
+        List of size-bounded chunks in document order
+    """
+    if max_tokens is not None:
+        split_chunks = []
+        for chunk in chunks:
+            if count_tokens(chunk.text) > max_tokens:
+                split_chunks.extend(split_oversized_chunk(chunk, max_tokens, overlap))
+            else:
+                split_chunks.append(chunk)
+        chunks = split_chunks
+
+    if min_tokens is None:
+        return chunks
+
+    merged_chunks: List[TextChunk] = []
+    buffer: Optional[TextChunk] = None
+
+    def fits(first: TextChunk, second: TextChunk) -> bool:
+        return max_tokens is None or count_tokens(first.text + " " + second.text) <= max_tokens
+
+    def flush(buffer: TextChunk) -> None:
+        previous = merged_chunks[-1] if merged_chunks else None
+        if (
+            count_tokens(buffer.text) < min_tokens
+            and previous is not None
+            and previous.headers == buffer.headers
+            and fits(previous, buffer)
+        ):
+            merged_chunks[-1] = TextChunk(headers=previous.headers, text=previous.text + " " + buffer.text)
+        else:
+            merged_chunks.append(buffer)
+
+    for chunk in chunks:
+        if buffer is None:
+            buffer = chunk
+        elif buffer.headers == chunk.headers and count_tokens(buffer.text) < min_tokens and fits(buffer, chunk):
+            buffer = TextChunk(headers=buffer.headers, text=buffer.text + " " + chunk.text)
+        else:
+            flush(buffer)
+            buffer = chunk
+
+    if buffer is not None:
+        flush(buffer)
+
+    return merged_chunks
 
-    text = "\n\n".join(chunks)
+
+def split_into_chunks(text: str, config: Optional[FileProcessingConfig] = None) -> str:
+    """
+    Split text into logical chunks based on header structure.
+
+    Analyzes markdown headers to create context-aware chunks. Each chunk
+    is stored with the header path of its section as metadata. If a config
+    is given, chunk sizes are bounded by its min_chunk_size, chunk_size and
+    overlap (in tokens), see bound_chunk_sizes().
+
+    Args:
+        text: Text with markdown headers to be split
+        config: Optional file processing configuration with chunk size bounds
+
+    Returns:
+        Chunks serialized as JSON lines, one TextChunk per line
+    """
+    chunks = split_into_header_chunks(text)
+
+    if config is not None:
+        chunks = bound_chunk_sizes(chunks, config.min_chunk_size, config.chunk_size, config.overlap or 0)
+
+    text = "\n".join(chunk.model_dump_json() for chunk in chunks)
 
     return text
 
 
+def _apply_to_batch(func: Callable[[Any], Any], batch: List[Any]) -> List[Any]:
+    """Apply a function to every item of a batch (runs in a worker process)."""
+    return [func(item) for item in batch]
+
+
+def _map_in_processes(func: Callable[[Any], Any], items: Iterable[Any], workers: Optional[int], chunksize: int) -> Iterator[Any]:
+    """
+    Apply a function to items in a process pool, preserving their order.
+
+    Items are sent to the workers in batches of chunksize, and at most two
+    batches per worker are in flight, so a long stream of items is never
+    loaded into memory at once. With a single worker the function runs in
+    the current process.
+
+    Args:
+        func: Picklable function to apply
+        items: Items to process
+        workers: Number of worker processes, None for the number of CPU cores
+        chunksize: Number of items sent to a worker at once
+
+    Yields:
+        Results of the function in the order of items
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(func, items)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == chunksize:
+                pending.append(executor.submit(_apply_to_batch, func, batch))
+                batch = []
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+        if batch:
+            pending.append(executor.submit(_apply_to_batch, func, batch))
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _preprocess_file(paths: Tuple[Path, Path], preprocess_func: Callable[[str], str]) -> Tuple[str, int, int, Optional[str]]:
+    """
+    Preprocess a single file (runs in a worker process).
+
+    Args:
+        paths: Tuple of (input file path, output file path)
+        preprocess_func: Function to apply to the file's content
+
+    Returns:
+        Tuple of (file name, original size, processed size, error message or None)
+    """
+    file_path, output_path = paths
+    try:
+        # Read the file content
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        # Apply comprehensive cleaning
+        cleaned_content = preprocess_func(content)
+
+        # Save the cleaned content to the output directory
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(cleaned_content)
+
+        return file_path.name, len(content), len(cleaned_content), None
+
+    except Exception as e:
+        return file_path.name, 0, 0, str(e)
+
+
 def preprocess_files(
-    input_dir: Path, output_dir: Path, preprocess_func: Callable[[str], str]
+    input_dir: Path,
+    output_dir: Path,
+    preprocess_func: Callable[[str], str],
+    workers: Optional[int] = 1,
+    chunksize: int = 1,
 ) -> None:
     """
     Process multiple files using a specified preprocessing function.
 
     Reads all files from the input directory, applies the preprocessing function
     to each file's content, and saves the processed results to the output directory.
-    Skips directories and handles errors gracefully.
+    Files can be processed in a pool of worker processes, in which case the
+    preprocessing function must be picklable (a module-level function or a
+    functools.partial of one). Skips directories and handles errors gracefully.
 
     Args:
         input_dir: Directory containing files to process
         output_dir: Directory where processed files should be saved
         preprocess_func: Function to apply to each file's content
+        workers: Number of worker processes, None for the number of CPU cores, 1 to process in the current process
+        chunksize: Number of files sent to a worker process at once
     """
-    # List docs files
-    docs_files = os.listdir(input_dir)
+    # List docs files, skipping directories
+    paths = [
+        (input_dir / file, output_dir / file)
+        for file in os.listdir(input_dir)
+        if not (input_dir / file).is_dir()
+    ]
+
+    processed_files = 0
+    original_size = 0
+    processed_size = 0
+    for file, content_size, cleaned_size, error in _map_in_processes(
+        partial(_preprocess_file, preprocess_func=preprocess_func), paths, workers, chunksize
+    ):
+        if error is not None:
+            print(f"  ✗ Error processing {file}: {error}")
+            continue
+        processed_files += 1
+        original_size += content_size
+        processed_size += cleaned_size
 
-    for file in docs_files:
-        print(f"Processing: {file}")
+    print(f"  ✓ Processed {processed_files}/{len(paths)} files to: {output_dir}")
+    print(f"  ✓ Original size: {original_size} chars, Processed size: {processed_size} chars")
 
-        # Skip directories
-        file_path = input_dir / file
-        if file_path.is_dir():
-            continue
 
-        try:
-            # Read the file content
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
+def iter_documents(source: Path) -> Iterator[Tuple[str, str]]:
+    """
+    Stream documents from a zip file or a directory.
 
-            # Apply comprehensive cleaning
-            cleaned_content = preprocess_func(content)
+    Zip members are decoded straight from the archive, nothing is extracted to
+    disk. As in unzip_docs, the top-level directory of the archive is dropped
+    from member names. Only one document is held in memory at a time.
 
-            # Save the cleaned content to db_cleaned_up_dir
-            output_path = output_dir / file
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(cleaned_content)
+    Args:
+        source: Path to a zip file or a directory containing documents
 
-            print(f"  ✓ Saved cleaned file to: {output_path}")
-            print(
-                f"  ✓ Original size: {len(content)} chars, Cleaned size: {len(cleaned_content)} chars"
-            )
+    Yields:
+        Tuples of (file name, document text)
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source, "r") as zf:
+            for member in zf.namelist():
+                filename = member.split("/", 1)[-1]  # drops first directory
+                if not filename or member.endswith("/"):
+                    continue
+                with zf.open(member) as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+                    yield filename, f.read()
+    else:
+        for file in os.listdir(source):
+            file_path = source / file
+            if file_path.is_dir():
+                continue
+            with open(file_path, "r", encoding="utf-8") as f:
+                yield file, f.read()
 
-        except Exception as e:
-            print(f"  ✗ Error processing {file}: {e}")
 
+def _clean_and_chunk_document(
+    document: Tuple[str, str], config: Optional[FileProcessingConfig], keep_cleaned: bool
+) -> Tuple[str, Optional[str], List[TextChunk], Optional[str]]:
+    """
+    Clean and chunk a single document (runs in a worker process).
+
+    Args:
+        document: Tuple of (file name, document text)
+        config: Optional file processing configuration with chunk size bounds
+        keep_cleaned: Whether to return the cleaned text
 
-def create_chunk_files(input_dir: Path, output_dir: Path) -> None:
+    Returns:
+        Tuple of (file name, cleaned text or None, chunks, error message or None)
+    """
+    file, content = document
+    try:
+        cleaned_content = clean_and_unify_text(content)
+        chunks = split_into_header_chunks(cleaned_content)
+        if config is not None:
+            chunks = bound_chunk_sizes(chunks, config.min_chunk_size, config.chunk_size, config.overlap or 0)
+    except Exception as e:
+        return file, None, [], str(e)
+
+    return file, cleaned_content if keep_cleaned else None, chunks, None
+
+
+def iter_document_chunks(
+    documents: Iterable[Tuple[str, str]],
+    config: Optional[FileProcessingConfig] = None,
+    cleaned_dir: Optional[Path] = None,
+    chunks_dir: Optional[Path] = None,
+    workers: Optional[int] = 1,
+    chunksize: int = 1,
+) -> Iterator[TextChunk]:
     """
-    Create individual text chunk files for embedding and BM25 encoding.
+    Clean and chunk a stream of documents.
 
-    Reads files from the input directory, splits each file into lines,
-    and creates separate text files for each non-empty line. Each chunk
-    file is numbered sequentially for easy identification.
+    Applies clean_and_unify_text and the same chunking as split_into_chunks to
+    each document as it arrives, optionally in a pool of worker processes
+    (documents keep their order). Intermediate results are written to disk only
+    if their directories are given. Documents that fail to process are skipped.
 
     Args:
-        input_dir: Directory containing files to split into chunks
-        output_dir: Directory where chunk files should be saved
+        documents: Tuples of (file name, document text), e.g. from iter_documents
+        config: Optional file processing configuration with chunk size bounds
+        cleaned_dir: Optional directory where cleaned documents should be saved
+        chunks_dir: Optional directory where chunked documents should be saved
+        workers: Number of worker processes, None for the number of CPU cores, 1 to process in the current process
+        chunksize: Number of documents sent to a worker process at once
+
+    Yields:
+        Chunks in document order
     """
-    # List docs files
-    docs_files = os.listdir(input_dir)
+    process_document = partial(_clean_and_chunk_document, config=config, keep_cleaned=cleaned_dir is not None)
 
-    index = 0
-    for file in docs_files:
-        file_path = input_dir / file
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
+    for file, cleaned_content, chunks, error in _map_in_processes(process_document, documents, workers, chunksize):
+        if error is not None:
+            print(f"  ✗ Error processing {file}: {error}")
+            continue
+
+        if cleaned_dir is not None:
+            with open(cleaned_dir / file, "w", encoding="utf-8") as f:
+                f.write(cleaned_content)
+        if chunks_dir is not None:
+            with open(chunks_dir / file, "w", encoding="utf-8") as f:
+                f.write("\n".join(chunk.model_dump_json() for chunk in chunks))
+
+        yield from chunks
+
+
+def write_chunk_store(chunks: Iterable[TextChunk], store_path: str) -> int:
+    """
+    Write a stream of chunks to a new chunk store.
+
+    Chunk ids are derived from the chunk content hashes (see chunk_id_from_hash),
+    so an unchanged chunk keeps its id across pipeline runs and only new or
+    changed chunks need to be indexed again. Duplicate chunks are stored once.
+
+    Args:
+        chunks: Chunks to store
+        store_path: Directory where the chunk store should be saved
 
-        lines = content.split("\n")
-        for line in lines:
-            line = line.strip()
-            if not line:
+    Returns:
+        Number of chunks written to the store
+    """
+    chunk_ids = set()
+    duplicates = 0
+    with ChunkStoreWriter(store_path) as writer:
+        for chunk in chunks:
+            chunk_id = chunk_id_from_hash(chunk_content_hash(chunk))
+            if chunk_id in chunk_ids:
+                duplicates += 1
                 continue
+            chunk_ids.add(chunk_id)
+            writer.append(chunk_id, chunk)
+
+    print(f"  ✓ Saved {len(chunk_ids)} chunks ({duplicates} duplicates skipped) to: {store_path}")
+
+    return len(chunk_ids)
+
+
+def create_chunk_store(input_dir: Path, store_path: str) -> int:
+    """
+    Create the chunk store used for embedding and BM25 encoding.
+
+    Reads files produced by split_into_chunks from the input directory and
+    appends every chunk (content and header path) to a single-file chunk
+    store, see write_chunk_store().
+
+    Args:
+        input_dir: Directory containing files split into chunks
+        store_path: Directory where the chunk store should be saved
+
+    Returns:
+        Number of chunks written to the store
+    """
+    def read_chunks() -> Iterator[TextChunk]:
+        for file in os.listdir(input_dir):
+            with open(input_dir / file, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield TextChunk.model_validate_json(line)
 
-            index += 1
-            # Create chunk file
-            chunk_file_path = output_dir / f"{index}.txt"
-            with open(chunk_file_path, "w", encoding="utf-8") as f:
-                f.write(line)
+            print(f"  ✓ Added chunks of {file} to the chunk store")
 
-            print(f"  ✓ Saved chunk file to: {chunk_file_path}")
-            print(
-                f"  ✓ Original size: {len(line)} chars, Cleaned size: {len(line)} chars"
-            )
+    return write_chunk_store(read_chunks(), store_path)
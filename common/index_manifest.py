@@ -0,0 +1,80 @@
+import os
+from typing import Optional
+from common.constants import INDEX_MANIFEST_PATH
+from common.chunk_store import get_chunk_store, chunk_content_hash, chunk_id_from_hash
+from common.models import IndexManifest, ReindexPlan
+
+
+def load_index_manifest(manifest_path: str = INDEX_MANIFEST_PATH) -> Optional[IndexManifest]:
+    """
+    Load the manifest of chunks indexed in the vector database.
+    
+    Args:
+        manifest_path: Path of the manifest file
+        
+    Returns:
+        Loaded IndexManifest, or None if there is no valid manifest
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return IndexManifest.model_validate_json(f.read())
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring invalid index manifest {manifest_path}: {e}")
+        return None
+
+
+def save_index_manifest(manifest: IndexManifest, manifest_path: str = INDEX_MANIFEST_PATH) -> None:
+    """
+    Save the manifest of chunks indexed in the vector database.
+    
+    The file is replaced atomically, so an interrupted run leaves the previous
+    manifest in place.
+    
+    Args:
+        manifest: Manifest to save
+        manifest_path: Path of the manifest file
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(manifest.model_dump_json())
+    os.replace(tmp_path, manifest_path)
+
+
+def plan_reindex(chunk_store_path: str, manifest: Optional[IndexManifest], collection_name: str, embedding_model: str, vector_size: int) -> ReindexPlan:
+    """
+    Compare the chunk store with the manifest of indexed chunks.
+    
+    Chunk ids are derived from content hashes, so new or changed chunks are
+    the hashes missing from the manifest and stale points are the manifest
+    hashes missing from the store. If there is no manifest, or it was built
+    for another collection, model or vector size, everything is re-indexed.
+    
+    Args:
+        chunk_store_path: Directory of the current chunk store
+        manifest: Manifest of the indexed chunks, None if there is none
+        collection_name: Name of the vector store collection, see VectorStore.name
+        embedding_model: Name of the model used to embed the chunks
+        vector_size: Dimension of the embedding vectors
+        
+    Returns:
+        ReindexPlan with the chunks to upsert and the points to delete
+    """
+    store = get_chunk_store(chunk_store_path)
+    current_hashes = {chunk_content_hash(chunk): chunk_id for chunk_id, chunk in store.iter_chunks()}
+
+    full_rebuild = (
+        manifest is None
+        or manifest.collection_name != collection_name
+        or manifest.embedding_model != embedding_model
+        or manifest.vector_size != vector_size
+    )
+    indexed_hashes = set() if full_rebuild else set(manifest.chunk_hashes)
+
+    return ReindexPlan(
+        full_rebuild=full_rebuild,
+        new_chunk_ids=[chunk_id for content_hash, chunk_id in current_hashes.items() if content_hash not in indexed_hashes],
+        stale_chunk_ids=[chunk_id_from_hash(content_hash) for content_hash in indexed_hashes if content_hash not in current_hashes],
+        chunk_hashes=sorted(current_hashes),
+    )
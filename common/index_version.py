@@ -0,0 +1,62 @@
+import os
+import time
+import uuid
+import threading
+from typing import Optional, Tuple, Dict
+from common.constants import INDEX_VERSION_PATH
+
+
+# Last read version per file path, with the file modification time it was read at
+_cached_versions: Dict[str, Tuple[int, str]] = {}
+_cached_versions_lock = threading.Lock()
+
+
+def write_index_version(index_version_path: str = INDEX_VERSION_PATH) -> str:
+    """
+    Stamp the indexes with a new version.
+    
+    Called by rag_pipeline.py after the Qdrant collection and BM25 index are
+    rebuilt. Caches compare their entries with this version, so a re-index
+    invalidates them automatically.
+    
+    Args:
+        index_version_path: Path of the index version file
+        
+    Returns:
+        The new index version
+    """
+    index_version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    tmp_path = f"{index_version_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(index_version)
+    os.replace(tmp_path, index_version_path)
+
+    return index_version
+
+
+def read_index_version(index_version_path: str = INDEX_VERSION_PATH) -> Optional[str]:
+    """
+    Read the current index version.
+    
+    The file is read again only when its modification time changes, so this
+    is cheap enough to call on every query.
+    
+    Args:
+        index_version_path: Path of the index version file
+        
+    Returns:
+        Current index version, or None if the indexes were never stamped
+    """
+    try:
+        mtime_ns = os.stat(index_version_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _cached_versions_lock:
+        cached = _cached_versions.get(index_version_path)
+        if cached is None or cached[0] != mtime_ns:
+            with open(index_version_path, "r", encoding="utf-8") as f:
+                cached = (mtime_ns, f.read().strip())
+            _cached_versions[index_version_path] = cached
+        return cached[1]
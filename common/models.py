@@ -11,12 +11,20 @@ from pathlib import Path
 from enum import Enum
 
 
+class TextChunk(BaseModel):
+    """Model for a document chunk with its section header path."""
+    
+    headers: List[str] = Field(default_factory=list, description="Headers of the section the chunk belongs to, from the top level down")
+    text: str = Field(..., description="Text content of the chunk without headers")
+
+
 class EmbeddingMetadata(BaseModel):
     """Model for embedding metadata and vectors."""
     
     text: str = Field(..., description="Text content of the chunk")
     id: int = Field(..., description="Unique identifier for the chunk")
     vector: List[float] = Field(..., description="Embedding vector")
+    headers: List[str] = Field(default_factory=list, description="Section header path of the chunk")
 
 
 class SearchResult(BaseModel):
@@ -25,6 +33,7 @@ class SearchResult(BaseModel):
     id: int = Field(..., description="Document/chunk identifier")
     score: float = Field(..., description="Relevance score")
     text: str = Field(..., description="Text content of the result")
+    headers: List[str] = Field(default_factory=list, description="Section header path of the result")
 
 
 class HybridSearchResult(BaseModel):
@@ -32,6 +41,7 @@ class HybridSearchResult(BaseModel):
     
     id: int = Field(..., description="Document/chunk identifier")
     text: str = Field(..., description="Text content of the result")
+    headers: List[str] = Field(default_factory=list, description="Section header path of the result")
     qdrant_score: Optional[float] = Field(None, description="Score from vector search")
     bm25_score: Optional[float] = Field(None, description="Score from BM25 search")
     combined_score: float = Field(..., description="Combined reciprocal rank fusion score")
@@ -76,6 +86,22 @@ class ModelResponse(BaseModel):
     response: str = Field(..., description="Model's response text")
     done: bool = Field(False, description="Whether the response is complete")
     error: Optional[str] = Field(None, description="Error message if any")
+    total_duration: Optional[int] = Field(None, description="Total request time on the server in nanoseconds")
+    load_duration: Optional[int] = Field(None, description="Model load time in nanoseconds")
+    prompt_eval_count: Optional[int] = Field(None, description="Number of prompt tokens")
+    prompt_eval_duration: Optional[int] = Field(None, description="Prompt processing time in nanoseconds")
+    eval_count: Optional[int] = Field(None, description="Number of generated tokens")
+    eval_duration: Optional[int] = Field(None, description="Generation time in nanoseconds")
+
+
+class GenerationStats(BaseModel):
+    """Model for latency and throughput statistics of a single model call."""
+    
+    time_to_first_token_s: Optional[float] = Field(None, description="Time from sending the request to the first response token in seconds")
+    total_time_s: float = Field(..., ge=0, description="Total time of the call in seconds")
+    prompt_tokens: Optional[int] = Field(None, description="Number of prompt tokens")
+    output_tokens: Optional[int] = Field(None, description="Number of generated tokens")
+    tokens_per_second: Optional[float] = Field(None, description="Generation speed in tokens per second")
 
 
 class PromptData(BaseModel):
@@ -85,6 +111,8 @@ class PromptData(BaseModel):
     user_prompt: str = Field(..., description="User's question or input")
     db_chunks_number: int = Field(..., ge=1, le=100, description="Number of chunks to retrieve from database")
     model_context_chunks_number: int = Field(..., ge=1, le=50, description="Number of chunks to pass to model")
+    context_token_budget: Optional[int] = Field(None, ge=1, description="Maximum number of context tokens, None for no limit")
+    truncate_last_chunk: bool = Field(False, description="Whether to truncate the first chunk that does not fit into the budget")
 
 
 class SearchType(Enum):
@@ -108,8 +136,9 @@ class FileProcessingConfig(BaseModel):
     
     input_dir: Path = Field(..., description="Input directory path")
     output_dir: Path = Field(..., description="Output directory path")
-    chunk_size: Optional[int] = Field(None, description="Size of text chunks")
-    overlap: Optional[int] = Field(0, description="Overlap between chunks")
+    chunk_size: Optional[int] = Field(None, ge=1, description="Maximum size of text chunks in tokens, None for no limit")
+    min_chunk_size: Optional[int] = Field(None, ge=1, description="Minimum size of text chunks in tokens, None to keep small chunks")
+    overlap: Optional[int] = Field(0, ge=0, description="Overlap between chunks split from one paragraph in tokens")
 
 
 class BM25Config(BaseModel):
@@ -127,4 +156,88 @@ class QdrantConfig(BaseModel):
     vector_size: int = Field(..., gt=0, description="Dimension of embedding vectors")
     distance_metric: str = Field("COSINE", description="Distance metric for similarity search")
     url: str = Field("http://localhost:6333", description="Qdrant server URL")
-    port: int = Field(6333, description="Qdrant server port") 
\ No newline at end of file
+    port: int = Field(6333, description="Qdrant server port")
+
+
+class EncoderStats(BaseModel):
+    """Model for query encoder load time and latency statistics."""
+    
+    model_name: str = Field(..., description="Name of the embedding model")
+    device: str = Field(..., description="Device the model runs on")
+    dtype: str = Field(..., description="Torch dtype of the model weights")
+    num_threads: Optional[int] = Field(None, description="Number of CPU threads used by torch")
+    load_time_s: float = Field(..., ge=0, description="Time taken to load the model in seconds")
+    encode_calls: int = Field(0, ge=0, description="Number of encode calls served")
+    encoded_queries: int = Field(0, ge=0, description="Number of queries encoded")
+    last_encode_latency_ms: Optional[float] = Field(None, description="Latency of the last encode call in milliseconds")
+    avg_encode_latency_ms: Optional[float] = Field(None, description="Average encode call latency in milliseconds")
+
+
+class BatchingStats(BaseModel):
+    """Model for query embedding micro-batching statistics."""
+    
+    max_batch_size: int = Field(..., ge=1, description="Maximum number of queries in one batch")
+    max_wait_ms: float = Field(..., ge=0, description="Maximum time a batch waits for more queries in milliseconds")
+    batches: int = Field(0, ge=0, description="Number of encoded batches")
+    queries: int = Field(0, ge=0, description="Number of encoded queries")
+    batch_size_histogram: Dict[int, int] = Field(default_factory=dict, description="Number of batches per batch size")
+    queue_wait_ms_histogram: Dict[str, int] = Field(default_factory=dict, description="Number of queries per queue wait time bucket")
+
+
+class RetrievedContext(BaseModel):
+    """Model for the context retrieved for a query."""
+    
+    context: str = Field(..., description="Context text appended to the system prompt")
+    chunk_ids: List[int] = Field(default_factory=list, description="Identifiers of the chunks in the context, in context order")
+    tokens_used: int = Field(0, ge=0, description="Number of tokens in the context")
+
+
+class CacheStats(BaseModel):
+    """Model for cache hit/miss statistics."""
+    
+    hits: int = Field(0, ge=0, description="Number of cache hits")
+    misses: int = Field(0, ge=0, description="Number of cache misses")
+    entries: int = Field(0, ge=0, description="Number of entries in the cache")
+    hit_rate: Optional[float] = Field(None, description="Fraction of lookups that were hits")
+
+
+class IndexManifest(BaseModel):
+    """Model for the manifest of chunks indexed in the vector database."""
+    
+    collection_name: str = Field(..., description="Name of the vector store collection, see VectorStore.name")
+    embedding_model: str = Field(..., description="Name of the model used to embed the chunks")
+    vector_size: int = Field(..., ge=1, description="Dimension of the embedding vectors")
+    chunk_hashes: List[str] = Field(default_factory=list, description="Content hashes of the indexed chunks")
+
+
+class ReindexPlan(BaseModel):
+    """Model for the changes needed to bring the vector index up to date."""
+    
+    full_rebuild: bool = Field(..., description="Whether the collection has to be rebuilt from scratch")
+    new_chunk_ids: List[int] = Field(default_factory=list, description="Identifiers of chunks to embed and upsert")
+    stale_chunk_ids: List[int] = Field(default_factory=list, description="Identifiers of points to delete")
+    chunk_hashes: List[str] = Field(default_factory=list, description="Content hashes of all current chunks")
+
+
+class BM25Segment(BaseModel):
+    """Model for one immutable segment of the BM25 index."""
+    
+    name: str = Field(..., description="Directory of the segment within the index directory")
+    num_docs: int = Field(..., ge=0, description="Number of documents in the segment, including deleted ones")
+    deleted_chunk_ids: List[int] = Field(default_factory=list, description="Identifiers of deleted documents of the segment")
+
+
+class BM25SegmentsManifest(BaseModel):
+    """Model for the list of live segments of the BM25 index."""
+    
+    k1: float = Field(..., description="BM25 term frequency saturation")
+    b: float = Field(..., description="BM25 document length normalization")
+    stemming: bool = Field(..., description="Whether documents were tokenized with light stemming")
+    segments: List[BM25Segment] = Field(default_factory=list, description="Live segments, oldest first")
+
+
+class BM25ShardsManifest(BaseModel):
+    """Model for the shards of a sharded BM25 index."""
+    
+    num_shards: int = Field(..., gt=1, description="Number of shards, chunks are assigned to shards by chunk id modulo num_shards")
+    shards: List[str] = Field(..., description="Directories of the segmented indexes of the shards within the index directory")
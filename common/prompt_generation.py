@@ -1,69 +1,511 @@
-from common.constants import QDRANT_COLLECTION_NAME, BM25_ENCODINGS_DB_PATH
-from common.embeddings import generate_query_embedding
-from common.qdrant_api import search_answer_in_qdrant
-from common.bm25_encoding import get_top_k_bm25_encoding_results
-from common.reciprocal_rank_fusion import hybrid_search
-from typing import Tuple
-from common.models import PromptData, SearchType
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from common.constants import (
+    BM25_ENCODINGS_DB_PATH,
+    VECTOR_SEARCH_TIMEOUT_S,
+    BM25_SEARCH_TIMEOUT_S,
+    RETRIEVAL_MAX_WORKERS,
+    RETRIEVAL_CACHE_ENABLED,
+    CONTEXT_TOKEN_BUDGET,
+    MIN_TRUNCATED_CHUNK_TOKENS,
+)
+from common.vector_store import get_vector_store
+from common.bm25_encoding import get_top_k_bm25_encoding_results, aget_top_k_bm25_encoding_results
+from common.reciprocal_rank_fusion import reciprocal_rank_fusion
+from common.token_counting import count_tokens, truncate_to_tokens
+from common.retrieval_cache import RetrievalCacheKey, get_retrieval_cache, make_retrieval_cache_key
+from typing import Tuple, List, Optional, Dict
+from common.models import PromptData, SearchType, SearchResult, RetrievedContext
 
 
-def create_prompt(system_prompt: str, user_prompt: str, db_chunks_number: int, model_context_chunks_number: int, search_type: SearchType = SearchType.HYBRID) -> Tuple[str, str]:
+# Thread pool shared by the retrieval branches of all create_prompt calls
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval")
+
+
+def search_vector(user_prompt: str, db_chunks_number: int) -> List[SearchResult]:
+    """
+    Run the vector retrieval branch: embed the query and search the vector store.
+    
+    The vector store (Qdrant or the local NumPy store) is selected by the
+    VECTOR_STORE_BACKEND constant.
+    
+    Args:
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from the database
+        
+    Returns:
+        List of SearchResult objects from the vector store
+    """
+    from common.embeddings import generate_query_embedding
+
+    query_embedding = generate_query_embedding(user_prompt)
+    return get_vector_store().search(
+        query_embedding=query_embedding, 
+        db_chunks_number=db_chunks_number
+    )
+
+
+def search_bm25(user_prompt: str, db_chunks_number: int) -> List[SearchResult]:
+    """
+    Run the BM25 retrieval branch.
+    
+    Args:
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from the database
+        
+    Returns:
+        List of SearchResult objects from the BM25 index
+    """
+    return get_top_k_bm25_encoding_results(
+        user_prompt, 
+        BM25_ENCODINGS_DB_PATH, 
+        db_chunks_number=db_chunks_number
+    )
+
+
+def _wait_for_branch(future: Future, deadline: float, branch_name: str) -> Optional[List[SearchResult]]:
+    """
+    Wait for a retrieval branch until its deadline.
+    
+    Args:
+        future: Future of the running retrieval branch
+        deadline: time.monotonic() value after which the branch is abandoned
+        branch_name: Branch name used in log messages
+        
+    Returns:
+        Branch results, or None if the branch failed or timed out
+    """
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        print(f"{branch_name} search timed out, continuing without it")
+    except Exception as e:
+        print(f"{branch_name} search failed, continuing without it: {e}")
+    return None
+
+
+def search_hybrid(user_prompt: str, db_chunks_number: int) -> Tuple[Optional[List[SearchResult]], Optional[List[SearchResult]]]:
+    """
+    Run the vector and BM25 retrieval branches concurrently.
+    
+    Each branch has its own timeout counted from the moment both branches
+    start. If one branch fails or times out, its results are None, so the
+    fusion falls back to the other branch alone.
+    
+    Args:
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from each branch
+        
+    Returns:
+        Tuple of (qdrant_results, bm25_results), None for a failed branch
+        
+    Raises:
+        RuntimeError: If both branches fail or time out
+    """
+    start_time = time.monotonic()
+    qdrant_future = _retrieval_executor.submit(search_vector, user_prompt, db_chunks_number)
+    bm25_future = _retrieval_executor.submit(search_bm25, user_prompt, db_chunks_number)
+
+    qdrant_results = _wait_for_branch(qdrant_future, start_time + VECTOR_SEARCH_TIMEOUT_S, "Vector")
+    bm25_results = _wait_for_branch(bm25_future, start_time + BM25_SEARCH_TIMEOUT_S, "BM25")
+
+    if qdrant_results is None and bm25_results is None:
+        raise RuntimeError("Both vector and BM25 searches failed")
+
+    return qdrant_results, bm25_results
+
+
+def build_context(search_type: SearchType, qdrant_results: List[SearchResult], bm25_results: List[SearchResult], model_context_chunks_number: int, context_token_budget: Optional[int] = None, truncate_last_chunk: bool = False) -> RetrievedContext:
+    """
+    Build the context passed to the model from retrieval results.
+    
+    Chunks are packed in rank order and grouped by section: the header path of
+    a section is printed once, followed by all of its retrieved chunks. With a
+    token budget, packing stops at the first chunk that does not fit; that chunk
+    is truncated to the remaining budget if truncate_last_chunk is set and at
+    least MIN_TRUNCATED_CHUNK_TOKENS are left.
+    
+    Args:
+        search_type: Search type the results come from
+        qdrant_results: Results of the vector search (unused for SearchType.BM25)
+        bm25_results: Results of the BM25 search (unused for SearchType.VECTOR)
+        model_context_chunks_number: Maximum number of chunks in hybrid search context
+        context_token_budget: Maximum number of context tokens, None for no limit
+        truncate_last_chunk: Whether to truncate the first chunk that does not fit into the budget
+        
+    Returns:
+        RetrievedContext with the context text, ids of the included chunks and the number of tokens used
+    """
+    if search_type == SearchType.VECTOR:
+        results = qdrant_results
+    elif search_type == SearchType.BM25:
+        results = bm25_results
+    elif search_type == SearchType.HYBRID:
+        results = reciprocal_rank_fusion(qdrant_results, bm25_results)[:model_context_chunks_number]
+
+    section_separator = "\n\n"
+    line_separator = "\n"
+    section_separator_tokens = count_tokens(section_separator)
+    line_separator_tokens = count_tokens(line_separator)
+
+    # section key -> (header line, chunk texts), in order of first appearance
+    sections: Dict[tuple, Tuple[Optional[str], List[str]]] = {}
+    chunk_ids = []
+    tokens_used = 0
+
+    for result in results:
+        if result.headers:
+            section_key = tuple(result.headers)
+            header_line = " > ".join(result.headers)
+        else:
+            # Chunks without header metadata are not grouped
+            section_key = (None, result.id)
+            header_line = None
+
+        if section_key in sections:
+            overhead_tokens = line_separator_tokens
+        else:
+            overhead_tokens = section_separator_tokens if sections else 0
+            if header_line is not None:
+                overhead_tokens += count_tokens(header_line) + line_separator_tokens
+
+        text = result.text
+        needed_tokens = overhead_tokens + count_tokens(text)
+        if context_token_budget is not None and tokens_used + needed_tokens > context_token_budget:
+            remaining_tokens = context_token_budget - tokens_used - overhead_tokens
+            if not truncate_last_chunk or remaining_tokens < MIN_TRUNCATED_CHUNK_TOKENS:
+                break
+            text = truncate_to_tokens(text, remaining_tokens)
+            if text is None:
+                break
+            needed_tokens = overhead_tokens + count_tokens(text)
+
+        sections.setdefault(section_key, (header_line, []))[1].append(text)
+        chunk_ids.append(result.id)
+        tokens_used += needed_tokens
+
+        if text is not result.text:
+            # The truncated chunk used up the budget
+            break
+
+    context = section_separator.join(
+        (header_line + line_separator if header_line is not None else "") + line_separator.join(texts)
+        for header_line, texts in sections.values()
+    )
+
+    return RetrievedContext(
+        context=context,
+        chunk_ids=chunk_ids,
+        tokens_used=tokens_used,
+    )
+
+
+def _lookup_cached_context(prompt_data: PromptData, search_type: SearchType) -> Tuple[RetrievalCacheKey, Optional[RetrievedContext]]:
+    """
+    Look up the context of a query in the retrieval cache.
+    
+    Args:
+        prompt_data: Validated prompt parameters
+        search_type: Search type to use for retrieval
+        
+    Returns:
+        Tuple of (cache key, cached RetrievedContext or None on a miss or with the cache disabled)
+    """
+    cache_key = make_retrieval_cache_key(
+        prompt_data.user_prompt,
+        search_type,
+        prompt_data.db_chunks_number,
+        prompt_data.model_context_chunks_number,
+        prompt_data.context_token_budget,
+        prompt_data.truncate_last_chunk,
+    )
+    cached_context = get_retrieval_cache().get(cache_key) if RETRIEVAL_CACHE_ENABLED else None
+    return cache_key, cached_context
+
+
+def _finish_context(prompt_data: PromptData, search_type: SearchType, cache_key: RetrievalCacheKey, qdrant_results: Optional[List[SearchResult]], bm25_results: Optional[List[SearchResult]]) -> RetrievedContext:
+    """
+    Build the context from retrieval results and store it in the retrieval cache.
+    
+    Results of a hybrid search where one branch failed (None) are not cached,
+    so a temporary outage does not pin degraded results in the cache.
+    
+    Args:
+        prompt_data: Validated prompt parameters
+        search_type: Search type used for retrieval
+        cache_key: Key returned by _lookup_cached_context()
+        qdrant_results: Results of the vector search, None if it failed
+        bm25_results: Results of the BM25 search, None if it failed
+        
+    Returns:
+        RetrievedContext for the query
+    """
+    retrieved_context = build_context(
+        search_type,
+        qdrant_results or [],
+        bm25_results or [],
+        prompt_data.model_context_chunks_number,
+        prompt_data.context_token_budget,
+        prompt_data.truncate_last_chunk,
+    )
+
+    is_complete = search_type != SearchType.HYBRID or (qdrant_results is not None and bm25_results is not None)
+    if RETRIEVAL_CACHE_ENABLED and is_complete:
+        get_retrieval_cache().put(cache_key, retrieved_context)
+
+    return retrieved_context
+
+
+def retrieve_context(prompt_data: PromptData, search_type: SearchType = SearchType.HYBRID) -> RetrievedContext:
+    """
+    Retrieve the context for a query, using the retrieval cache.
+    
+    Results of a hybrid search where one branch failed are not cached, so a
+    temporary outage does not pin degraded results in the cache.
+    
+    Args:
+        prompt_data: Validated prompt parameters
+        search_type: Search type to use for retrieval
+        
+    Returns:
+        RetrievedContext for the query
+    """
+    cache_key, cached_context = _lookup_cached_context(prompt_data, search_type)
+    if cached_context is not None:
+        return cached_context
+
+    qdrant_results = []
+    bm25_results = []
+
+    if search_type == SearchType.VECTOR:
+        qdrant_results = search_vector(prompt_data.user_prompt, prompt_data.db_chunks_number)
+
+    if search_type == SearchType.BM25:
+        bm25_results = search_bm25(prompt_data.user_prompt, prompt_data.db_chunks_number)
+
+    if search_type == SearchType.HYBRID:
+        qdrant_results, bm25_results = search_hybrid(prompt_data.user_prompt, prompt_data.db_chunks_number)
+
+    return _finish_context(prompt_data, search_type, cache_key, qdrant_results, bm25_results)
+
+
+def create_prompt_and_context(system_prompt: str, user_prompt: str, db_chunks_number: int, model_context_chunks_number: int, search_type: SearchType = SearchType.HYBRID, context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET, truncate_last_chunk: bool = False) -> Tuple[str, RetrievedContext]:
+    """
+    Create a complete prompt and return it together with the retrieved context.
+    
+    Same as create_prompt, but also returns the RetrievedContext, e.g. for the
+    ids of the chunks the answer will be based on.
+    
+    Args:
+        system_prompt: Base system prompt for the model
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from the database
+        model_context_chunks_number: Maximum number of chunks to include in the final context
+        search_type: Search type to use for retrieval
+        context_token_budget: Maximum number of context tokens, None for no limit
+        truncate_last_chunk: Whether to truncate the first chunk that does not fit into the budget
+        
+    Returns:
+        Tuple of (enhanced_system_prompt, retrieved_context)
+    """
+    # Validate input parameters using Pydantic model
+    prompt_data = PromptData(
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        db_chunks_number=db_chunks_number,
+        model_context_chunks_number=model_context_chunks_number,
+        context_token_budget=context_token_budget,
+        truncate_last_chunk=truncate_last_chunk,
+    )
+    
+    retrieved_context = retrieve_context(prompt_data, search_type)
+
+    enhanced_system_prompt = prompt_data.system_prompt + "\n\n" + retrieved_context.context
+    
+    return enhanced_system_prompt, retrieved_context
+
+
+def create_prompt(system_prompt: str, user_prompt: str, db_chunks_number: int, model_context_chunks_number: int, search_type: SearchType = SearchType.HYBRID, context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET, truncate_last_chunk: bool = False) -> Tuple[str, str]:
     """
     Create a complete prompt by combining system prompt with retrieved context.
     
     Generates embeddings for the user query, retrieves relevant documents using both
-    vector search (Qdrant) and text search (BM25), combines results using hybrid search,
-    and appends the context to the system prompt.
+    vector search (Qdrant or the local vector store, see VECTOR_STORE_BACKEND) and
+    text search (BM25), combines results using hybrid search,
+    and appends the context to the system prompt. In hybrid mode both searches run
+    concurrently and a failed or slow search is skipped in favour of the other one.
+    Retrieval results are cached until the index is rebuilt. With a context token
+    budget, the highest-ranked chunks are packed until the budget is reached.
     
     Args:
         system_prompt: Base system prompt for the model
         user_prompt: User's question or query
         db_chunks_number: Number of chunks to retrieve from the database
         model_context_chunks_number: Maximum number of chunks to include in the final context
+        search_type: Search type to use for retrieval
+        context_token_budget: Maximum number of context tokens, None for no limit
+        truncate_last_chunk: Whether to truncate the first chunk that does not fit into the budget
         
     Returns:
         Tuple of (enhanced_system_prompt, user_prompt) where the system prompt
         contains the retrieved context
     """
+    enhanced_system_prompt, _ = create_prompt_and_context(
+        system_prompt, user_prompt, db_chunks_number, model_context_chunks_number, search_type,
+        context_token_budget, truncate_last_chunk
+    )
+    
+    return enhanced_system_prompt
+
+
+async def asearch_vector(user_prompt: str, db_chunks_number: int) -> List[SearchResult]:
+    """
+    Asynchronous version of search_vector.
+    
+    Args:
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from the database
+        
+    Returns:
+        List of SearchResult objects from the vector store
+    """
+    from common.embeddings import agenerate_query_embedding
+
+    query_embedding = await agenerate_query_embedding(user_prompt)
+    return await get_vector_store().asearch(
+        query_embedding=query_embedding, 
+        db_chunks_number=db_chunks_number
+    )
+
+
+async def asearch_bm25(user_prompt: str, db_chunks_number: int) -> List[SearchResult]:
+    """
+    Asynchronous version of search_bm25.
+    
+    Args:
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from the database
+        
+    Returns:
+        List of SearchResult objects from the BM25 index
+    """
+    return await aget_top_k_bm25_encoding_results(
+        user_prompt, 
+        BM25_ENCODINGS_DB_PATH, 
+        db_chunks_number=db_chunks_number
+    )
+
+
+async def _await_branch(coroutine, timeout_s: float, branch_name: str) -> Optional[List[SearchResult]]:
+    """
+    Await a retrieval branch with a timeout.
+    
+    Args:
+        coroutine: Coroutine of the retrieval branch
+        timeout_s: Timeout of the branch in seconds
+        branch_name: Branch name used in log messages
+        
+    Returns:
+        Branch results, or None if the branch failed or timed out
+    """
+    try:
+        return await asyncio.wait_for(coroutine, timeout=timeout_s)
+    except asyncio.TimeoutError:
+        print(f"{branch_name} search timed out, continuing without it")
+    except Exception as e:
+        print(f"{branch_name} search failed, continuing without it: {e}")
+    return None
+
+
+async def asearch_hybrid(user_prompt: str, db_chunks_number: int) -> Tuple[Optional[List[SearchResult]], Optional[List[SearchResult]]]:
+    """
+    Asynchronous version of search_hybrid.
+    
+    Args:
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from each branch
+        
+    Returns:
+        Tuple of (qdrant_results, bm25_results), None for a failed branch
+        
+    Raises:
+        RuntimeError: If both branches fail or time out
+    """
+    qdrant_results, bm25_results = await asyncio.gather(
+        _await_branch(asearch_vector(user_prompt, db_chunks_number), VECTOR_SEARCH_TIMEOUT_S, "Vector"),
+        _await_branch(asearch_bm25(user_prompt, db_chunks_number), BM25_SEARCH_TIMEOUT_S, "BM25"),
+    )
+
+    if qdrant_results is None and bm25_results is None:
+        raise RuntimeError("Both vector and BM25 searches failed")
+
+    return qdrant_results, bm25_results
+
+
+async def aretrieve_context(prompt_data: PromptData, search_type: SearchType = SearchType.HYBRID) -> RetrievedContext:
+    """
+    Asynchronous version of retrieve_context.
+    
+    Args:
+        prompt_data: Validated prompt parameters
+        search_type: Search type to use for retrieval
+        
+    Returns:
+        RetrievedContext for the query
+    """
+    cache_key, cached_context = _lookup_cached_context(prompt_data, search_type)
+    if cached_context is not None:
+        return cached_context
+
+    qdrant_results = []
+    bm25_results = []
+
+    if search_type == SearchType.VECTOR:
+        qdrant_results = await asearch_vector(prompt_data.user_prompt, prompt_data.db_chunks_number)
+
+    if search_type == SearchType.BM25:
+        bm25_results = await asearch_bm25(prompt_data.user_prompt, prompt_data.db_chunks_number)
+
+    if search_type == SearchType.HYBRID:
+        qdrant_results, bm25_results = await asearch_hybrid(prompt_data.user_prompt, prompt_data.db_chunks_number)
+
+    return _finish_context(prompt_data, search_type, cache_key, qdrant_results, bm25_results)
+
+
+async def acreate_prompt(system_prompt: str, user_prompt: str, db_chunks_number: int, model_context_chunks_number: int, search_type: SearchType = SearchType.HYBRID, context_token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET, truncate_last_chunk: bool = False) -> str:
+    """
+    Asynchronous version of create_prompt.
+    
+    Vector search uses AsyncQdrantClient (the local vector store runs in a
+    worker thread), while query embedding and BM25 scoring run in worker
+    threads, so a single event loop can serve many concurrent chat sessions.
+    Returns the same context as create_prompt.
+    
+    Args:
+        system_prompt: Base system prompt for the model
+        user_prompt: User's question or query
+        db_chunks_number: Number of chunks to retrieve from the database
+        model_context_chunks_number: Maximum number of chunks to include in the final context
+        search_type: Search type to use for retrieval
+        context_token_budget: Maximum number of context tokens, None for no limit
+        truncate_last_chunk: Whether to truncate the first chunk that does not fit into the budget
+        
+    Returns:
+        System prompt with the retrieved context appended
+    """
     # Validate input parameters using Pydantic model
     prompt_data = PromptData(
         system_prompt=system_prompt,
         user_prompt=user_prompt,
         db_chunks_number=db_chunks_number,
-        model_context_chunks_number=model_context_chunks_number
+        model_context_chunks_number=model_context_chunks_number,
+        context_token_budget=context_token_budget,
+        truncate_last_chunk=truncate_last_chunk,
     )
-    
-    if search_type == SearchType.VECTOR or search_type == SearchType.HYBRID:
-        query_embedding = generate_query_embedding(prompt_data.user_prompt)
-        qdrant_results = search_answer_in_qdrant(
-            collection_name=QDRANT_COLLECTION_NAME, 
-            query_embedding=query_embedding, 
-            db_chunks_number=prompt_data.db_chunks_number
-        )
-
-    if search_type == SearchType.BM25 or search_type == SearchType.HYBRID:  
-        bm25_results = get_top_k_bm25_encoding_results(
-            prompt_data.user_prompt, 
-            BM25_ENCODINGS_DB_PATH, 
-            db_chunks_number=prompt_data.db_chunks_number
-        )
 
-    if search_type == SearchType.HYBRID:
-        hybrid_search_answers = hybrid_search(
-            qdrant_results=qdrant_results, 
-            bm25_results=bm25_results, 
-            max_results=prompt_data.model_context_chunks_number
-        )
+    retrieved_context = await aretrieve_context(prompt_data, search_type)
 
-    if search_type == SearchType.VECTOR:
-        qdrant_results_text = [result.text for result in qdrant_results]
-        context = "\n\n".join(qdrant_results_text)
-    elif search_type == SearchType.BM25:
-        bm25_results_text = [result.text for result in bm25_results]
-        context = "\n\n".join(bm25_results_text)
-    elif search_type == SearchType.HYBRID:
-        context = "\n\n".join(hybrid_search_answers)
+    enhanced_system_prompt = prompt_data.system_prompt + "\n\n" + retrieved_context.context
 
-    enhanced_system_prompt = prompt_data.system_prompt + "\n\n" + context
-    
     return enhanced_system_prompt
@@ -1,11 +1,33 @@
-from common.constants import QDRANT_URL, QDRANT_PORT
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from common.constants import (
+    QDRANT_URL,
+    QDRANT_PORT,
+    QDRANT_POOL_SIZE,
+    QDRANT_TIMEOUT_S,
+    QDRANT_HEALTH_TTL_S,
+    QDRANT_STARTUP_TIMEOUT_S,
+    QDRANT_UPLOAD_BATCH_SIZE,
+    QDRANT_UPLOAD_PARALLELISM,
+    QDRANT_UPLOAD_MAX_RETRIES,
+    QDRANT_UPLOAD_BACKOFF_S,
+    QDRANT_UPLOAD_MAX_BACKOFF_S,
+)
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams, PointIdsList, Batch
+from qdrant_client.http.exceptions import ResponseHandlingException
+import httpx
+import numpy as np
+import asyncio
+import random
 import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Callable, TypeVar, Optional, Iterable, Iterator, Tuple
 from tqdm import tqdm
-from common.models import SearchResult, EmbeddingMetadata, QdrantConfig
+from common.models import SearchResult, QdrantConfig, TextChunk
+from common.chunk_store import hydrate_search_results
 
 
 def ensure_qdrant_running() -> None:
@@ -52,40 +74,334 @@ def ensure_qdrant_running() -> None:
         print(f"Failed to manage Qdrant Docker container: {e}")
 
 
-def upload_to_qdrant(collection_name: str, embeddings_and_metadata: List[EmbeddingMetadata], vector_size: int) -> None:
+T = TypeVar("T")
+
+# Errors meaning that the Qdrant server could not be reached (as opposed to errors returned by the server)
+QDRANT_CONNECTION_ERRORS = (ResponseHandlingException, httpx.TransportError, ConnectionError)
+
+
+class QdrantConnectionManager:
+    """
+    Process-wide owner of a pooled Qdrant client.
+    
+    Creates a single QdrantClient (which keeps a pool of HTTP connections) and
+    caches the result of the last health check for a TTL. The Docker container
+    is managed only when the health check fails, i.e. on first use or after a
+    real connection failure, instead of on every request.
+    """
+
+    def __init__(self, url: str, health_ttl_s: float = QDRANT_HEALTH_TTL_S):
+        """
+        Args:
+            url: Qdrant server URL
+            health_ttl_s: How long a successful health check stays valid, in seconds
+        """
+        self.url = url
+        self.health_ttl_s = health_ttl_s
+        self._client = None
+        self._healthy_until = 0.0
+        self._lock = threading.Lock()
+
+    def _is_healthy(self, client: QdrantClient) -> bool:
+        """Check if the Qdrant server answers requests."""
+        try:
+            client.get_collections()
+            return True
+        except QDRANT_CONNECTION_ERRORS:
+            return False
+
+    def _wait_until_healthy(self, client: QdrantClient) -> bool:
+        """Poll the Qdrant server until it answers or the startup timeout passes."""
+        deadline = time.monotonic() + QDRANT_STARTUP_TIMEOUT_S
+        while time.monotonic() < deadline:
+            if self._is_healthy(client):
+                return True
+            time.sleep(0.5)
+        return False
+
+    def get_client(self) -> QdrantClient:
+        """
+        Get the pooled client, making sure the server is reachable.
+        
+        Returns:
+            Shared QdrantClient instance
+            
+        Raises:
+            ConnectionError: If Qdrant cannot be reached even after starting its container
+        """
+        if self._client is not None and time.monotonic() < self._healthy_until:
+            return self._client
+
+        with self._lock:
+            if self._client is None:
+                self._client = QdrantClient(
+                    url=self.url,
+                    timeout=QDRANT_TIMEOUT_S,
+                    pool_size=QDRANT_POOL_SIZE,
+                    check_compatibility=False,
+                )
+
+            if time.monotonic() >= self._healthy_until:
+                if not self._is_healthy(self._client):
+                    ensure_qdrant_running()
+                    if not self._wait_until_healthy(self._client):
+                        raise ConnectionError(f"Qdrant is not reachable at {self.url}")
+                self._healthy_until = time.monotonic() + self.health_ttl_s
+
+        return self._client
+
+    def mark_unhealthy(self) -> None:
+        """Invalidate the cached health state, so the next request checks the server again."""
+        self._healthy_until = 0.0
+
+    def run(self, operation: Callable[[QdrantClient], T]) -> T:
+        """
+        Run an operation with the pooled client, recovering from one connection failure.
+        
+        If the server cannot be reached, the health state is invalidated (which
+        restarts the container if needed) and the operation is retried once.
+        
+        Args:
+            operation: Function taking the client and returning the operation result
+            
+        Returns:
+            Result of the operation
+        """
+        try:
+            return operation(self.get_client())
+        except QDRANT_CONNECTION_ERRORS as e:
+            print(f"Lost connection to Qdrant, reconnecting: {e}")
+            self.mark_unhealthy()
+            return operation(self.get_client())
+
+
+_connection_manager = QdrantConnectionManager(QDRANT_URL)
+
+
+def get_qdrant_client() -> QdrantClient:
+    """
+    Get the process-wide pooled Qdrant client.
+    
+    Starts the Qdrant container on first use if the server is not reachable.
+    
+    Returns:
+        Shared QdrantClient instance
+    """
+    return _connection_manager.get_client()
+
+
+_async_client: Optional[AsyncQdrantClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_client_closer: Optional[asyncio.Task] = None
+_async_client_lock = threading.Lock()
+
+
+async def _close_async_client_on_shutdown(client: AsyncQdrantClient) -> None:
+    """
+    Keep an asynchronous client open until this task is cancelled, then close it.
+    
+    asyncio.run() cancels the remaining tasks of its loop before closing it,
+    so the connection pool of a loop that finishes is closed on that loop.
+    """
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.close()
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Get the pooled asynchronous Qdrant client of the running event loop.
+    
+    The underlying HTTP connection pool is bound to an event loop, so a new
+    client is created only when called from a different loop than before. The
+    superseded client is closed on its own loop: by asyncio.run() if that loop
+    has finished, or right away if it is still running in another thread.
+    
+    Returns:
+        Shared AsyncQdrantClient instance
+    """
+    global _async_client, _async_client_loop, _async_client_closer
+    loop = asyncio.get_running_loop()
+
+    with _async_client_lock:
+        if _async_client is None or _async_client_loop is not loop:
+            old_loop, old_closer = _async_client_loop, _async_client_closer
+            if old_closer is not None and not old_loop.is_closed():
+                # Cancelling the closer task closes the client on its own loop
+                old_loop.call_soon_threadsafe(old_closer.cancel)
+
+            _async_client = AsyncQdrantClient(
+                url=QDRANT_URL,
+                timeout=QDRANT_TIMEOUT_S,
+                pool_size=QDRANT_POOL_SIZE,
+                check_compatibility=False,
+            )
+            _async_client_loop = loop
+            # The loop keeps only weak references to tasks
+            _async_client_closer = loop.create_task(_close_async_client_on_shutdown(_async_client))
+        return _async_client
+
+
+def qdrant_collection_exists(collection_name: str) -> bool:
+    """
+    Check whether a Qdrant collection exists.
+    
+    Args:
+        collection_name: Name of the collection
+        
+    Returns:
+        True if the collection exists, False otherwise
+    """
+    return _connection_manager.run(lambda qdrant_client: qdrant_client.collection_exists(collection_name))
+
+
+EmbeddingBatch = Tuple[List[int], np.ndarray, List[TextChunk]]
+
+
+def _rebatch(embedding_batches: Iterable[EmbeddingBatch], batch_size: int) -> Iterator[EmbeddingBatch]:
+    """
+    Regroup embedding batches into batches of batch_size points (the last one may be smaller).
+    
+    Args:
+        embedding_batches: Batches of (chunk ids, float32 vectors, chunks) of any size
+        batch_size: Number of points in an output batch
+        
+    Yields:
+        Batches of (chunk ids, float32 vectors, chunks)
+    """
+    ids, vectors, chunks = [], [], []
+    size = 0
+    for batch_ids, batch_vectors, batch_chunks in embedding_batches:
+        ids.extend(batch_ids)
+        vectors.append(batch_vectors)
+        chunks.extend(batch_chunks)
+        size += len(batch_ids)
+
+        if size >= batch_size:
+            all_vectors = np.concatenate(vectors)
+            start = 0
+            while size - start >= batch_size:
+                end = start + batch_size
+                yield ids[start:end], all_vectors[start:end], chunks[start:end]
+                start = end
+            ids, vectors, chunks = ids[start:], [all_vectors[start:]], chunks[start:]
+            size -= start
+
+    if size:
+        yield ids, np.concatenate(vectors), chunks
+
+
+def _upsert_with_retries(collection_name: str, batch: EmbeddingBatch, max_retries: int, backoff_s: float) -> int:
+    """
+    Upsert one batch of points, retrying with exponential backoff and jitter on failure.
+    
+    Connection failures also invalidate the health state of the pooled client,
+    so the container is checked (and restarted if needed) before the next attempt.
+    
+    Args:
+        collection_name: Name of the collection to upload to
+        batch: Batch of (chunk ids, float32 vectors, chunks)
+        max_retries: Maximum number of retries after the first attempt
+        backoff_s: Delay before the first retry in seconds, doubled after each retry
+        
+    Returns:
+        Number of uploaded points
+        
+    Raises:
+        Exception: The last error if all attempts failed
+    """
+    ids, vectors, chunks = batch
+    points = Batch(
+        ids=ids,
+        vectors=vectors.tolist(),
+        payloads=[{"text": chunk.text, "headers": chunk.headers} for chunk in chunks]
+    )
+
+    for attempt in range(max_retries + 1):
+        try:
+            get_qdrant_client().upsert(collection_name=collection_name, wait=True, points=points)
+            return len(ids)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            if isinstance(e, QDRANT_CONNECTION_ERRORS):
+                _connection_manager.mark_unhealthy()
+            delay = min(backoff_s * 2 ** attempt, QDRANT_UPLOAD_MAX_BACKOFF_S) * random.uniform(0.5, 1.0)
+            print(f"Upsert of {len(ids)} points failed ({e}), retrying in {delay:.1f} s")
+            time.sleep(delay)
+
+
+def upload_to_qdrant(
+    collection_name: str,
+    embedding_batches: Iterable[EmbeddingBatch],
+    vector_size: int,
+    stale_ids: Optional[List[int]] = None,
+    recreate: bool = False,
+    batch_size: int = QDRANT_UPLOAD_BATCH_SIZE,
+    parallelism: int = QDRANT_UPLOAD_PARALLELISM,
+    max_retries: int = QDRANT_UPLOAD_MAX_RETRIES,
+    backoff_s: float = QDRANT_UPLOAD_BACKOFF_S,
+) -> None:
     """
     Upload embeddings and metadata to Qdrant vector database.
     
-    Ensures Qdrant is running, creates a new collection with the specified vector size,
-    and uploads all embeddings with their associated metadata as points.
+    Gets the pooled Qdrant client (starting the container if needed), creates the
+    collection with the specified vector size if it does not exist yet, upserts
+    the embedding batches with their associated metadata as points, and deletes
+    stale points.
+    
+    Points are regrouped into upsert requests of batch_size points, sent by
+    parallelism worker threads while the next embedding batches are being
+    produced, so encoding and uploading overlap. At most two requests per
+    worker are queued, which keeps memory bounded and lets a slow server slow
+    down the encoder. Failed requests are retried with exponential backoff.
     
     Args:
         collection_name: Name of the collection to create/upload to
-        embeddings_and_metadata: List of EmbeddingMetadata objects containing id, vector, and text
+        embedding_batches: Batches of (chunk ids, float32 vectors, chunks), e.g. from iter_embedding_batches()
         vector_size: Dimension of the embedding vectors
+        stale_ids: Optional ids of points to delete from the collection
+        recreate: Whether to drop an existing collection and create it from scratch
+        batch_size: Number of points in one upsert request
+        parallelism: Number of concurrent upsert requests
+        max_retries: Maximum number of retries of a failed upsert request
+        backoff_s: Delay before the first retry in seconds, doubled after each retry
     """
-    ensure_qdrant_running()
+    qdrant_client = get_qdrant_client()
 
-    # Create client
-    qdrant_client = QdrantClient(url=QDRANT_URL)
+    if recreate and qdrant_client.collection_exists(collection_name):
+        qdrant_client.delete_collection(collection_name)
 
     # Create collection 
-    qdrant_client.create_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-    )
+    if not qdrant_client.collection_exists(collection_name):
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+        )
 
-    # Upload files to Qdrant
-    operation_info = qdrant_client.upsert(
-        collection_name=collection_name,
-        wait=True,
-        points=[
-            PointStruct(id=metadata.id, 
-                       vector=metadata.vector, 
-                       payload={"text": metadata.text})
-            for metadata in tqdm(embeddings_and_metadata, desc="Uploading to Qdrant")
-        ]
-    )
+    # Upload batches to Qdrant in parallel with generating the embeddings
+    uploaded = 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="qdrant-upload") as executor:
+        pending = deque()
+        for batch in _rebatch(embedding_batches, batch_size):
+            pending.append(executor.submit(_upsert_with_retries, collection_name, batch, max_retries, backoff_s))
+            while len(pending) >= 2 * parallelism:
+                uploaded += pending.popleft().result()
+        while pending:
+            uploaded += pending.popleft().result()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Uploaded {uploaded} points to Qdrant in {elapsed:.1f} s ({uploaded / elapsed if elapsed else 0:.0f} points/s)")
+
+    # Delete points of removed or changed chunks
+    if stale_ids:
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=list(stale_ids)),
+            wait=True
+        )
 
 
 def search_answer_in_qdrant(collection_name: str, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
@@ -93,7 +409,9 @@ def search_answer_in_qdrant(collection_name: str, query_embedding: List[float],
     Search for similar vectors in Qdrant collection using cosine similarity.
     
     Performs a vector similarity search in the specified collection and returns
-    the top-k most similar documents with their scores and text content.
+    the top-k most similar documents with their scores and text content. Uses the
+    pooled client, so no container check or new connection is made per search.
+    Only point ids are fetched from Qdrant, the texts are read from the chunk store.
     
     Args:
         collection_name: Name of the collection to search in
@@ -103,24 +421,54 @@ def search_answer_in_qdrant(collection_name: str, query_embedding: List[float],
     Returns:
         List of SearchResult objects containing document id, score, and text for each result
     """
-    ensure_qdrant_running()
-
-    # Create client
-    qdrant_client = QdrantClient(url=QDRANT_URL)
+    search_result = _connection_manager.run(
+        lambda qdrant_client: qdrant_client.query_points(
+            collection_name=collection_name,
+            query=query_embedding,
+            with_payload=False,
+            limit=db_chunks_number
+        )
+    )
 
-    search_result = qdrant_client.query_points(
-        collection_name=collection_name,
-        query=query_embedding,
-        with_payload=True,
-        limit=db_chunks_number
+    return hydrate_search_results(
+        [point.id for point in search_result.points],
+        [point.score for point in search_result.points]
     )
 
-    search_results = []
-    for point in search_result.points:
-        search_results.append(SearchResult(
-            id=point.id,
-            score=float(point.score),
-            text=point.payload["text"]
-        ))
 
-    return search_results
+async def asearch_answer_in_qdrant(collection_name: str, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
+    """
+    Asynchronous version of search_answer_in_qdrant.
+    
+    Uses the pooled AsyncQdrantClient, so many searches can be in flight on one
+    event loop. On a connection failure the container check runs in a worker
+    thread (see QdrantConnectionManager) and the search is retried once.
+    
+    Args:
+        collection_name: Name of the collection to search in
+        query_embedding: Query vector to search for
+        db_chunks_number: Number of top results to return
+        
+    Returns:
+        List of SearchResult objects containing document id, score, and text for each result
+    """
+    async def query_points():
+        return await get_async_qdrant_client().query_points(
+            collection_name=collection_name,
+            query=query_embedding,
+            with_payload=False,
+            limit=db_chunks_number
+        )
+
+    try:
+        search_result = await query_points()
+    except QDRANT_CONNECTION_ERRORS as e:
+        print(f"Lost connection to Qdrant, reconnecting: {e}")
+        _connection_manager.mark_unhealthy()
+        await asyncio.to_thread(get_qdrant_client)
+        search_result = await query_points()
+
+    return hydrate_search_results(
+        [point.id for point in search_result.points],
+        [point.score for point in search_result.points]
+    )
@@ -28,6 +28,7 @@ def reciprocal_rank_fusion(qdrant_results: List[SearchResult],
             combined_scores[doc_id] = HybridSearchResult(
                 id=doc_id,
                 text=result.text,
+                headers=result.headers,
                 qdrant_score=result.score,
                 bm25_score=None,
                 combined_score=0.0
@@ -43,6 +44,7 @@ def reciprocal_rank_fusion(qdrant_results: List[SearchResult],
             combined_scores[doc_id] = HybridSearchResult(
                 id=doc_id,
                 text=result.text,
+                headers=result.headers,
                 qdrant_score=None,
                 bm25_score=result.score,
                 combined_score=0.0
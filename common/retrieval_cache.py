@@ -0,0 +1,208 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from common.constants import (
+    VECTOR_STORE_BACKEND,
+    BM25_BACKEND,
+    BM25_SHARDS,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    RETRIEVAL_CACHE_TTL_S,
+    RETRIEVAL_CACHE_PATH,
+)
+from common.index_version import read_index_version
+from common.models import RetrievedContext, CacheStats, SearchType
+
+
+RetrievalCacheKey = Tuple[str, str, int, int, Optional[int], bool, str]
+
+
+def make_retrieval_cache_key(query: str, search_type: SearchType, db_chunks_number: int, model_context_chunks_number: int, context_token_budget: Optional[int] = None, truncate_last_chunk: bool = False) -> RetrievalCacheKey:
+    """
+    Build a retrieval cache key.
+    
+    The query is case-folded and its whitespace collapsed, so trivially
+    different spellings of the same question share one entry. The key also
+    names the vector store and BM25 backends, so results persisted by a run
+    with other backends are not served after switching without re-indexing.
+    
+    Args:
+        query: User's question or query
+        search_type: Search type used for retrieval
+        db_chunks_number: Number of chunks retrieved from the database
+        model_context_chunks_number: Maximum number of chunks in the context
+        context_token_budget: Maximum number of context tokens, None for no limit
+        truncate_last_chunk: Whether the last chunk may be truncated to fit the budget
+        
+    Returns:
+        Hashable cache key
+    """
+    normalized_query = " ".join(query.casefold().split())
+    backends = f"vector={VECTOR_STORE_BACKEND},bm25={BM25_BACKEND},bm25_shards={BM25_SHARDS}"
+    return (normalized_query, search_type.value, db_chunks_number, model_context_chunks_number, context_token_budget, truncate_last_chunk, backends)
+
+
+class RetrievalCache:
+    """
+    LRU cache of retrieval results with a TTL.
+    
+    Every entry is stamped with the index version it was computed against
+    (see common/index_version.py). Entries from another version count as
+    misses, so re-running rag_pipeline.py invalidates the whole cache. The
+    cache can be persisted to a JSON file, so a restart does not start cold.
+    """
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES, ttl_s: float = RETRIEVAL_CACHE_TTL_S, persist_path: Optional[str] = None):
+        """
+        Args:
+            max_entries: Maximum number of cached results
+            ttl_s: Time after which an entry expires, in seconds
+            persist_path: Optional JSON file the cache is loaded from and saved to
+        """
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.persist_path = persist_path
+
+        # key -> (index_version, created_at, value)
+        self._entries: "OrderedDict[RetrievalCacheKey, Tuple[Optional[str], float, RetrievedContext]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        if persist_path is not None:
+            self.load()
+
+    def get(self, key: RetrievalCacheKey) -> Optional[RetrievedContext]:
+        """
+        Look up a cached retrieval result.
+        
+        Args:
+            key: Key built with make_retrieval_cache_key()
+            
+        Returns:
+            Cached RetrievedContext, or None on a miss
+        """
+        index_version = read_index_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, created_at, value = entry
+                if entry_version == index_version and time.time() - created_at < self.ttl_s:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: RetrievalCacheKey, value: RetrievedContext) -> None:
+        """
+        Store a retrieval result, evicting the least recently used entry if the cache is full.
+        
+        Args:
+            key: Key built with make_retrieval_cache_key()
+            value: Retrieved context to cache
+        """
+        index_version = read_index_version()
+        with self._lock:
+            self._entries[key] = (index_version, time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> CacheStats:
+        """
+        Get hit/miss statistics.
+        
+        Returns:
+            CacheStats object with the counters
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                entries=len(self._entries),
+                hit_rate=self._hits / lookups if lookups else None,
+            )
+
+    def save(self) -> None:
+        """Save the cache to persist_path (entries of the current index version only)."""
+        if self.persist_path is None:
+            return
+
+        index_version = read_index_version()
+        with self._lock:
+            records = [
+                {
+                    "key": list(key),
+                    "index_version": entry_version,
+                    "created_at": created_at,
+                    "value": value.model_dump(),
+                }
+                for key, (entry_version, created_at, value) in self._entries.items()
+                if entry_version == index_version
+            ]
+
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(tmp_path, self.persist_path)
+
+    def load(self) -> None:
+        """Load entries saved by save(), skipping expired and outdated ones."""
+        if self.persist_path is None or not os.path.exists(self.persist_path):
+            return
+
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to load retrieval cache from {self.persist_path}: {e}")
+            return
+
+        index_version = read_index_version()
+        now = time.time()
+        with self._lock:
+            for record in records:
+                if record["index_version"] != index_version or now - record["created_at"] >= self.ttl_s:
+                    continue
+                key = tuple(record["key"])
+                self._entries[key] = (record["index_version"], record["created_at"], RetrievedContext(**record["value"]))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_retrieval_cache: Optional[RetrievalCache] = None
+_retrieval_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """
+    Get the process-wide retrieval cache.
+    
+    If RETRIEVAL_CACHE_PATH is set, the cache is loaded from it on first use
+    and saved back when the process exits.
+    
+    Returns:
+        Shared RetrievalCache instance
+    """
+    global _retrieval_cache
+    if _retrieval_cache is not None:
+        return _retrieval_cache
+
+    with _retrieval_cache_lock:
+        if _retrieval_cache is None:
+            _retrieval_cache = RetrievalCache(persist_path=RETRIEVAL_CACHE_PATH)
+            if RETRIEVAL_CACHE_PATH is not None:
+                atexit.register(_retrieval_cache.save)
+
+    return _retrieval_cache
@@ -0,0 +1,228 @@
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Generator, Tuple, FrozenSet
+from common.constants import (
+    VECTOR_SIZE,
+    SEMANTIC_CACHE_CAPACITY,
+    SEMANTIC_CACHE_SIMILARITY_THRESHOLD,
+    SEMANTIC_CACHE_STREAM_CHUNK_WORDS,
+)
+from common.bielik_api import call_model_stream, get_ollama_client
+from common.index_version import read_index_version
+from common.models import CacheStats, GenerationStats
+
+
+# Chunk ids, system prompt hash and model name of a cached answer
+GenerationKey = Tuple[FrozenSet[int], str, str]
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers for near-duplicate questions.
+    
+    Stores (query embedding, generation key, answer) triples, where the
+    generation key identifies the retrieved chunk ids, the system prompt and
+    the model. A new query is a hit when the most similar cached query has
+    cosine similarity above the threshold and was answered with the same
+    generation key. Embeddings are
+    kept in a preallocated matrix, so a lookup is a single matrix-vector
+    product. Entries are evicted in LRU order when the capacity is reached,
+    and the whole cache is cleared when the index version changes.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_CAPACITY, similarity_threshold: float = SEMANTIC_CACHE_SIMILARITY_THRESHOLD, vector_size: int = VECTOR_SIZE):
+        """
+        Args:
+            capacity: Maximum number of cached answers
+            similarity_threshold: Minimum cosine similarity between queries for a hit
+            vector_size: Dimension of query embeddings
+        """
+        self.capacity = capacity
+        self.similarity_threshold = similarity_threshold
+
+        self._vectors = np.zeros((capacity, vector_size), dtype=np.float32)
+        self._occupied = np.zeros(capacity, dtype=bool)
+        # slot -> (generation key, answer), in LRU order
+        self._entries: "OrderedDict[int, Tuple[GenerationKey, str]]" = OrderedDict()
+        self._index_version = read_index_version()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @staticmethod
+    def _generation_key(chunk_ids: List[int], system_prompt: str, model: str) -> "GenerationKey":
+        """Identify what an answer was generated from, apart from the question."""
+        return frozenset(chunk_ids), hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(), model
+
+    def _check_index_version(self) -> None:
+        """Drop all entries if the indexes were rebuilt. Must be called with the lock held."""
+        index_version = read_index_version()
+        if index_version != self._index_version:
+            self._entries.clear()
+            self._occupied[:] = False
+            self._index_version = index_version
+
+    def lookup(self, query_embedding: List[float], chunk_ids: List[int], system_prompt: str, model: str) -> Optional[str]:
+        """
+        Find a cached answer for a similar query answered from the same chunks, system prompt and model.
+        
+        Args:
+            query_embedding: Embedding of the new query
+            chunk_ids: Ids of the chunks retrieved for the new query
+            system_prompt: System prompt of the new query, with the retrieved context
+            model: Name of the model answering the new query
+            
+        Returns:
+            Cached answer, or None on a miss
+        """
+        vector = self._normalize(query_embedding)
+        generation_key = self._generation_key(chunk_ids, system_prompt, model)
+
+        with self._lock:
+            self._check_index_version()
+
+            slots = np.flatnonzero(self._occupied)
+            if len(slots):
+                similarities = self._vectors[slots] @ vector
+                # Check candidates from the most similar down to the threshold
+                for position in np.argsort(-similarities):
+                    if similarities[position] < self.similarity_threshold:
+                        break
+                    slot = int(slots[position])
+                    entry_generation_key, answer = self._entries[slot]
+                    if entry_generation_key == generation_key:
+                        self._entries.move_to_end(slot)
+                        self._hits += 1
+                        return answer
+
+            self._misses += 1
+            return None
+
+    def store(self, query_embedding: List[float], chunk_ids: List[int], system_prompt: str, model: str, answer: str) -> None:
+        """
+        Cache an answer, evicting the least recently used one if the cache is full.
+        
+        Args:
+            query_embedding: Embedding of the query
+            chunk_ids: Ids of the chunks the answer was generated from
+            system_prompt: System prompt the answer was generated with
+            model: Name of the model that generated the answer
+            answer: Generated answer
+        """
+        vector = self._normalize(query_embedding)
+
+        with self._lock:
+            self._check_index_version()
+
+            if len(self._entries) >= self.capacity:
+                slot, _ = self._entries.popitem(last=False)
+            else:
+                slot = int(np.flatnonzero(~self._occupied)[0])
+
+            self._vectors[slot] = vector
+            self._occupied[slot] = True
+            self._entries[slot] = (self._generation_key(chunk_ids, system_prompt, model), answer)
+
+    def get_stats(self) -> CacheStats:
+        """
+        Get hit/miss statistics.
+        
+        Returns:
+            CacheStats object with the counters
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                entries=len(self._entries),
+                hit_rate=self._hits / lookups if lookups else None,
+            )
+
+
+_semantic_cache: Optional[SemanticAnswerCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """
+    Get the process-wide semantic answer cache.
+    
+    Returns:
+        Shared SemanticAnswerCache instance
+    """
+    global _semantic_cache
+    if _semantic_cache is not None:
+        return _semantic_cache
+
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticAnswerCache()
+
+    return _semantic_cache
+
+
+def stream_cached_answer(answer: str, chunk_words: int = SEMANTIC_CACHE_STREAM_CHUNK_WORDS) -> Generator[str, None, None]:
+    """
+    Stream a cached answer in small pieces, like a model response.
+    
+    Args:
+        answer: Cached answer
+        chunk_words: Number of words per yielded piece
+        
+    Yields:
+        Consecutive pieces of the answer, including the original whitespace
+    """
+    words = answer.split(" ")
+    for i in range(0, len(words), chunk_words):
+        piece = " ".join(words[i:i + chunk_words])
+        yield piece if i + chunk_words >= len(words) else piece + " "
+
+
+def call_model_stream_cached(system_prompt: str, user_prompt: str, chunk_ids: List[int]) -> Generator[str, None, None]:
+    """
+    Stream an answer, reusing a cached one for near-duplicate questions.
+    
+    On a semantic cache hit the cached answer is streamed from memory. On a
+    miss the Bielik model is called and its answer is cached once the stream
+    finishes with the final response, so errors and answers cut off mid-stream
+    are never cached.
+    
+    Args:
+        system_prompt: System prompt with the retrieved context
+        user_prompt: User's input/question
+        chunk_ids: Ids of the chunks in the context
+        
+    Yields:
+        Response chunks as strings
+    """
+    from common.embeddings import generate_query_embedding
+
+    semantic_cache = get_semantic_cache()
+    model = get_ollama_client().model
+    # Retrieval has usually just embedded the same query, so this is a lookup in the
+    # query embedding cache; the query is encoded only after a retrieval cache hit
+    query_embedding = generate_query_embedding(user_prompt)
+
+    cached_answer = semantic_cache.lookup(query_embedding, chunk_ids, system_prompt, model)
+    if cached_answer is not None:
+        yield from stream_cached_answer(cached_answer)
+        return
+
+    # Stats are reported only for calls that received the final response
+    completed: List[GenerationStats] = []
+    answer_chunks = []
+    for chunk in call_model_stream(system_prompt, user_prompt, stats_callback=completed.append):
+        answer_chunks.append(chunk)
+        yield chunk
+
+    if completed and completed[-1].output_tokens is not None:
+        semantic_cache.store(query_embedding, chunk_ids, system_prompt, model, "".join(answer_chunks))
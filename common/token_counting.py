@@ -0,0 +1,79 @@
+import math
+import threading
+from typing import Optional
+from common.constants import (
+    CONTEXT_TOKEN_COUNTER,
+    GENERATOR_TOKENIZER_NAME,
+    APPROX_CHARS_PER_TOKEN,
+)
+
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_generator_tokenizer():
+    """
+    Get the tokenizer of the generator model, loading it on first use.
+    
+    Returns:
+        Hugging Face tokenizer of GENERATOR_TOKENIZER_NAME
+    """
+    global _tokenizer
+    if _tokenizer is not None:
+        return _tokenizer
+
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            from transformers import AutoTokenizer
+
+            _tokenizer = AutoTokenizer.from_pretrained(GENERATOR_TOKENIZER_NAME)
+
+    return _tokenizer
+
+
+def count_tokens(text: str, counter: str = CONTEXT_TOKEN_COUNTER) -> int:
+    """
+    Count tokens of a text as seen by the generator model.
+    
+    Args:
+        text: Text to count tokens of
+        counter: "tokenizer" to use the generator's tokenizer, "approximate"
+            to estimate from the text length (fast, no model files needed)
+        
+    Returns:
+        Number of tokens
+    """
+    if counter == "tokenizer":
+        return len(get_generator_tokenizer().encode(text, add_special_tokens=False))
+
+    return math.ceil(len(text) / APPROX_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, counter: str = CONTEXT_TOKEN_COUNTER) -> Optional[str]:
+    """
+    Truncate a text to at most max_tokens tokens.
+    
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+        counter: Token counter, see count_tokens()
+        
+    Returns:
+        Truncated text, or None if nothing fits
+    """
+    if max_tokens <= 0:
+        return None
+
+    if counter == "tokenizer":
+        tokenizer = get_generator_tokenizer()
+        token_ids = tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+        truncated = tokenizer.decode(token_ids)
+    else:
+        truncated = text[:int(max_tokens * APPROX_CHARS_PER_TOKEN)]
+        # Do not cut words in half
+        if len(truncated) < len(text) and " " in truncated:
+            truncated = truncated.rsplit(" ", 1)[0]
+
+    truncated = truncated.strip()
+    return truncated or None
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+from common.constants import (
+    VECTOR_STORE_BACKEND,
+    QDRANT_COLLECTION_NAME,
+    LOCAL_VECTOR_STORE_PATH,
+    LOCAL_VECTOR_SEARCH_BLOCK_SIZE,
+    CHUNK_STORE_PATH,
+)
+from common.chunk_store import hydrate_search_results
+from common.models import SearchResult, TextChunk
+
+
+EmbeddingBatch = Tuple[List[int], np.ndarray, List[TextChunk]]
+
+# Index file of a local vector store directory
+LOCAL_VECTOR_STORE_INDEX_FILE = "index.json"
+
+
+class VectorStore(ABC):
+    """
+    Vector database of chunk embeddings searched by cosine similarity.
+    
+    Stores only chunk ids and vectors, search results are hydrated with the
+    texts and headers from the chunk store.
+    """
+
+    # Name identifying the collection in the index manifest
+    name: str
+
+    @abstractmethod
+    def exists(self) -> bool:
+        """
+        Check whether the collection exists.
+        
+        Returns:
+            True if the collection exists, False otherwise
+        """
+
+    @abstractmethod
+    def upsert(self, embedding_batches: Iterable[EmbeddingBatch], vector_size: int, stale_ids: Optional[List[int]] = None, recreate: bool = False) -> None:
+        """
+        Insert or replace vectors and delete stale ones.
+        
+        Args:
+            embedding_batches: Batches of (chunk ids, float32 vectors, chunks), e.g. from iter_embedding_batches()
+            vector_size: Dimension of the embedding vectors
+            stale_ids: Optional ids of vectors to delete
+            recreate: Whether to drop the existing collection and create it from scratch
+        """
+
+    @abstractmethod
+    def search(self, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
+        """
+        Find the chunks most similar to a query.
+        
+        Args:
+            query_embedding: Query vector to search for
+            db_chunks_number: Number of top results to return
+        
+        Returns:
+            List of SearchResult objects containing document id, score, and text for each result
+        """
+
+    def search_batch(self, query_embeddings: List[List[float]], db_chunks_number: int) -> List[List[SearchResult]]:
+        """
+        Find the chunks most similar to each of many queries.
+        
+        Args:
+            query_embeddings: Query vectors to search for
+            db_chunks_number: Number of top results to return per query
+        
+        Returns:
+            List of search results of every query
+        """
+        return [self.search(query_embedding, db_chunks_number) for query_embedding in query_embeddings]
+
+    async def asearch(self, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
+        """
+        Asynchronous version of search, running it in a worker thread.
+        
+        Args:
+            query_embedding: Query vector to search for
+            db_chunks_number: Number of top results to return
+        
+        Returns:
+            List of SearchResult objects containing document id, score, and text for each result
+        """
+        return await asyncio.to_thread(self.search, query_embedding, db_chunks_number)
+
+
+class QdrantVectorStore(VectorStore):
+    """Collection of the Qdrant server, see common/qdrant_api.py."""
+
+    def __init__(self, collection_name: str = QDRANT_COLLECTION_NAME):
+        """
+        Args:
+            collection_name: Name of the Qdrant collection
+        """
+        self.name = collection_name
+
+    def exists(self) -> bool:
+        """Check whether the Qdrant collection exists."""
+        from common.qdrant_api import qdrant_collection_exists
+
+        return qdrant_collection_exists(self.name)
+
+    def upsert(self, embedding_batches: Iterable[EmbeddingBatch], vector_size: int, stale_ids: Optional[List[int]] = None, recreate: bool = False) -> None:
+        """Upload the vectors with upload_to_qdrant()."""
+        from common.qdrant_api import upload_to_qdrant
+
+        upload_to_qdrant(
+            collection_name=self.name,
+            embedding_batches=embedding_batches,
+            vector_size=vector_size,
+            stale_ids=stale_ids,
+            recreate=recreate,
+        )
+
+    def search(self, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
+        """Search the collection with search_answer_in_qdrant()."""
+        from common.qdrant_api import search_answer_in_qdrant
+
+        return search_answer_in_qdrant(self.name, query_embedding, db_chunks_number)
+
+    async def asearch(self, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
+        """Search the collection with the asynchronous Qdrant client."""
+        from common.qdrant_api import asearch_answer_in_qdrant
+
+        return await asearch_answer_in_qdrant(self.name, query_embedding, db_chunks_number)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale float32 vectors to unit length, so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def cosine_top_k(queries: np.ndarray, vectors: np.ndarray, k: int, block_size: int = LOCAL_VECTOR_SEARCH_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the k most similar vectors of every query by exhaustive search.
+    
+    Vectors are scored block by block with one matrix product per block, and
+    only the k best rows of every query are kept between blocks, so memory
+    stays bounded for any number of vectors.
+    
+    Args:
+        queries: float32 array of shape (num_queries, dim), normalized
+        vectors: float32 array of shape (num_vectors, dim), normalized (may be memory-mapped)
+        k: Number of results per query
+        block_size: Number of vectors scored at once
+    
+    Returns:
+        Tuple of (row indices, cosine similarities), both of shape (num_queries, min(k, num_vectors)), best first
+    """
+    k = max(0, min(k, len(vectors)))
+    if k == 0:
+        return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+    for start in range(0, len(vectors), block_size):
+        block_scores = queries @ np.asarray(vectors[start:start + block_size]).T
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + block_scores.shape[1]), block_scores.shape)], axis=1)
+        scores = np.concatenate([best_scores, block_scores], axis=1)
+        if scores.shape[1] > k:
+            kept = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            rows = np.take_along_axis(rows, kept, axis=1)
+            scores = np.take_along_axis(scores, kept, axis=1)
+        best_rows, best_scores = rows, scores
+
+    # Best first, ties broken by row
+    order = np.lexsort((best_rows, -best_scores), axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store of memory-mapped NumPy arrays.
+    
+    Vectors are normalized and stored as float32 rows of a .npy file, with the
+    chunk id of every row in a second .npy file. Searches compute cosine
+    similarities with a brute-force matrix product, which needs no server or
+    network round trip and is exact. Every upsert writes a new generation of
+    both files and then replaces the index file, so searchers never see a
+    half-written store, and reload it when the index file changes.
+    """
+
+    def __init__(self, store_dir: str = LOCAL_VECTOR_STORE_PATH, chunk_store_path: str = CHUNK_STORE_PATH):
+        """
+        Args:
+            store_dir: Directory of the vector store
+            chunk_store_path: Directory of the chunk store with the chunk texts
+        """
+        self.name = f"local:{store_dir}"
+        self.store_dir = store_dir
+        self.chunk_store_path = chunk_store_path
+        self._loaded: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _index_path(self) -> str:
+        """Path of the index file naming the current generation."""
+        return os.path.join(self.store_dir, LOCAL_VECTOR_STORE_INDEX_FILE)
+
+    def _arrays_paths(self, generation: int) -> Tuple[str, str]:
+        """Paths of the ids and vectors files of a generation."""
+        return (
+            os.path.join(self.store_dir, f"ids.{generation}.npy"),
+            os.path.join(self.store_dir, f"vectors.{generation}.npy"),
+        )
+
+    def _read_index(self) -> Optional[dict]:
+        """Read the index file, None if there is no store."""
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def exists(self) -> bool:
+        """Check whether the store has been written."""
+        return os.path.exists(self._index_path())
+
+    def load(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-map the current generation, reloading it if the store changed on disk.
+        
+        Returns:
+            Tuple of (chunk ids, normalized float32 vectors)
+        
+        Raises:
+            FileNotFoundError: If the store does not exist
+        """
+        try:
+            stat = os.stat(self._index_path())
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Local vector store not found: {self.store_dir}")
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        if signature == self._signature:
+            return self._loaded
+
+        with self._lock:
+            if signature != self._signature:
+                index = self._read_index()
+                ids_path, vectors_path = self._arrays_paths(index["generation"])
+                self._loaded = (np.load(ids_path, mmap_mode="r"), np.load(vectors_path, mmap_mode="r"))
+                self._signature = signature
+                print(f"Loaded {len(self._loaded[0])} vectors from {self.store_dir}")
+            return self._loaded
+
+    def upsert(self, embedding_batches: Iterable[EmbeddingBatch], vector_size: int, stale_ids: Optional[List[int]] = None, recreate: bool = False) -> None:
+        """
+        Write a new generation with the upserted vectors added and the replaced and stale ones dropped.
+        
+        The generation is written incrementally, so memory stays bounded for any
+        number of vectors: incoming batches are appended to a spool file as they
+        arrive, then the kept rows of the previous generation and the spooled
+        rows are copied block by block into the preallocated vectors file.
+        """
+        current_index = self._read_index()
+        index = None if recreate else current_index
+        if index is not None and index["vector_size"] == vector_size:
+            ids_path, vectors_path = self._arrays_paths(index["generation"])
+            ids, vectors = np.load(ids_path, mmap_mode="r"), np.load(vectors_path, mmap_mode="r")
+        else:
+            ids, vectors = np.empty(0, dtype=np.int64), np.empty((0, vector_size), dtype=np.float32)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        # A recreated store also gets a new generation, searchers may have mapped the current one
+        generation = current_index["generation"] + 1 if current_index is not None else 0
+        new_ids_path, new_vectors_path = self._arrays_paths(generation)
+        spool_path = f"{new_vectors_path}.spool"
+
+        new_ids = []
+        with open(spool_path, "wb") as spool:
+            for batch_ids, batch_vectors, _ in embedding_batches:
+                new_ids.extend(batch_ids)
+                spool.write(_normalize(batch_vectors).tobytes())
+        new_ids = np.asarray(new_ids, dtype=np.int64)
+
+        # Replaced and stale rows are dropped, new rows are appended
+        kept = ~np.isin(ids, np.concatenate([new_ids, np.asarray(stale_ids or [], dtype=np.int64)]))
+        kept_rows = np.flatnonzero(kept)
+        np.save(new_ids_path, np.concatenate([ids[kept_rows], new_ids]))
+
+        new_vectors = np.lib.format.open_memmap(new_vectors_path, mode="w+", dtype=np.float32, shape=(len(kept_rows) + len(new_ids), vector_size))
+        block_size = LOCAL_VECTOR_SEARCH_BLOCK_SIZE
+        for start in range(0, len(kept_rows), block_size):
+            block_rows = kept_rows[start:start + block_size]
+            new_vectors[start:start + len(block_rows)] = vectors[block_rows]
+        if len(new_ids):
+            spooled = np.memmap(spool_path, dtype=np.float32, mode="r", shape=(len(new_ids), vector_size))
+            for start in range(0, len(new_ids), block_size):
+                block = spooled[start:start + block_size]
+                new_vectors[len(kept_rows) + start:len(kept_rows) + start + len(block)] = block
+            del spooled
+        new_vectors.flush()
+        del new_vectors
+        os.remove(spool_path)
+
+        tmp_path = f"{self._index_path()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "vector_size": vector_size, "num_vectors": len(kept_rows) + len(new_ids)}, f)
+        os.replace(tmp_path, self._index_path())
+
+        # Remove files of older generations, searchers that mapped them keep them open
+        for file in os.listdir(self.store_dir):
+            if file.endswith((".npy", ".spool")) and os.path.join(self.store_dir, file) not in (new_ids_path, new_vectors_path):
+                os.remove(os.path.join(self.store_dir, file))
+
+        print(f"Saved {len(kept_rows) + len(new_ids)} vectors to {self.store_dir} ({len(new_ids)} upserted, {len(ids) - len(kept_rows)} replaced or deleted)")
+
+    def search_batch(self, query_embeddings: List[List[float]], db_chunks_number: int) -> List[List[SearchResult]]:
+        """Score all queries against all vectors at once with cosine_top_k()."""
+        ids, vectors = self.load()
+        rows, scores = cosine_top_k(_normalize(np.asarray(query_embeddings, dtype=np.float32)), vectors, db_chunks_number)
+        return [
+            hydrate_search_results(ids[query_rows].tolist(), query_scores.tolist(), self.chunk_store_path)
+            for query_rows, query_scores in zip(rows, scores)
+        ]
+
+    def search(self, query_embedding: List[float], db_chunks_number: int) -> List[SearchResult]:
+        """Search for one query with search_batch()."""
+        return self.search_batch([query_embedding], db_chunks_number)[0]
+
+
+# Process-wide vector stores by backend
+_vector_stores: Dict[str, VectorStore] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def get_vector_store(backend: str = VECTOR_STORE_BACKEND) -> VectorStore:
+    """
+    Get the process-wide vector store of a backend.
+    
+    Args:
+        backend: "qdrant" for the Qdrant server or "local" for the in-process NumPy store
+    
+    Returns:
+        VectorStore of the backend
+    
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    with _vector_stores_lock:
+        vector_store = _vector_stores.get(backend)
+        if vector_store is None:
+            if backend == "qdrant":
+                vector_store = QdrantVectorStore()
+            elif backend == "local":
+                vector_store = LocalVectorStore()
+            else:
+                raise ValueError(f"Unknown vector store backend: {backend}")
+            _vector_stores[backend] = vector_store
+    return vector_store
@@ -1,22 +1,45 @@
 import zipfile
+from functools import partial
 from pathlib import Path
 import os
 import re
 
-from common.constants import QDRANT_COLLECTION_NAME, VECTOR_SIZE, BM25_ENCODINGS_DB_PATH
+from common.constants import (
+    VECTOR_SIZE,
+    BM25_ENCODINGS_DB_PATH,
+    CHUNK_STORE_PATH,
+    INDEX_MANIFEST_PATH,
+    EMBEDDING_MODEL_NAME,
+    CHUNK_MIN_TOKENS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    PIPELINE_STREAMING,
+    PIPELINE_KEEP_INTERMEDIATE,
+    PREPROCESS_WORKERS,
+    PREPROCESS_CHUNKSIZE,
+    BM25_SHARDS,
+)
 from common.file_utils import (
     unzip_docs,
     preprocess_files,
     clean_and_unify_text,
     split_into_chunks,
-    create_chunk_files,
+    create_chunk_store,
+    iter_documents,
+    iter_document_chunks,
+    write_chunk_store,
 )
-from common.embeddings import generate_embeddings_and_metadata
-from common.qdrant_api import upload_to_qdrant
+from common.embeddings import iter_embedding_batches
+from common.vector_store import get_vector_store
 from common.bm25_encoding import generate_bm25_encodings
+from common.bm25_segments import start_bm25_merge
+from common.bm25_shards import bm25_shard_paths
+from common.index_version import write_index_version
+from common.index_manifest import load_index_manifest, save_index_manifest, plan_reindex
+from common.models import FileProcessingConfig, IndexManifest
 
 
-def main() -> None:
+def main(streaming: bool = PIPELINE_STREAMING, keep_intermediate: bool = PIPELINE_KEEP_INTERMEDIATE, bm25_shards: int = BM25_SHARDS) -> None:
     """
     Main pipeline for setting up the RAG system.
 
@@ -25,68 +48,142 @@ def main() -> None:
     2. Extracts documents from zip file
     3. Cleans and preprocesses text files
     4. Splits documents into logical chunks
-    5. Creates individual chunk files for embedding
-    6. Generates embeddings using SentenceTransformer
-    7. Uploads embeddings to Qdrant vector database
-    8. Creates BM25 encodings for text-based search
+    5. Writes all chunks to a single-file chunk store
+    6. Updates BM25 encodings for text-based search and merges BM25 segments in the background
+    7. Compares the chunk store with the manifest of indexed chunks
+    8. Generates embeddings of new or changed chunks using SentenceTransformer
+    9. Upserts them to the vector store (Qdrant or the local NumPy store) and deletes stale points
+    10. Stamps the indexes with a new version, invalidating retrieval caches
+
+    In streaming mode steps 2-5 run as one pass: documents are read straight
+    from the zip file, cleaned and chunked one at a time and appended to the
+    chunk store, without writing intermediate files (unless keep_intermediate
+    is set). Otherwise every step saves its results to its own directory.
+
+    Chunk ids are derived from chunk content hashes and the indexed hashes are
+    kept in a manifest, so re-running the pipeline after editing a document
+    only embeds, uploads and BM25-encodes the chunks that changed.
 
     This function sets up the complete infrastructure needed for the RAG system
     to function, including both vector and keyword-based retrieval capabilities.
+
+    Args:
+        streaming: Whether to stream documents from the zip file to the chunk store
+        keep_intermediate: Whether to also save cleaned and chunked documents in streaming mode
+        bm25_shards: Number of shards of the BM25 index, scored in parallel at query time
+            (changing it rebuilds the index)
     """
     # 0 Create directories
     docs_zip_path = Path("docs_zip/Pliki_do_zadania_rekrutacyjnego.zip")
     docs_dir = Path("docs/")
-    docs_dir.mkdir(exist_ok=True)
     docs_preprocessed_dir = Path("docs_preprocessed/")
-    docs_preprocessed_dir.mkdir(exist_ok=True)
     docs_cleaned_up_dir = docs_preprocessed_dir / Path("docs_cleaned_up/")
-    docs_cleaned_up_dir.mkdir(exist_ok=True)
     docs_divided_into_chunks_dir = docs_preprocessed_dir / Path(
         "docs_divided_into_chunks/"
     )
-    docs_divided_into_chunks_dir.mkdir(exist_ok=True)
-    text_chunks_dir = Path("text_chunks/")
-    text_chunks_dir.mkdir(exist_ok=True)
-
-    # 1 Unzip docs files
-    unzip_docs(docs_zip_path, docs_dir)
-
-    # 2 Clean up and unify structure of docs files
-    preprocess_files(
-        input_dir=docs_dir,
-        output_dir=docs_cleaned_up_dir,
-        preprocess_func=clean_and_unify_text,
-    )
+    if not streaming or keep_intermediate:
+        for directory in (docs_preprocessed_dir, docs_cleaned_up_dir, docs_divided_into_chunks_dir):
+            directory.mkdir(exist_ok=True)
 
-    # 3 Divide docs files into chunks
-    preprocess_files(
+    chunking_config = FileProcessingConfig(
         input_dir=docs_cleaned_up_dir,
         output_dir=docs_divided_into_chunks_dir,
-        preprocess_func=split_into_chunks,
+        chunk_size=CHUNK_MAX_TOKENS,
+        min_chunk_size=CHUNK_MIN_TOKENS,
+        overlap=CHUNK_OVERLAP_TOKENS,
     )
 
-    # 4 Create chunk files for embedding
-    create_chunk_files(
-        input_dir=docs_divided_into_chunks_dir, output_dir=text_chunks_dir
-    )
+    if streaming:
+        # 1-4 Stream docs from the zip file through cleaning and chunking into the chunk store
+        chunks = iter_document_chunks(
+            iter_documents(docs_zip_path),
+            config=chunking_config,
+            cleaned_dir=docs_cleaned_up_dir if keep_intermediate else None,
+            chunks_dir=docs_divided_into_chunks_dir if keep_intermediate else None,
+            workers=PREPROCESS_WORKERS,
+            chunksize=PREPROCESS_CHUNKSIZE,
+        )
+        write_chunk_store(chunks, store_path=CHUNK_STORE_PATH)
+    else:
+        docs_dir.mkdir(exist_ok=True)
+
+        # 1 Unzip docs files
+        unzip_docs(docs_zip_path, docs_dir)
+
+        # 2 Clean up and unify structure of docs files
+        preprocess_files(
+            input_dir=docs_dir,
+            output_dir=docs_cleaned_up_dir,
+            preprocess_func=clean_and_unify_text,
+            workers=PREPROCESS_WORKERS,
+            chunksize=PREPROCESS_CHUNKSIZE,
+        )
+
+        # 3 Divide docs files into size-bounded chunks
+        preprocess_files(
+            input_dir=chunking_config.input_dir,
+            output_dir=chunking_config.output_dir,
+            preprocess_func=partial(split_into_chunks, config=chunking_config),
+            workers=PREPROCESS_WORKERS,
+            chunksize=PREPROCESS_CHUNKSIZE,
+        )
 
-    # 5 Create embeddings using SentenceTransformer
-    embeddings_and_metadata = generate_embeddings_and_metadata(
-        input_dir=text_chunks_dir
+        # 4 Create the chunk store for embedding and encoding
+        create_chunk_store(
+            input_dir=docs_divided_into_chunks_dir, store_path=CHUNK_STORE_PATH
+        )
+
+    # 5 Update BM25 encodings, merging segments while the embeddings are computed
+    generate_bm25_encodings(
+        chunk_store_path=CHUNK_STORE_PATH, encodings_db_path=BM25_ENCODINGS_DB_PATH, num_shards=bm25_shards
     )
+    bm25_merge = start_bm25_merge(*bm25_shard_paths(BM25_ENCODINGS_DB_PATH))
 
-    # 6 Upload content to Qdrant
-    upload_to_qdrant(
-        collection_name=QDRANT_COLLECTION_NAME,
-        embeddings_and_metadata=embeddings_and_metadata,
+    # 6 Compare the chunk store with the manifest of indexed chunks
+    vector_store = get_vector_store()
+    manifest = load_index_manifest(INDEX_MANIFEST_PATH)
+    if manifest is not None and not vector_store.exists():
+        manifest = None
+    reindex_plan = plan_reindex(
+        chunk_store_path=CHUNK_STORE_PATH,
+        manifest=manifest,
+        collection_name=vector_store.name,
+        embedding_model=EMBEDDING_MODEL_NAME,
         vector_size=VECTOR_SIZE,
     )
-
-    # 7 Create BM25 encodings
-    generate_bm25_encodings(
-        input_dir=text_chunks_dir, encodings_db_path=BM25_ENCODINGS_DB_PATH
+    print(
+        f"Re-indexing: {len(reindex_plan.new_chunk_ids)} new or changed chunks, "
+        f"{len(reindex_plan.stale_chunk_ids)} stale chunks, full rebuild: {reindex_plan.full_rebuild}"
     )
 
+    if reindex_plan.full_rebuild or reindex_plan.new_chunk_ids or reindex_plan.stale_chunk_ids:
+        # 7 Stream embeddings of new or changed chunks using SentenceTransformer
+        embedding_batches = iter_embedding_batches(
+            chunk_store_path=CHUNK_STORE_PATH, chunk_ids=reindex_plan.new_chunk_ids
+        )
+
+        # 8 Upsert content to the vector store batch by batch and delete stale points
+        vector_store.upsert(
+            embedding_batches=embedding_batches,
+            vector_size=VECTOR_SIZE,
+            stale_ids=reindex_plan.stale_chunk_ids,
+            recreate=reindex_plan.full_rebuild,
+        )
+
+        save_index_manifest(
+            IndexManifest(
+                collection_name=vector_store.name,
+                embedding_model=EMBEDDING_MODEL_NAME,
+                vector_size=VECTOR_SIZE,
+                chunk_hashes=reindex_plan.chunk_hashes,
+            ),
+            INDEX_MANIFEST_PATH,
+        )
+
+    # 9 Wait for the BM25 merge and stamp the indexes with a new version
+    bm25_merge.join()
+    write_index_version()
+
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,10 @@
 import streamlit as st
 import json
 from common.bielik_api import call_model_stream, call_model_non_stream
-from common.prompt_generation import create_prompt
+from common.prompt_generation import create_prompt_and_context
+from common.semantic_cache import call_model_stream_cached
+from common.constants import SEMANTIC_CACHE_ENABLED, CONTEXT_TOKEN_BUDGET
+from common.embeddings import warm_up_query_encoder
 from common.models import SearchType
 
 
@@ -21,6 +24,9 @@ with open("common/prompts/clarifying_questions_system_prompt.txt", "r") as f:
 with open("common/prompts/structured_output.json", "r") as f:
     structured_output = json.load(f)
 
+# Load the query embedding model once per process (no-op on Streamlit reruns)
+warm_up_query_encoder()
+
 
 # # RAG Project - Interactive Chat Interface
 # 
@@ -104,11 +110,20 @@ with st.sidebar:
             step=1,
             help=f"Wybierz liczbę chunków przekazywanych do modelu (1-{min(50, db_chunks_number)})"
         )
+        context_token_budget = st.number_input(
+            "Budżet tokenów kontekstu",
+            min_value=0,
+            max_value=32000,
+            value=CONTEXT_TOKEN_BUDGET or 0,
+            step=256,
+            help="Maksymalna liczba tokenów kontekstu przekazywanego do modelu (0 = bez limitu). Chunki są dobierane od najlepiej dopasowanych, aż do wyczerpania budżetu."
+        )
     else:
         # Disable settings in normal chat mode
         st.info("Ustawienia są dostępne tylko w trybie RAG")
         db_chunks_number = 20  # Default values
         model_context_chunks_number = 10  # Default values
+        context_token_budget = 0  # Default value
         use_query_expansion = False  # Default value
         use_clarifying_questions = False  # Default value
         search_type_option = "Hybrydowe"  # Default value
@@ -229,12 +244,14 @@ if user_prompt := st.chat_input("Zadaj pytanie:"):
 
                 # Now search using the (potentially expanded) query
                 message_placeholder.markdown("📚 Wyszukuję w bazie danych...")
-                system_prompt = create_prompt(
+                system_prompt, retrieved_context = create_prompt_and_context(
                     system_prompt=rag_system_prompt,
                     user_prompt=search_query,
                     db_chunks_number=db_chunks_number,
                     model_context_chunks_number=model_context_chunks_number,
                     search_type=selected_search_type,
+                    context_token_budget=context_token_budget or None,
+                    truncate_last_chunk=bool(context_token_budget),
                 )
 
                 # Debug output (can be removed in production)
@@ -245,10 +262,17 @@ if user_prompt := st.chat_input("Zadaj pytanie:"):
                 print("----------------------------------------------------------------")
                 print(f"Search query:\n\n{search_query}")
                 print("----------------------------------------------------------------")
+                print(f"Context tokens used: {retrieved_context.tokens_used}")
+                print("----------------------------------------------------------------")
 
                 # Stream response chunks and display them in real-time
+                # (answers to near-duplicate questions come from the semantic cache)
                 message_placeholder.markdown("🤖 Generuję odpowiedź...")
-                for chunk in call_model_stream(system_prompt, search_query):
+                if SEMANTIC_CACHE_ENABLED:
+                    response_stream = call_model_stream_cached(system_prompt, search_query, retrieved_context.chunk_ids)
+                else:
+                    response_stream = call_model_stream(system_prompt, search_query)
+                for chunk in response_stream:
                     if chunk:
                         full_response += chunk
                         message_placeholder.markdown(full_response + "▌")
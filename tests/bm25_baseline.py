@@ -0,0 +1,38 @@
+import numpy as np
+
+from common.bm25_engine import BM25Index, bm25_idf, tokenize
+from common.chunk_store import get_chunk_store
+from common.file_utils import chunk_index_text
+from common.models import TextChunk
+
+
+QUERIES = ["model językowy", "licencja otwarta model", "okno kontekstu tokenów", "nieznanesłowo", "dane"]
+
+
+def synthetic_chunks(num_chunks, seed):
+    """Chunks of random words from a small vocabulary, so query terms match many chunks."""
+    rng = np.random.default_rng(seed)
+    vocab = "model językowy licencja otwarta okno kontekstu tokenów dane trening wersja parametry polski tekst zbiór".split()
+    vocab += [f"słowo{i}" for i in range(200)]
+    return [
+        TextChunk(headers=[f"Sekcja {i % 7}"], text=" ".join(rng.choice(vocab, size=rng.integers(5, 60))) + f" chunk{seed}x{i}")
+        for i in range(num_chunks)
+    ]
+
+
+def assert_matches_single_index(index, chunk_store_path, ks=(1, 10, 50)):
+    """Check that an index scores like one BM25Index built from all chunks of the store."""
+    store = get_chunk_store(chunk_store_path)
+    baseline = BM25Index.build((chunk_id, tokenize(chunk_index_text(chunk))) for chunk_id, chunk in store.iter_chunks())
+    assert index.num_docs == baseline.num_docs == len(store)
+
+    for query in QUERIES:
+        term_ids = baseline.term_ids(tokenize(query))
+        idf = bm25_idf(baseline.document_frequencies(term_ids), baseline.num_docs)
+        baseline_scores = dict(zip(baseline.chunk_ids.tolist(), baseline.score(term_ids, idf, baseline.avgdl).tolist()))
+        for k in ks:
+            chunk_ids, scores = index.search(query, k)
+            _, expected_scores = baseline.search(query, k)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+            # Tied chunks may come in another order, but every chunk must have its baseline score
+            np.testing.assert_allclose([baseline_scores[chunk_id] for chunk_id in chunk_ids.tolist()], scores, rtol=1e-5)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Add the parent directory to Python path so the tests can import from common/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
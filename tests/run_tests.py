@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from common.prompt_generation import create_prompt
 from common.bielik_api import call_model_non_stream
+from common.embeddings import warm_up_query_encoder
 from common.models import TestCase, TestResult, KeywordScores
 
 
@@ -156,6 +157,9 @@ def run_tests() -> None:
     test_results_dir = Path("tests/test_results/")
     test_results_dir.mkdir(exist_ok=True)
 
+    # Load the query embedding model up front, so it does not skew answer generation times
+    warm_up_query_encoder()
+
     for test_case in tqdm(test_cases, desc="Running tests"):
         with open(test_cases_dir + "/" + test_case, "r") as f:
             test_case_content = json.load(f)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import common.bm25_engine as bm25_engine
+from common.bm25_engine import BM25Index, bm25_idf, tokenize, top_k
+
+
+def synthetic_corpus(num_docs, vocab_size, seed):
+    """Documents with Zipf-distributed terms, so postings lengths vary like in real text."""
+    rng = np.random.default_rng(seed)
+    vocab = [f"t{term}" for term in range(vocab_size)]
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+    return [
+        (1000 + doc, list(rng.choice(vocab, size=rng.integers(5, 80), p=weights)))
+        for doc in range(num_docs)
+    ]
+
+
+@pytest.fixture(scope="module")
+def index():
+    built = BM25Index.build(synthetic_corpus(3000, 800, seed=0), stemming=False)
+    # Small blocks, so queries have many blocks to skip
+    return BM25Index(built.indptr, built.indices, built.tfs, built.doc_lengths, built.chunk_ids, built.vocab, k1=built.k1, b=built.b, stemming=False, block_size=16)
+
+
+@pytest.fixture(params=["lookups", "skipped_blocks"])
+def always_prune(request, monkeypatch):
+    """Prune every query, completing unread contributions by lookups or by reading skipped blocks."""
+    monkeypatch.setattr(bm25_engine, "_MIN_PRUNING_POSTINGS", 0)
+    monkeypatch.setattr(bm25_engine, "_PRUNED_POSTING_COST", 0)
+    monkeypatch.setattr(bm25_engine, "_LOOKUP_COST", 0 if request.param == "lookups" else 10 ** 9)
+
+
+def test_tokenize_lowercases_and_stems():
+    assert tokenize("Modele językowe, MODELE!", stemming=False) == ["modele", "językowe", "modele"]
+    assert tokenize("modele modelu", stemming=True)[0] == tokenize("modele modelu", stemming=True)[1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("k", [1, 10, 100])
+def test_pruned_top_k_matches_brute_force(index, always_prune, seed, k):
+    rng = np.random.default_rng(seed)
+    vocab = list(index.vocab)
+    for _ in range(20):
+        # Mix of frequent and rare terms
+        terms = sorted(set(rng.choice(vocab[:50], size=rng.integers(0, 3)).tolist() + rng.choice(vocab, size=rng.integers(1, 6)).tolist()))
+        term_ids = index.term_ids(terms)
+        idf = bm25_idf(index.document_frequencies(term_ids), index.num_docs)
+        avgdl = index.avgdl * rng.uniform(0.5, 1.5)
+        live = rng.random(index.num_docs) > 0.3 if rng.random() < 0.5 else None
+
+        scores = index.score(term_ids, idf, avgdl)
+        if live is not None:
+            scores[~live] = 0
+        expected = top_k(scores, k)
+
+        docs, doc_scores = index.top_k_documents(term_ids, idf, avgdl, k, live)
+
+        np.testing.assert_array_equal(docs, expected)
+        np.testing.assert_array_equal(doc_scores, scores[expected])
+
+
+def test_search_returns_chunk_ids(index):
+    term = next(iter(index.vocab))
+    chunk_ids, scores = index.search(term, 5)
+
+    assert len(chunk_ids) == 5
+    assert np.all(chunk_ids >= 1000)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path / "bm25"))
+    loaded = BM25Index.load(str(tmp_path / "bm25"), mmap=True)
+
+    for term in list(index.vocab)[:20]:
+        np.testing.assert_array_equal(loaded.search(term, 10)[0], index.search(term, 10)[0])
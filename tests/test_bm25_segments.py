@@ -0,0 +1,58 @@
+import pytest
+
+from bm25_baseline import assert_matches_single_index, synthetic_chunks
+from common.bm25_segments import SegmentedBM25Index, load_bm25_segments_manifest, start_bm25_merge, update_bm25_segments
+from common.file_utils import write_chunk_store
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "chunk_store"), str(tmp_path / "bm25")
+
+
+def test_incremental_updates_score_like_one_index(paths):
+    store_path, db_path = paths
+    chunks = synthetic_chunks(300, seed=0)
+
+    write_chunk_store(iter(chunks), store_path)
+    update_bm25_segments(store_path, db_path)
+    assert_matches_single_index(SegmentedBM25Index.load(db_path), store_path)
+
+    # Every step removes some chunks and adds new ones, as a re-index after edits does
+    for step in range(1, 4):
+        chunks = chunks[20:] + synthetic_chunks(15, seed=step)
+        write_chunk_store(iter(chunks), store_path)
+        update_bm25_segments(store_path, db_path)
+        assert_matches_single_index(SegmentedBM25Index.load(db_path), store_path)
+
+    manifest = load_bm25_segments_manifest(db_path)
+    assert len(manifest.segments) > 1
+    assert sum(len(segment.deleted_chunk_ids) for segment in manifest.segments) > 0
+
+
+def test_merged_segments_score_like_one_index(paths):
+    store_path, db_path = paths
+    chunks = synthetic_chunks(200, seed=0)
+    write_chunk_store(iter(chunks), store_path)
+    update_bm25_segments(store_path, db_path)
+    # More segments than BM25_MAX_SEGMENTS, so the merge policy has work to do
+    for step in range(1, 10):
+        chunks = chunks[10:] + synthetic_chunks(10, seed=step)
+        write_chunk_store(iter(chunks), store_path)
+        update_bm25_segments(store_path, db_path)
+    segments_before = len(load_bm25_segments_manifest(db_path).segments)
+
+    start_bm25_merge(db_path).join()
+
+    assert len(load_bm25_segments_manifest(db_path).segments) < segments_before
+    assert_matches_single_index(SegmentedBM25Index.load(db_path), store_path)
+
+
+def test_unchanged_store_is_a_no_op(paths):
+    store_path, db_path = paths
+    write_chunk_store(iter(synthetic_chunks(50, seed=0)), store_path)
+    first = update_bm25_segments(store_path, db_path)
+
+    second = update_bm25_segments(store_path, db_path)
+
+    assert [segment.name for segment in second.segments] == [segment.name for segment in first.segments]
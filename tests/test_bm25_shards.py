@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from bm25_baseline import assert_matches_single_index, synthetic_chunks
+from common.bm25_shards import ShardedBM25Index, bm25_shard_paths, load_bm25_shards_manifest, update_bm25_shards
+from common.file_utils import write_chunk_store
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "chunk_store"), str(tmp_path / "bm25")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_shards_score_like_one_index(paths, workers):
+    store_path, db_path = paths
+    chunks = synthetic_chunks(300, seed=0)
+    write_chunk_store(iter(chunks), store_path)
+    update_bm25_shards(store_path, db_path, num_shards=3)
+
+    assert load_bm25_shards_manifest(db_path).num_shards == 3
+    assert_matches_single_index(ShardedBM25Index.load(db_path, workers=workers), store_path)
+
+    # Incremental updates keep every shard in step with the store
+    for step in range(1, 3):
+        chunks = chunks[25:] + synthetic_chunks(20, seed=step)
+        write_chunk_store(iter(chunks), store_path)
+        update_bm25_shards(store_path, db_path, num_shards=3)
+        assert_matches_single_index(ShardedBM25Index.load(db_path, workers=workers), store_path)
+
+
+def test_chunks_are_partitioned_by_id(paths):
+    store_path, db_path = paths
+    write_chunk_store(iter(synthetic_chunks(100, seed=0)), store_path)
+    update_bm25_shards(store_path, db_path, num_shards=4)
+
+    index = ShardedBM25Index.load(db_path, workers=1)
+    assert len(bm25_shard_paths(db_path)) == 4
+    assert sum(shard.num_docs for shard in index.shards) == 100
+    for shard_number, shard in enumerate(index.shards):
+        for segment in shard.segments:
+            assert np.all(np.asarray(segment.chunk_ids) % 4 == shard_number)
+
+
+def test_rejects_a_different_number_of_shards(paths):
+    store_path, db_path = paths
+    write_chunk_store(iter(synthetic_chunks(20, seed=0)), store_path)
+    update_bm25_shards(store_path, db_path, num_shards=2)
+
+    with pytest.raises(ValueError):
+        update_bm25_shards(store_path, db_path, num_shards=3)
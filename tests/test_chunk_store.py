@@ -0,0 +1,44 @@
+import gc
+
+from common.chunk_store import ChunkStoreWriter, get_chunk_store, hydrate_search_results
+from common.models import TextChunk
+
+
+def write_store(store_dir, chunks):
+    with ChunkStoreWriter(store_dir) as writer:
+        for chunk_id, chunk in chunks.items():
+            writer.append(chunk_id, chunk)
+
+
+def test_random_access_by_id(tmp_path):
+    store_dir = str(tmp_path / "chunks")
+    chunks = {7: TextChunk(headers=["A"], text="siedem"), 3: TextChunk(headers=["A", "B"], text="trzy")}
+    write_store(store_dir, chunks)
+
+    store = get_chunk_store(store_dir)
+    assert store.ids().tolist() == [3, 7]
+    assert store.get_many([7, 5, 3]) == [chunks[7], None, chunks[3]]
+    assert [chunk_id for chunk_id, _ in store.iter_chunks()] == [7, 3]
+
+    results = hydrate_search_results([3, 5], [0.9, 0.8], store_dir)
+    assert [(result.text, result.score) for result in results] == [("trzy", 0.9)]
+
+
+def test_superseded_store_is_released_once_unreferenced(tmp_path):
+    store_dir = str(tmp_path / "chunks")
+    write_store(store_dir, {1: TextChunk(headers=[], text="stary")})
+    old_store = get_chunk_store(store_dir)
+    old_data_file = old_store._data_file
+
+    write_store(store_dir, {2: TextChunk(headers=[], text="nowy")})
+    new_store = get_chunk_store(store_dir)
+
+    # Readers still holding the old store keep reading the old version
+    assert new_store is not old_store
+    assert old_store.get(1).text == "stary"
+    assert new_store.get(2).text == "nowy"
+
+    del old_store
+    gc.collect()
+    assert old_data_file.closed
+    assert not new_store._data_file.closed
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import pytest
+
+import common.prompt_generation as prompt_generation
+import common.retrieval_cache as retrieval_cache
+from common.constants import MIN_TRUNCATED_CHUNK_TOKENS
+from common.models import PromptData, SearchResult, SearchType
+from common.prompt_generation import asearch_hybrid, build_context, retrieve_context, search_hybrid
+from common.retrieval_cache import RetrievalCache
+from common.token_counting import count_tokens
+
+
+def result(chunk_id, text, headers=(), score=1.0):
+    return SearchResult(id=chunk_id, score=score, text=text, headers=list(headers))
+
+
+def words(count, word="słowo"):
+    return " ".join([word] * count)
+
+
+def test_groups_chunks_by_section_in_rank_order():
+    results = [
+        result(1, "pierwszy", ["Rozdział A"]),
+        result(2, "drugi", ["Rozdział B", "Punkt 1"]),
+        result(3, "trzeci", ["Rozdział A"]),
+        result(4, "bez nagłówka"),
+    ]
+
+    context = build_context(SearchType.VECTOR, results, [], model_context_chunks_number=10)
+
+    assert context.chunk_ids == [1, 2, 3, 4]
+    assert context.context == "Rozdział A\npierwszy\ntrzeci\n\nRozdział B > Punkt 1\ndrugi\n\nbez nagłówka"
+
+
+def test_packs_chunks_into_the_budget():
+    results = [result(chunk_id, words(40), [f"Sekcja {chunk_id}"]) for chunk_id in range(1, 6)]
+    unlimited = build_context(SearchType.BM25, [], results, model_context_chunks_number=10)
+    per_chunk = unlimited.tokens_used // len(results)
+
+    packed = build_context(SearchType.BM25, [], results, model_context_chunks_number=10, context_token_budget=int(per_chunk * 2.5))
+
+    assert packed.chunk_ids == [1, 2]
+    assert 0 < packed.tokens_used <= per_chunk * 2.5
+    assert packed.context == "\n\n".join(f"Sekcja {chunk_id}\n{words(40)}" for chunk_id in (1, 2))
+
+
+def test_stops_at_first_chunk_that_does_not_fit():
+    results = [result(1, words(10)), result(2, words(200)), result(3, words(5))]
+
+    packed = build_context(SearchType.VECTOR, results, [], model_context_chunks_number=10, context_token_budget=count_tokens(words(10)) + 10)
+
+    assert packed.chunk_ids == [1]
+
+
+@pytest.mark.parametrize("truncate_last_chunk", [False, True])
+def test_truncates_last_chunk_to_the_remaining_budget(truncate_last_chunk):
+    first, second = words(20), words(400)
+    budget = count_tokens(first) + count_tokens("\n\n") + MIN_TRUNCATED_CHUNK_TOKENS + 20
+    results = [result(1, first), result(2, second)]
+
+    packed = build_context(SearchType.VECTOR, results, [], model_context_chunks_number=10, context_token_budget=budget, truncate_last_chunk=truncate_last_chunk)
+
+    if truncate_last_chunk:
+        assert packed.chunk_ids == [1, 2]
+        truncated = packed.context.split("\n\n")[1]
+        assert second.startswith(truncated) and len(truncated) < len(second)
+        assert packed.tokens_used <= budget
+    else:
+        assert packed.chunk_ids == [1]
+        assert packed.context == first
+
+
+def test_does_not_truncate_below_minimum():
+    first = words(20)
+    budget = count_tokens(first) + count_tokens("\n\n") + MIN_TRUNCATED_CHUNK_TOKENS - 1
+    results = [result(1, first), result(2, words(400))]
+
+    packed = build_context(SearchType.VECTOR, results, [], model_context_chunks_number=10, context_token_budget=budget, truncate_last_chunk=True)
+
+    assert packed.chunk_ids == [1]
+
+
+def test_hybrid_fuses_and_limits_chunks():
+    qdrant_results = [result(1, "a"), result(2, "b"), result(3, "c")]
+    bm25_results = [result(3, "c"), result(4, "d")]
+
+    context = build_context(SearchType.HYBRID, qdrant_results, bm25_results, model_context_chunks_number=2)
+
+    # Chunk 3 is found by both branches, so it ranks first
+    assert context.chunk_ids == [3, 1]
+
+
+VECTOR_RESULTS = [result(1, "wektor")]
+BM25_RESULTS = [result(2, "bm25")]
+
+
+def slow_search(user_prompt, db_chunks_number):
+    time.sleep(0.5)
+    return VECTOR_RESULTS
+
+
+def failing_search(user_prompt, db_chunks_number):
+    raise ConnectionError("backend unavailable")
+
+
+async def aslow_search(user_prompt, db_chunks_number):
+    await asyncio.sleep(0.5)
+    return VECTOR_RESULTS
+
+
+async def afailing_search(user_prompt, db_chunks_number):
+    raise ConnectionError("backend unavailable")
+
+
+@pytest.fixture
+def short_timeouts(monkeypatch):
+    monkeypatch.setattr(prompt_generation, "VECTOR_SEARCH_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(prompt_generation, "BM25_SEARCH_TIMEOUT_S", 0.05)
+
+
+def test_hybrid_falls_back_to_bm25_when_vector_times_out(monkeypatch, short_timeouts):
+    monkeypatch.setattr(prompt_generation, "search_vector", slow_search)
+    monkeypatch.setattr(prompt_generation, "search_bm25", lambda user_prompt, db_chunks_number: BM25_RESULTS)
+
+    start_time = time.monotonic()
+    qdrant_results, bm25_results = search_hybrid("pytanie", 10)
+
+    assert (qdrant_results, bm25_results) == (None, BM25_RESULTS)
+    assert time.monotonic() - start_time < 0.4
+
+
+def test_hybrid_falls_back_to_vector_when_bm25_fails(monkeypatch, short_timeouts):
+    monkeypatch.setattr(prompt_generation, "search_vector", lambda user_prompt, db_chunks_number: VECTOR_RESULTS)
+    monkeypatch.setattr(prompt_generation, "search_bm25", failing_search)
+
+    assert search_hybrid("pytanie", 10) == (VECTOR_RESULTS, None)
+
+
+def test_hybrid_raises_when_both_branches_fail(monkeypatch, short_timeouts):
+    monkeypatch.setattr(prompt_generation, "search_vector", slow_search)
+    monkeypatch.setattr(prompt_generation, "search_bm25", failing_search)
+
+    with pytest.raises(RuntimeError):
+        search_hybrid("pytanie", 10)
+
+
+def test_async_hybrid_falls_back_when_a_branch_times_out(monkeypatch, short_timeouts):
+    async def abm25_search(user_prompt, db_chunks_number):
+        return BM25_RESULTS
+
+    monkeypatch.setattr(prompt_generation, "asearch_vector", aslow_search)
+    monkeypatch.setattr(prompt_generation, "asearch_bm25", abm25_search)
+
+    assert asyncio.run(asearch_hybrid("pytanie", 10)) == (None, BM25_RESULTS)
+
+
+def test_async_hybrid_raises_when_both_branches_fail(monkeypatch, short_timeouts):
+    monkeypatch.setattr(prompt_generation, "asearch_vector", aslow_search)
+    monkeypatch.setattr(prompt_generation, "asearch_bm25", afailing_search)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(asearch_hybrid("pytanie", 10))
+
+
+def test_degraded_hybrid_context_is_not_cached(monkeypatch, short_timeouts):
+    cache = RetrievalCache()
+    monkeypatch.setattr(retrieval_cache, "read_index_version", lambda: "v1")
+    monkeypatch.setattr(prompt_generation, "get_retrieval_cache", lambda: cache)
+    monkeypatch.setattr(prompt_generation, "search_vector", slow_search)
+    monkeypatch.setattr(prompt_generation, "search_bm25", lambda user_prompt, db_chunks_number: BM25_RESULTS)
+    prompt_data = PromptData(system_prompt="system", user_prompt="pytanie", db_chunks_number=10, model_context_chunks_number=5)
+
+    cache_key, _ = prompt_generation._lookup_cached_context(prompt_data, SearchType.HYBRID)
+
+    degraded = retrieve_context(prompt_data)
+    assert degraded.chunk_ids == [2]
+    assert cache.get(cache_key) is None
+
+    monkeypatch.setattr(prompt_generation, "search_vector", lambda user_prompt, db_chunks_number: VECTOR_RESULTS)
+    complete = retrieve_context(prompt_data)
+    assert sorted(complete.chunk_ids) == [1, 2]
+    assert cache.get(cache_key) == complete
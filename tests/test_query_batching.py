@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+
+from common.embeddings import QueryEmbeddingBatcher
+
+
+class FakeEncoder:
+    """Encoder returning an embedding derived from the query, recording batch sizes."""
+
+    def __init__(self, delay_s=0.01, fail_on=None):
+        self.delay_s = delay_s
+        self.fail_on = fail_on
+        self.batch_sizes = []
+        self._lock = threading.Lock()
+
+    def encode(self, queries):
+        with self._lock:
+            self.batch_sizes.append(len(queries))
+        time.sleep(self.delay_s)
+        if self.fail_on is not None and self.fail_on in queries:
+            raise RuntimeError("encoder failed")
+        return [embedding_of(query) for query in queries]
+
+
+def embedding_of(query):
+    number = int(query.rsplit(" ", 1)[1])
+    return [float(number), float(number % 7), 1.0]
+
+
+def test_concurrent_queries_get_their_own_embeddings():
+    encoder = FakeEncoder()
+    batcher = QueryEmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=20)
+    queries = [f"zapytanie {i}" for i in range(100)]
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        embeddings = list(executor.map(batcher.embed, queries))
+
+    assert embeddings == [embedding_of(query) for query in queries]
+    assert sum(encoder.batch_sizes) == len(queries)
+    assert max(encoder.batch_sizes) <= 8
+    # Concurrent queries are encoded together
+    assert len(encoder.batch_sizes) < len(queries)
+
+    stats = batcher.get_stats()
+    assert stats.queries == len(queries)
+    assert stats.batches == len(encoder.batch_sizes)
+    assert sum(size * count for size, count in stats.batch_size_histogram.items()) == len(queries)
+    assert sum(stats.queue_wait_ms_histogram.values()) == len(queries)
+
+
+def test_encoder_error_fails_only_its_batch():
+    encoder = FakeEncoder(fail_on="zapytanie 13")
+    batcher = QueryEmbeddingBatcher(encoder, max_batch_size=4, max_wait_ms=5)
+
+    with pytest.raises(RuntimeError):
+        batcher.embed("zapytanie 13")
+
+    # The worker keeps serving later queries
+    assert batcher.embed("zapytanie 14") == embedding_of("zapytanie 14")
+
+
+def test_cancelled_queries_are_not_encoded():
+    encoder = FakeEncoder(delay_s=0.05)
+    batcher = QueryEmbeddingBatcher(encoder, max_batch_size=1, max_wait_ms=0)
+    # Occupy the worker, so the next query waits in the queue
+    busy = batcher.submit("zapytanie 1")
+    time.sleep(0.01)
+    cancelled = batcher.submit("zapytanie 2")
+    assert cancelled.cancel()
+
+    assert busy.result() == embedding_of("zapytanie 1")
+    assert batcher.embed("zapytanie 3") == embedding_of("zapytanie 3")
+    assert sum(encoder.batch_sizes) == 2
@@ -0,0 +1,37 @@
+import pytest
+
+import common.retrieval_cache as retrieval_cache
+from common.models import RetrievedContext, SearchType
+from common.retrieval_cache import RetrievalCache, make_retrieval_cache_key
+
+
+@pytest.fixture(autouse=True)
+def index_version(monkeypatch):
+    monkeypatch.setattr(retrieval_cache, "read_index_version", lambda: "v1")
+
+
+def test_key_normalizes_query():
+    assert make_retrieval_cache_key("Jaki  model?", SearchType.HYBRID, 20, 10) == make_retrieval_cache_key(" jaki model? ", SearchType.HYBRID, 20, 10)
+
+
+@pytest.mark.parametrize("constant, value", [
+    ("VECTOR_STORE_BACKEND", "local"),
+    ("BM25_BACKEND", "bm25s"),
+    ("BM25_SHARDS", 4),
+])
+def test_key_depends_on_backends(monkeypatch, constant, value):
+    key = make_retrieval_cache_key("pytanie", SearchType.HYBRID, 20, 10)
+    monkeypatch.setattr(retrieval_cache, constant, value)
+    assert make_retrieval_cache_key("pytanie", SearchType.HYBRID, 20, 10) != key
+
+
+def test_persisted_entries_survive_restart(tmp_path):
+    path = str(tmp_path / "retrieval_cache.json")
+    key = make_retrieval_cache_key("pytanie", SearchType.BM25, 20, 10, 500, True)
+    context = RetrievedContext(context="kontekst", chunk_ids=[1, 2], tokens_used=3)
+
+    cache = RetrievalCache(persist_path=path)
+    cache.put(key, context)
+    cache.save()
+
+    assert RetrievalCache(persist_path=path).get(key) == context
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+import common.semantic_cache as semantic_cache
+from common.models import GenerationStats
+from common.semantic_cache import SemanticAnswerCache, call_model_stream_cached
+
+
+VECTOR_SIZE = 4
+SYSTEM_PROMPT = "Odpowiadaj na podstawie kontekstu."
+MODEL = "bielik"
+
+
+@pytest.fixture
+def index_version(monkeypatch):
+    """Mutable index version seen by the cache."""
+    version = ["v1"]
+    monkeypatch.setattr(semantic_cache, "read_index_version", lambda: version[0])
+    return version
+
+
+@pytest.fixture
+def cache(index_version):
+    return SemanticAnswerCache(capacity=2, similarity_threshold=0.95, vector_size=VECTOR_SIZE)
+
+
+def rotated(angle):
+    """Unit vector at the given angle from [1, 0, 0, 0], i.e. with cosine similarity cos(angle) to it."""
+    return [float(np.cos(angle)), float(np.sin(angle)), 0.0, 0.0]
+
+
+def test_hit_above_threshold_only(cache):
+    cache.store(rotated(0.0), [1, 2], SYSTEM_PROMPT, MODEL, "odpowiedź")
+
+    assert cache.lookup(rotated(0.1), [2, 1], SYSTEM_PROMPT, MODEL) == "odpowiedź"
+    assert cache.lookup(rotated(0.5), [1, 2], SYSTEM_PROMPT, MODEL) is None
+
+    stats = cache.get_stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+
+
+def test_hit_requires_same_chunks_system_prompt_and_model(cache):
+    cache.store(rotated(0.0), [1, 2], SYSTEM_PROMPT, MODEL, "odpowiedź")
+
+    assert cache.lookup(rotated(0.0), [1, 3], SYSTEM_PROMPT, MODEL) is None
+    assert cache.lookup(rotated(0.0), [1, 2], "Inny prompt.", MODEL) is None
+    assert cache.lookup(rotated(0.0), [1, 2], SYSTEM_PROMPT, "inny-model") is None
+    assert cache.lookup(rotated(0.0), [1, 2], SYSTEM_PROMPT, MODEL) == "odpowiedź"
+
+
+def test_evicts_least_recently_used(cache):
+    cache.store(rotated(0.0), [1], SYSTEM_PROMPT, MODEL, "a")
+    cache.store(rotated(1.0), [2], SYSTEM_PROMPT, MODEL, "b")
+    # Using "a" makes "b" the least recently used entry
+    assert cache.lookup(rotated(0.0), [1], SYSTEM_PROMPT, MODEL) == "a"
+
+    cache.store(rotated(2.0), [3], SYSTEM_PROMPT, MODEL, "c")
+
+    assert cache.lookup(rotated(1.0), [2], SYSTEM_PROMPT, MODEL) is None
+    assert cache.lookup(rotated(0.0), [1], SYSTEM_PROMPT, MODEL) == "a"
+    assert cache.lookup(rotated(2.0), [3], SYSTEM_PROMPT, MODEL) == "c"
+    assert cache.get_stats().entries == 2
+
+
+def test_cleared_when_index_version_changes(cache, index_version):
+    cache.store(rotated(0.0), [1], SYSTEM_PROMPT, MODEL, "a")
+
+    index_version[0] = "v2"
+
+    assert cache.lookup(rotated(0.0), [1], SYSTEM_PROMPT, MODEL) is None
+    assert cache.get_stats().entries == 0
+
+
+def fake_model_stream(chunks, stats):
+    """call_model_stream replacement yielding chunks and reporting stats if given."""
+    def call_model_stream(system_prompt, user_prompt, stats_callback=None):
+        yield from chunks
+        if stats is not None:
+            stats_callback(stats)
+    return call_model_stream
+
+
+@pytest.fixture
+def cached_call(cache, monkeypatch):
+    """Route call_model_stream_cached() to the test cache with a fixed query embedding."""
+    pytest.importorskip("sentence_transformers")
+    monkeypatch.setattr(semantic_cache, "get_semantic_cache", lambda: cache)
+    monkeypatch.setattr("common.embeddings.generate_query_embedding", lambda query: rotated(0.0))
+    return cache
+
+
+@pytest.mark.parametrize("stats, cached", [
+    (GenerationStats(total_time_s=1.0, prompt_tokens=10, output_tokens=2), True),
+    (GenerationStats(total_time_s=1.0), False),
+    (None, False),
+])
+def test_only_complete_answers_are_cached(cached_call, monkeypatch, stats, cached):
+    monkeypatch.setattr(semantic_cache, "call_model_stream", fake_model_stream(["Od", "powiedź"], stats))
+
+    assert "".join(call_model_stream_cached(SYSTEM_PROMPT, "pytanie", [1])) == "Odpowiedź"
+
+    model = semantic_cache.get_ollama_client().model
+    assert (cached_call.lookup(rotated(0.0), [1], SYSTEM_PROMPT, model) == "Odpowiedź") is cached
@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pytest
+
+from common.chunk_store import ChunkStoreWriter
+from common.models import TextChunk
+from common.vector_store import LocalVectorStore, cosine_top_k, _normalize
+
+
+VECTOR_SIZE = 8
+
+
+def make_batch(ids, seed):
+    """Embedding batch of random vectors for the given chunk ids."""
+    vectors = np.random.default_rng(seed).normal(size=(len(ids), VECTOR_SIZE)).astype(np.float32)
+    return list(ids), vectors, [TextChunk(headers=[], text=f"chunk {chunk_id}") for chunk_id in ids]
+
+
+def stored(store):
+    """Stored vectors of a local store as a dict chunk id -> vector."""
+    ids, vectors = store.load()
+    return {int(chunk_id): np.array(vector) for chunk_id, vector in zip(ids, vectors)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(store_dir=str(tmp_path / "vectors"), chunk_store_path=str(tmp_path / "chunks"))
+
+
+def test_upsert_writes_normalized_vectors_in_batches(store):
+    batches = [make_batch([1, 2, 3], seed=0), make_batch([4, 5], seed=1)]
+    store.upsert(iter(batches), VECTOR_SIZE)
+
+    vectors = stored(store)
+    assert sorted(vectors) == [1, 2, 3, 4, 5]
+    for batch_ids, batch_vectors, _ in batches:
+        for chunk_id, vector in zip(batch_ids, _normalize(batch_vectors)):
+            np.testing.assert_allclose(vectors[chunk_id], vector, rtol=1e-6)
+
+
+def test_upsert_replaces_and_deletes(store):
+    store.upsert([make_batch([1, 2, 3, 4], seed=0)], VECTOR_SIZE)
+    before = stored(store)
+
+    replacement = make_batch([2], seed=1)
+    store.upsert([replacement], VECTOR_SIZE, stale_ids=[4])
+
+    after = stored(store)
+    assert sorted(after) == [1, 2, 3]
+    np.testing.assert_allclose(after[1], before[1])
+    np.testing.assert_allclose(after[3], before[3])
+    np.testing.assert_allclose(after[2], _normalize(replacement[1])[0], rtol=1e-6)
+
+
+def test_upsert_copies_kept_rows_across_blocks(store, monkeypatch):
+    monkeypatch.setattr("common.vector_store.LOCAL_VECTOR_SEARCH_BLOCK_SIZE", 3)
+    store.upsert([make_batch(range(10), seed=0)], VECTOR_SIZE)
+    before = stored(store)
+
+    store.upsert([make_batch(range(10, 17), seed=1)], VECTOR_SIZE, stale_ids=[0, 5, 9])
+
+    after = stored(store)
+    assert sorted(after) == [1, 2, 3, 4, 6, 7, 8] + list(range(10, 17))
+    for chunk_id in (1, 2, 3, 4, 6, 7, 8):
+        np.testing.assert_allclose(after[chunk_id], before[chunk_id])
+
+
+def test_recreate_drops_existing_vectors(store):
+    store.upsert([make_batch([1, 2], seed=0)], VECTOR_SIZE)
+    store.upsert([make_batch([3], seed=1)], VECTOR_SIZE, recreate=True)
+
+    assert sorted(stored(store)) == [3]
+
+
+def test_generation_swap(store):
+    store.upsert([make_batch([1, 2], seed=0)], VECTOR_SIZE)
+    old_ids, old_vectors = store.load()
+    old_vectors = np.array(old_vectors)
+
+    store.upsert([make_batch([3], seed=1)], VECTOR_SIZE)
+
+    # The old mapping stays readable, the next load sees the new generation
+    np.testing.assert_array_equal(np.sort(old_ids), [1, 2])
+    assert sorted(stored(store)) == [1, 2, 3]
+    assert store._read_index()["generation"] == 1
+    assert sorted(os.listdir(store.store_dir)) == ["ids.1.npy", "index.json", "vectors.1.npy"]
+
+
+def test_search_returns_most_similar_chunks(store, tmp_path):
+    ids, vectors, chunks = make_batch(range(20), seed=0)
+    with ChunkStoreWriter(store.chunk_store_path) as writer:
+        for chunk_id, chunk in zip(ids, chunks):
+            writer.append(chunk_id, chunk)
+    store.upsert([(ids, vectors, chunks)], VECTOR_SIZE)
+
+    results = store.search(vectors[7].tolist(), 3)
+    assert len(results) == 3
+    assert results[0].text == "chunk 7"
+    assert results[0].score == pytest.approx(1.0, abs=1e-5)
+    assert [result.score for result in results] == sorted((result.score for result in results), reverse=True)
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1000])
+@pytest.mark.parametrize("k", [1, 5, 50, 500])
+def test_cosine_top_k_matches_brute_force(block_size, k):
+    rng = np.random.default_rng(block_size * 1000 + k)
+    queries = _normalize(rng.normal(size=(4, VECTOR_SIZE)))
+    vectors = _normalize(rng.normal(size=(200, VECTOR_SIZE)))
+
+    rows, scores = cosine_top_k(queries, vectors, k, block_size=block_size)
+
+    all_scores = queries @ vectors.T
+    expected_k = min(k, len(vectors))
+    assert rows.shape == scores.shape == (len(queries), expected_k)
+    for query_scores, query_rows, query_top_scores in zip(all_scores, rows, scores):
+        expected_rows = np.lexsort((np.arange(len(vectors)), -query_scores))[:expected_k]
+        np.testing.assert_array_equal(query_rows, expected_rows)
+        np.testing.assert_allclose(query_top_scores, query_scores[expected_rows], atol=1e-6)
+
+
+def test_cosine_top_k_of_empty_store():
+    rows, scores = cosine_top_k(np.ones((2, VECTOR_SIZE), dtype=np.float32), np.empty((0, VECTOR_SIZE), dtype=np.float32), 5)
+    assert rows.shape == scores.shape == (2, 0)